@@ -4,8 +4,10 @@ from .models import (
     Role, Profile, 
     Department, Program,
     Course, CourseOffering, OfferingTeacher, ClassTime,
-    Enrollment, FavoriteCourse, CreditSummary
+    Enrollment, FavoriteCourse, CreditSummary,
+    GraduationRule, BackgroundJob
 )
+from .credits import enrolled_student_ids, rebuild_credit_summaries
 
 # ===== 使用者相關 =====
 
@@ -55,6 +57,11 @@ class CourseAdmin(admin.ModelAdmin):
     list_display = ['course_code', 'course_name', 'course_type', 'credits']
     list_filter = ['course_type']
     search_fields = ['course_code', 'course_name']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and {'credits', 'course_type'} & set(form.changed_data):
+            rebuild_credit_summaries(enrolled_student_ids(obj.offerings.all()))
 
 
 class OfferingTeacherInline(admin.TabularInline):
@@ -74,6 +81,11 @@ class CourseOfferingAdmin(admin.ModelAdmin):
     list_filter = ['academic_year', 'semester', 'department', 'status']
     search_fields = ['course__course_name', 'course__course_code']
     inlines = [OfferingTeacherInline, ClassTimeInline]
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and {'academic_year', 'semester'} & set(form.changed_data):
+            rebuild_credit_summaries(enrolled_student_ids([obj.id]))
 
 @admin.register(OfferingTeacher)
 class OfferingTeacherAdmin(admin.ModelAdmin):
@@ -93,6 +105,22 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ['student', 'offering', 'status', 'grade', 'score', 'enrolled_at']
     list_filter = ['status', 'offering__academic_year', 'offering__semester']
     search_fields = ['student__username', 'student__profile__real_name', 'offering__course__course_name']
+    
+    # 後台修改或刪除選課紀錄（含成績）後重算相關學生的學分統計
+    def save_model(self, request, obj, form, change):
+        old_student_id = form.initial.get('student') if change else None
+        super().save_model(request, obj, form, change)
+        rebuild_credit_summaries({obj.student_id, old_student_id} - {None})
+    
+    def delete_model(self, request, obj):
+        student_id = obj.student_id
+        super().delete_model(request, obj)
+        rebuild_credit_summaries([student_id])
+    
+    def delete_queryset(self, request, queryset):
+        student_ids = list(queryset.values_list('student_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        rebuild_credit_summaries(student_ids)
 
 @admin.register(FavoriteCourse)
 class FavoriteCourseAdmin(admin.ModelAdmin):
@@ -101,5 +129,23 @@ class FavoriteCourseAdmin(admin.ModelAdmin):
 
 @admin.register(CreditSummary)
 class CreditSummaryAdmin(admin.ModelAdmin):
-    list_display = ['student', 'total_credits', 'passed_credits', 'gpa']
-    search_fields = ['student__username', 'student__profile__real_name']
\ No newline at end of file
+    list_display = ['student', 'total_credits', 'passed_credits', 'gpa', 'cumulative_gpa']
+    search_fields = ['student__username', 'student__profile__real_name']
+
+
+
+# ===== 畢業門檻 =====
+
+@admin.register(GraduationRule)
+class GraduationRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'department', 'rule_type', 'category', 'min_credits', 'min_count', 'is_active']
+    list_filter = ['rule_type', 'department', 'is_active']
+    search_fields = ['name']
+
+# ===== 背景工作 =====
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'job_type', 'status', 'progress_current', 'progress_total', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['job_type', 'status']
+    readonly_fields = ['created_at', 'started_at', 'heartbeat_at', 'finished_at']
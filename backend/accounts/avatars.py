@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+大頭貼縮圖
+上傳後於背景執行緒池產生固定尺寸（64/128/256 px）的 WebP 與 JPEG 縮圖，
+完成後寫入 Profile.avatar_thumbnails；頁面顯示時使用縮圖，不再傳送原始檔
+原圖以內容雜湊命名（ContentHashStorage），縮圖名稱由原圖衍生，同一張圖只處理與儲存一次
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = (256, 128, 64)  # 由大到小，小尺寸以前一張縮圖再縮小
+
+# 副檔名 -> (Pillow 格式, 儲存參數)
+AVATAR_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+# 縮圖名稱固定由原圖決定，同時產生相同縮圖時直接覆寫（內容相同），不另加後綴
+thumbnail_storage = FileSystemStorage(allow_overwrite=True)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.AVATAR_THUMBNAIL_WORKERS,
+                    thread_name_prefix='avatar-thumbnail',
+                )
+    return _executor
+
+
+def _encode(image, fmt):
+    pil_format, options = AVATAR_FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG 不支援透明，透明區域以白色填滿
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render_thumbnails(source):
+    """由原始圖檔產生縮圖，回傳 {size: {fmt: bytes}}（正方形置中裁切）"""
+    with Image.open(source) as image:
+        # JPEG 直接以接近目標的解析度解碼，大幅減少解碼時間與記憶體
+        image.draft('RGB', (AVATAR_SIZES[0] * 2, AVATAR_SIZES[0] * 2))
+        image = ImageOps.exif_transpose(image)  # GIF 只取第一格
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+
+        rendered = {}
+        for size in AVATAR_SIZES:
+            image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            rendered[size] = {fmt: _encode(image, fmt) for fmt in AVATAR_FORMATS}
+        return rendered
+
+
+def thumbnail_name(avatar_name, size, fmt):
+    stem = PurePosixPath(avatar_name).stem
+    return f'avatars/thumbs/{stem}_{size}.{fmt}'
+
+
+def _generate(profile_id, avatar_name):
+    """背景執行：產生並儲存縮圖，大頭貼未被更換時才寫回 Profile"""
+    close_old_connections()
+    saved = []
+    try:
+        # 縮圖名稱由原圖（內容雜湊檔名）決定；相同圖片已有縮圖時直接沿用
+        thumbnails = {
+            str(size): {fmt: thumbnail_name(avatar_name, size, fmt) for fmt in AVATAR_FORMATS}
+            for size in AVATAR_SIZES
+        }
+        missing = [
+            (size, fmt) for size in AVATAR_SIZES for fmt in AVATAR_FORMATS
+            if not thumbnail_storage.exists(thumbnails[str(size)][fmt])
+        ]
+
+        if missing:
+            with Profile._meta.get_field('avatar').storage.open(avatar_name, 'rb') as source:
+                rendered = render_thumbnails(source)
+            for size, fmt in missing:
+                saved.append(thumbnail_storage.save(thumbnails[str(size)][fmt], ContentFile(rendered[size][fmt])))
+
+        updated = Profile.objects.filter(id=profile_id, avatar=avatar_name).update(
+            avatar_thumbnails=thumbnails
+        )
+        if not updated and not Profile.objects.filter(avatar=avatar_name).exists():
+            # 處理期間大頭貼已被更換或刪除
+            delete_files(saved)
+    except Exception as e:
+        logger.exception('產生大頭貼縮圖錯誤 (%s): %s', avatar_name, e)
+        delete_files(saved)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnails(profile):
+    """交易提交後將縮圖工作交給執行緒池，不佔用請求執行緒"""
+    profile_id, avatar_name = profile.id, profile.avatar.name
+    transaction.on_commit(lambda: _get_executor().submit(_generate, profile_id, avatar_name))
+
+
+def thumbnail_files(profile):
+    return [name for files in (profile.avatar_thumbnails or {}).values() for name in files.values()]
+
+
+def release_avatar(profile):
+    """
+    移除 profile 目前的大頭貼與縮圖（不儲存 profile）
+    相同內容的檔案只存一份，仍有其他使用者引用時保留檔案
+    """
+    if profile.avatar:
+        shared = Profile.objects.filter(avatar=profile.avatar.name).exclude(id=profile.id).exists()
+        if not shared:
+            delete_files(thumbnail_files(profile))
+            profile.avatar.delete(save=False)
+    profile.avatar = None
+    profile.avatar_thumbnails = {}
+
+
+def delete_files(names):
+    for name in names:
+        try:
+            thumbnail_storage.delete(name)
+        except Exception as e:
+            logger.error('刪除檔案錯誤 (%s): %s', name, e)
+
+
+def avatar_urls(request, profile):
+    """
+    回傳各尺寸縮圖網址 {'64': {'webp': url, 'jpeg': url}, ...}
+    縮圖尚未產生完成時回傳 None，前端改用原始圖檔
+    """
+    if not profile.avatar or not profile.avatar_thumbnails:
+        return None
+    return {
+        size: {fmt: request.build_absolute_uri(thumbnail_storage.url(name)) for fmt, name in files.items()}
+        for size, files in profile.avatar_thumbnails.items()
+    }
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+課表行事曆訂閱（iCalendar / ICS）
+學生的已選課程與教師的授課課程，依上課時段與週次展開為每週重複的事件
+（連續週次合併成一個 RRULE，例如 "1-9,11-18" 產生兩個事件）
+內容以課表版本（選課 / 授課紀錄與開課資料的筆數與最後更新時間）為快取鍵與 ETag，
+行事曆程式定期輪詢時版本未變即回應 304，不重新產生
+"""
+import hashlib
+import secrets
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .credits import current_term
+from .metrics import record_cache
+from .models import ClassTime, Enrollment, OfferingTeacher, Profile
+from .timeslots import MAX_WEEKS
+
+ICS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# 節次 -> (上課時間, 下課時間)
+PERIOD_TIMES = {
+    1: ('08:10', '09:00'), 2: ('09:10', '10:00'), 3: ('10:10', '11:00'), 4: ('11:10', '12:00'),
+    5: ('13:10', '14:00'), 6: ('14:10', '15:00'), 7: ('15:10', '16:00'), 8: ('16:10', '17:00'),
+    9: ('17:10', '18:00'), 10: ('18:20', '19:10'), 11: ('19:15', '20:05'), 12: ('20:10', '21:00'),
+    13: ('21:05', '21:55'), 14: ('22:00', '22:50'),
+}
+
+
+def get_or_create_token(profile, rotate=False):
+    """取得使用者的訂閱金鑰（rotate=True 時重新產生，舊的訂閱網址隨即失效）"""
+    if profile.calendar_token and not rotate:
+        return profile.calendar_token
+    profile.calendar_token = secrets.token_urlsafe(32)
+    Profile.objects.filter(id=profile.id).update(calendar_token=profile.calendar_token)
+    return profile.calendar_token
+
+
+def _aggregate_version(queryset, updated_field):
+    stats = queryset.aggregate(
+        count=Count('id'),
+        updated=Max(updated_field),
+        offering_updated=Max('offering__updated_at'),
+        course_updated=Max('offering__course__updated_at'),
+    )
+    return ':'.join(
+        str(value.timestamp() if hasattr(value, 'timestamp') else value)
+        for value in (stats['count'], stats['updated'], stats['offering_updated'], stats['course_updated'])
+    )
+
+
+def _term_filter():
+    academic_year, semester = current_term()
+    return {'offering__academic_year': academic_year, 'offering__semester': semester}
+
+
+def _enrollments(user):
+    return Enrollment.objects.filter(student=user, status='enrolled', **_term_filter())
+
+
+def _teaching(user):
+    return OfferingTeacher.objects.filter(teacher=user, **_term_filter())
+
+
+def schedule_version(user):
+    """
+    使用者本學期課表的版本；選課、退選、授課異動或開課資料（含時段）變動都會改變
+    開課的上課時段變動時 course_update 也會更新開課的 updated_at
+    """
+    raw = '|'.join((
+        ':'.join(current_term()),
+        settings.TERM_START_DATE,
+        _aggregate_version(_enrollments(user), 'updated_at'),
+        _aggregate_version(_teaching(user), 'created_at'),
+    ))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _escape(text):
+    text = str(text or '').replace('\\', '\\\\')
+    return text.replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    """每行最多 75 個位元組，超過時以 CRLF + 空白折行（不切斷 UTF-8 字元）"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current, size = [], '', 0
+    for char in line:
+        length = len(char.encode('utf-8'))
+        if size + length > (75 if not parts else 74):
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += length
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def _week_runs(week_mask):
+    """週次遮罩拆成連續區間 [(開始週, 週數)]"""
+    runs, start = [], None
+    for week in range(1, MAX_WEEKS + 2):
+        if week <= MAX_WEEKS and week_mask >> week & 1:
+            if start is None:
+                start = week
+        elif start is not None:
+            runs.append((start, week - start))
+            start = None
+    return runs
+
+
+def _utc_stamp(day, clock, tz):
+    hour, minute = map(int, clock.split(':'))
+    local = datetime.combine(day, time(hour, minute), tzinfo=tz)
+    return local.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _events(class_times, role_label, term_start, tz, stamp):
+    lines = []
+    for ct in class_times:
+        if ct.start_period not in PERIOD_TIMES or ct.end_period not in PERIOD_TIMES:
+            continue
+        offering = ct.offering
+        summary = offering.course.course_name + (f'（{role_label}）' if role_label else '')
+        for first_week, count in _week_runs(ct.week_mask):
+            day = term_start + timedelta(weeks=first_week - 1, days=int(ct.weekday) - 1)
+            lines += [
+                'BEGIN:VEVENT',
+                f'UID:classtime-{ct.id}-w{first_week}@course-system',
+                f'DTSTAMP:{stamp}',
+                f'DTSTART:{_utc_stamp(day, PERIOD_TIMES[ct.start_period][0], tz)}',
+                f'DTEND:{_utc_stamp(day, PERIOD_TIMES[ct.end_period][1], tz)}',
+                f'RRULE:FREQ=WEEKLY;COUNT={count}',
+                f'SUMMARY:{_escape(summary)}',
+                f'LOCATION:{_escape(ct.classroom)}',
+                f'DESCRIPTION:{_escape(offering.course.course_code)} 第{ct.start_period}-{ct.end_period}節',
+                'END:VEVENT',
+            ]
+    return lines
+
+
+def build_ics(user, name=''):
+    """產生使用者本學期課表的 ICS 內容"""
+    tz = ZoneInfo(settings.TIME_ZONE)
+    term_start = date.fromisoformat(settings.TERM_START_DATE)
+    stamp = datetime.now(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    enrolled_ids = _enrollments(user).values('offering_id')
+    teaching_ids = _teaching(user).values('offering_id')
+    student_times = ClassTime.objects.filter(offering_id__in=enrolled_ids).select_related('offering__course')
+    teacher_times = ClassTime.objects.filter(offering_id__in=teaching_ids).select_related('offering__course')
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//course-system//timetable//ZH',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(name or user.username)} 課表',
+        f'X-WR-TIMEZONE:{settings.TIME_ZONE}',
+    ]
+    lines += _events(student_times, '', term_start, tz, stamp)
+    lines += _events(teacher_times, '授課', term_start, tz, stamp)
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+
+def get_ics(user, version, name=''):
+    """取得（或產生並快取）使用者指定版本的 ICS"""
+    cache_key = f'ics:{user.id}:{version}'
+    content = cache.get(cache_key)
+    record_cache('ics', content is not None)
+    if content is None:
+        content = build_ics(user, name)
+        cache.set(cache_key, content, ICS_CACHE_TIMEOUT)
+    return content
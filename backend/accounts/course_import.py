@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+課程 Excel 匯入
+解析課表 Excel（15/16 欄與 31 欄格式）並批次建立開課資料
+欄位對應與前端 CreateCourse.jsx 的匯入邏輯一致
+"""
+import logging
+import re
+
+import openpyxl
+from django.db import transaction
+
+from .credits import enrolled_student_ids, rebuild_credit_summaries, touch_credit_summaries
+from .models import Course, CourseOffering, OfferingTeacher, ClassTime, Department, normalize_name
+from .occupancy import (
+    describe_conflicts, describe_teacher_conflicts, find_teacher_conflicts,
+    normalize_classroom, build_room_index, build_teacher_index,
+)
+from .teacher_resolver import TeacherResolver
+from .timeslots import ALL_WEEKS
+
+logger = logging.getLogger(__name__)
+
+# 欄位索引：(學期, 開課系所, 課程代碼, 年級, 課程名稱, 教師, 人數上限, 學分, 每週時數, 課別, 教室, 星期, 節次, 描述)
+STANDARD_COLUMNS = (0, 2, 3, 4, 5, 6, 7, 8, 10, 11, 12, 13, 14, 15)
+WIDE_COLUMNS = (1, None, 5, 7, 9, 11, 12, 15, 17, 19, 20, 21, 22, 24)
+
+HEADER_KEYWORDS = ('學期', '科目中文名稱', '授課教師姓名')
+
+WEEKDAY_MAP = {
+    '1': '1', '一': '1', '星期一': '1',
+    '2': '2', '二': '2', '星期二': '2',
+    '3': '3', '三': '3', '星期三': '3',
+    '4': '4', '四': '4', '星期四': '4',
+    '5': '5', '五': '5', '星期五': '5',
+    '6': '6', '六': '6', '星期六': '6',
+    '7': '7', '日': '7', '星期日': '7',
+}
+
+
+def map_course_type(category_name):
+    """課別名稱對應到課程類型"""
+    name = str(category_name or '').strip()
+    if '通識必修' in name:
+        return 'general_required'
+    if '通識選修' in name:
+        return 'general_elective'
+    if '必修' in name:
+        return 'required'
+    if '選修' in name:
+        return 'elective'
+    if '通識' in name:
+        return 'general_elective'
+    return 'elective'
+
+
+def map_weekday(weekday_text):
+    """星期文字對應到數字"""
+    return WEEKDAY_MAP.get(str(weekday_text or '').strip(), '1')
+
+
+def parse_periods(period_text):
+    """解析節次，回傳 (開始節次, 結束節次)"""
+    text = str(period_text or '').strip()
+    if not text:
+        return 1, 1
+
+    if ',' in text:
+        periods = [int(p) for p in text.split(',') if p.strip().isdigit()]
+        if periods:
+            return min(periods), max(periods)
+
+    if '-' in text:
+        periods = [int(p) for p in text.split('-') if p.strip().isdigit()]
+        if len(periods) == 2:
+            return periods[0], periods[1]
+
+    if text.isdigit():
+        return int(text), int(text)
+
+    return 1, 1
+
+
+def parse_teachers(teacher_text):
+    """解析教師名稱（支援頓號、逗號、分號分隔）"""
+    return [n.strip() for n in re.split(r'[、,;]', str(teacher_text or '')) if n.strip()]
+
+
+def _to_int(value, default):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _cell(row, index):
+    if index is None or index >= len(row) or row[index] is None:
+        return ''
+    return str(row[index]).strip()
+
+
+def read_workbook_rows(file_obj):
+    """以唯讀模式讀取第一個工作表的所有列"""
+    wb = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        return list(wb.active.iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+def parse_rows(all_rows):
+    """
+    解析工作表的所有列，回傳 [(列號, 課程資料 dict)]
+    自動偵測標題列；有「開課系所」或欄位不多時使用標準格式，否則使用 31 欄格式
+    """
+    start = 0
+    columns = STANDARD_COLUMNS
+    for i, row in enumerate(all_rows[:10]):
+        cells = [str(c) for c in row if c is not None]
+        if any(keyword in cell for cell in cells for keyword in HEADER_KEYWORDS):
+            start = i + 1
+            if not any('開課系所' in cell for cell in cells) and len(row) > 20:
+                columns = WIDE_COLUMNS
+            break
+
+    parsed = []
+    for idx, row in enumerate(all_rows[start:], start=start + 1):
+        if not row or not row[0]:
+            continue
+        (semester, dept, code, grade, name, teachers, max_students, credits,
+         _hours, category, classroom, weekday, period, description) = [_cell(row, c) for c in columns]
+        start_period, end_period = parse_periods(period)
+        parsed.append((idx, {
+            'academic_year': semester[:3],
+            'semester': semester[3:4],
+            'department': dept,
+            'course_code': code,
+            'course_name': name,
+            'course_type': map_course_type(category),
+            'description': description,
+            'credits': _to_int(credits, 2),
+            'grade_level': _to_int(grade, 1),
+            'teacher_names': parse_teachers(teachers),
+            'max_students': _to_int(max_students, 50),
+            'classroom': classroom,
+            'weekday': map_weekday(weekday),
+            'start_period': start_period,
+            'end_period': end_period,
+        }))
+    return parsed
+
+
+def import_course_rows(parsed_rows, default_department, progress=None):
+    """
+    批次建立開課資料，回傳 (成功筆數, 錯誤訊息列表)
+    所有教師姓名先以 TeacherResolver 一次解析，課程與系所也一次預先載入
+    教室與教師佔用以各學期的 OccupancyIndex 檢查，已匯入的列也加入索引供後續列比對
+    progress 為背景工作的 JobProgress，每處理一列回報一次（實際分段寫入）
+    """
+    errors = []
+    valid_rows = []
+    for idx, data in parsed_rows:
+        if not data['course_code']:
+            errors.append(f"第 {idx} 列：缺少課程代碼")
+        elif not data['course_name']:
+            errors.append(f"第 {idx} 列：缺少課程名稱")
+        elif not data['teacher_names']:
+            errors.append(f"第 {idx} 列：缺少教師姓名")
+        else:
+            valid_rows.append((idx, data))
+
+    resolver = TeacherResolver()
+    teachers_by_key = resolver.resolve_many(
+        [name for _, data in valid_rows for name in data['teacher_names']]
+    )
+    courses = Course.objects.in_bulk(
+        {data['course_code'] for _, data in valid_rows}, field_name='course_code'
+    )
+    departments = {d.name: d for d in Department.objects.all()}
+
+    # 重複開課（同課程、學期、系所、時段、教室）與教室佔用都在記憶體中比對，不逐列查詢
+    existing_slots = set(ClassTime.objects.filter(
+        offering__course__course_code__in={data['course_code'] for _, data in valid_rows}
+    ).values_list(
+        'offering__course__course_code', 'offering__academic_year', 'offering__semester',
+        'offering__department_id', 'weekday', 'start_period', 'end_period', 'classroom',
+    ))
+    room_indexes = {}
+    teacher_indexes = {}
+    recredited_courses = set()  # 學分或類別有變動的既有課程，匯入完成後一次重算學分統計
+    renamed_courses = set()  # 其他欄位有變動的既有課程，只需讓成績單快取失效
+
+    success_count = 0
+    for done, (idx, data) in enumerate(valid_rows, start=len(parsed_rows) - len(valid_rows)):
+        if progress is not None:
+            progress.update(done)
+        department_name = data['department'] or default_department
+        department = departments.get(department_name)
+        if department is None:
+            department, _ = Department.objects.get_or_create(name=department_name)
+            departments[department_name] = department
+
+        course = courses.get(data['course_code'])
+        try:
+            with transaction.atomic():
+                if course is None:
+                    course = Course.objects.create(
+                        course_code=data['course_code'],
+                        course_name=data['course_name'],
+                        course_type=data['course_type'],
+                        description=data['description'],
+                        credits=data['credits'],
+                    )
+                else:
+                    changed = [
+                        field for field in ('course_name', 'course_type', 'description', 'credits')
+                        if getattr(course, field) != data[field]
+                    ]
+                    for field in changed:
+                        setattr(course, field, data[field])
+                    if changed:
+                        course.save(update_fields=changed + ['updated_at'])
+                    if {'credits', 'course_type'} & set(changed):
+                        recredited_courses.add(course.id)
+                    elif changed:
+                        renamed_courses.add(course.id)
+
+                slot_key = (
+                    course.course_code, data['academic_year'], data['semester'], department.id,
+                    data['weekday'], data['start_period'], data['end_period'], data['classroom'],
+                )
+                if slot_key in existing_slots:
+                    courses[course.course_code] = course
+                    errors.append(f"第 {idx} 列：課程「{data['course_name']}」在同一時段已存在")
+                    continue
+
+                term = (data['academic_year'], data['semester'])
+                if term not in room_indexes:
+                    room_indexes[term] = build_room_index(*term)
+                room_key = normalize_classroom(data['classroom'])
+                conflicts = room_key and room_indexes[term].conflicts(
+                    room_key, data['weekday'], data['start_period'], data['end_period']
+                )
+                if conflicts:
+                    courses[course.course_code] = course
+                    errors.append(f"第 {idx} 列：" + describe_conflicts(
+                        f"教室 {data['classroom']}", data['weekday'],
+                        data['start_period'], data['end_period'], conflicts,
+                    ))
+                    continue
+
+                # 第一位教師為主開課，其餘為協同（同一教師只加入一次）
+                row_teachers = {}
+                for name in data['teacher_names']:
+                    teacher = teachers_by_key.get(normalize_name(name))
+                    if teacher is not None:
+                        row_teachers.setdefault(teacher.id, teacher)
+
+                if term not in teacher_indexes:
+                    teacher_indexes[term] = build_teacher_index(*term)
+                slot = (data['weekday'], data['start_period'], data['end_period'], ALL_WEEKS)
+                busy = find_teacher_conflicts(teacher_indexes[term], row_teachers, [slot])
+                if busy:
+                    courses[course.course_code] = course
+                    errors.append(f"第 {idx} 列：" + describe_teacher_conflicts(busy))
+                    continue
+
+                offering = CourseOffering.objects.create(
+                    course=course,
+                    department=department,
+                    academic_year=data['academic_year'],
+                    semester=data['semester'],
+                    grade_level=data['grade_level'],
+                    max_students=data['max_students'],
+                    current_students=0,
+                    status='open',
+                )
+
+                OfferingTeacher.objects.bulk_create([
+                    OfferingTeacher(offering=offering, teacher=teacher, role='co' if i else 'main')
+                    for i, teacher in enumerate(row_teachers.values())
+                ])
+
+                ClassTime.objects.create(
+                    offering=offering,
+                    weekday=data['weekday'],
+                    start_period=data['start_period'],
+                    end_period=data['end_period'],
+                    classroom=data['classroom'],
+                )
+            courses[course.course_code] = course
+            existing_slots.add(slot_key)
+            if room_key:
+                room_indexes[term].add(
+                    room_key, data['weekday'], data['start_period'], data['end_period'],
+                    offering.id, course.course_name,
+                )
+            for teacher_id in row_teachers:
+                teacher_indexes[term].add(teacher_id, *slot[:3], offering.id, course.course_name)
+            success_count += 1
+        except Exception as e:
+            errors.append(f"第 {idx} 列（{data['course_name']}）：{str(e)}")
+
+    if recredited_courses:
+        rebuild_credit_summaries(enrolled_student_ids(
+            CourseOffering.objects.filter(course_id__in=recredited_courses)
+        ))
+    renamed_courses -= recredited_courses
+    if renamed_courses:
+        touch_credit_summaries(enrolled_student_ids(
+            CourseOffering.objects.filter(course_id__in=renamed_courses)
+        ))
+    if progress is not None:
+        progress.update(len(parsed_rows), force=True)
+    if resolver.created:
+        logger.info('匯入時自動創建 %s 位教師', len(resolver.created))
+    return success_count, errors
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+開課資料差異更新
+比對傳入資料與目前資料，只寫入有變動的欄位與關聯資料列
+回傳變動清單，供快取精準失效使用
+上課時段、教師或學期改變時檢查教室與教師佔用，衝突時拋出 OccupancyConflict
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .credits import enrolled_student_ids, rebuild_credit_summaries, touch_credit_summaries
+from .models import Course, CourseOffering, OfferingTeacher, ClassTime, Department
+from .occupancy import check_room_free, check_teachers_free
+
+COURSE_FIELDS = ('course_code', 'course_name', 'course_type', 'description', 'credits')
+OFFERING_FIELDS = ('academic_year', 'semester', 'grade_level', 'max_students')
+
+
+def _apply_fields(instance, data, field_names):
+    """將 data 中有變動的欄位寫入 instance（先轉型再比較），回傳變動欄位名稱"""
+    changed = []
+    for name in field_names:
+        if name not in data:
+            continue
+        value = instance._meta.get_field(name).to_python(data[name])
+        if getattr(instance, name) != value:
+            setattr(instance, name, value)
+            changed.append(name)
+    return changed
+
+
+def _diff_teachers(offering, teacher_id, co_teacher_ids):
+    """
+    比對教師關係：新增缺少的、刪除多餘的、只更新角色有變的
+    co_teacher_ids 為 None 時保留原有協同教師
+    """
+    current = {ot.teacher_id: ot for ot in offering.offering_teachers.all()}
+
+    desired = {}
+    if co_teacher_ids is None:
+        desired.update({tid: 'co' for tid, ot in current.items() if ot.role == 'co'})
+    else:
+        desired.update({int(tid): 'co' for tid in co_teacher_ids})
+    desired[int(teacher_id)] = 'main'
+
+    missing_ids = set(desired) - set(current)
+    if missing_ids:
+        found = set(User.objects.filter(id__in=missing_ids).values_list('id', flat=True))
+        if found != missing_ids:
+            raise User.DoesNotExist()
+
+    removed = [tid for tid in current if tid not in desired]
+    added = [tid for tid in desired if tid not in current]
+    role_changed = [current[tid] for tid in desired if tid in current and current[tid].role != desired[tid]]
+
+    if removed:
+        OfferingTeacher.objects.filter(offering=offering, teacher_id__in=removed).delete()
+    if added:
+        OfferingTeacher.objects.bulk_create([
+            OfferingTeacher(offering=offering, teacher_id=tid, role=desired[tid]) for tid in added
+        ])
+    for ot in role_changed:
+        ot.role = desired[ot.teacher_id]
+    if role_changed:
+        OfferingTeacher.objects.bulk_update(role_changed, ['role'])
+
+    return {
+        'added': added,
+        'removed': removed,
+        'role_changed': [ot.teacher_id for ot in role_changed],
+    }
+
+
+def _diff_class_times(offering, desired_slots):
+    """比對上課時段：完全相同的時段保留原資料列，其餘批次刪除或新增"""
+    current = {
+        (ct.weekday, ct.start_period, ct.end_period, ct.classroom): ct.id
+        for ct in offering.class_times.all()
+    }
+    removed_ids = [ct_id for slot, ct_id in current.items() if slot not in desired_slots]
+    added = [slot for slot in desired_slots if slot not in current]
+
+    if removed_ids:
+        ClassTime.objects.filter(id__in=removed_ids).delete()
+    if added:
+        class_times = [
+            ClassTime(offering=offering, weekday=w, start_period=s, end_period=e, classroom=room)
+            for w, s, e, room in added
+        ]
+        for ct in class_times:
+            ct.refresh_masks()  # bulk_create 不會呼叫 save
+        ClassTime.objects.bulk_create(class_times)
+
+    return {'added': len(added), 'removed': len(removed_ids)}
+
+
+def apply_course_update(offering, data):
+    """
+    依 data 差異更新開課資料，回傳變動清單，例如
+    {'course': ['credits'], 'offering': ['max_students'], 'teachers': {...}, 'class_times': {...}}
+    沒有變動的部分不會出現在回傳值中
+    """
+    changes = {}
+    course = offering.course
+
+    with transaction.atomic():
+        course_changed = _apply_fields(course, data, COURSE_FIELDS)
+        if course_changed:
+            course.save(update_fields=course_changed + ['updated_at'])
+            changes['course'] = course_changed
+
+        offering_changed = _apply_fields(offering, data, OFFERING_FIELDS)
+
+        department_name = data.get('department')
+        if department_name and department_name != offering.department.name:
+            offering.department, _ = Department.objects.get_or_create(name=department_name)
+            offering_changed.append('department')
+
+        # 人數上限改變時同步更新額滿狀態（停開的課不變）
+        if 'max_students' in offering_changed and offering.status != 'closed':
+            status = 'full' if offering.current_students >= offering.max_students else 'open'
+            if status != offering.status:
+                offering.status = status
+                offering_changed.append('status')
+
+        if offering_changed:
+            offering.save(update_fields=offering_changed + ['updated_at'])
+            changes['offering'] = offering_changed
+
+        teacher_id = data.get('teacher_id')
+        if teacher_id:
+            teacher_changes = _diff_teachers(offering, teacher_id, data.get('co_teachers'))
+            if any(teacher_changes.values()):
+                changes['teachers'] = teacher_changes
+
+        classroom = data.get('classroom')
+        weekday = data.get('weekday')
+        start_period = data.get('start_period')
+        end_period = data.get('end_period')
+        if all([classroom, weekday, start_period, end_period]):
+            slot = (str(weekday), int(start_period), int(end_period), classroom)
+            current_slots = {
+                (ct.weekday, ct.start_period, ct.end_period, ct.classroom) for ct in offering.class_times.all()
+            }
+            if slot not in current_slots or {'academic_year', 'semester'} & set(offering_changed):
+                # 新時段或換學期時檢查教室是否已被其他開課使用（衝突時整筆更新回滾）
+                check_room_free(
+                    offering.academic_year, offering.semester, classroom, *slot[:3], exclude=offering.id
+                )
+            time_changes = _diff_class_times(offering, {slot})
+            if any(time_changes.values()):
+                changes['class_times'] = time_changes
+
+        term_changed = {'academic_year', 'semester'} & set(offering_changed)
+        if 'teachers' in changes or 'class_times' in changes or term_changed:
+            # 教師、時段或學期改變後，檢查所有授課教師在新時段是否已有其他課
+            check_teachers_free(
+                offering.academic_year, offering.semester,
+                OfferingTeacher.objects.filter(offering=offering).values_list('teacher_id', flat=True),
+                list(ClassTime.objects.filter(offering=offering).values_list(
+                    'weekday', 'start_period', 'end_period', 'week_mask'
+                )),
+                exclude=offering.id,
+            )
+
+        if changes and 'offering' not in changes:
+            # 課程、教師或時段變動也更新開課的 updated_at，以其為版本的快取（教師授課列表）隨之失效
+            CourseOffering.objects.filter(id=offering.id).update(updated_at=timezone.now())
+
+        # 學分、類別或學期改變時重算相關學生的學分統計；其他變動只更新版本，讓成績單快取失效
+        if {'credits', 'course_type'} & set(changes.get('course', [])):
+            rebuild_credit_summaries(enrolled_student_ids(course.offerings.all()))
+        elif {'academic_year', 'semester'} & set(changes.get('offering', [])):
+            rebuild_credit_summaries(enrolled_student_ids([offering.id]))
+        elif 'course' in changes:
+            touch_credit_summaries(enrolled_student_ids(course.offerings.all()))
+        elif changes:
+            touch_credit_summaries(enrolled_student_ids([offering.id]))
+
+    return changes
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+學分統計（CreditSummary）維護
+選課、退選、成績變動時以差異值（F 表達式）增量更新該學生的一列統計，
+課程學分或學期變動等影響多筆紀錄的操作則以 rebuild_credit_summaries 批次重算
+GPA 由 gpa.compute_gpa 批次計算，於重算時一併寫入
+"""
+from collections import Counter
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .gpa import compute_gpa, load_arrays, term_key
+from .models import CreditSummary, Enrollment
+
+# 課程類別 -> 統計欄位分類
+CATEGORY_BY_COURSE_TYPE = {
+    'required': 'required',
+    'elective': 'elective',
+    'general_required': 'general',
+    'general_elective': 'general',
+}
+
+CREDIT_FIELDS = (
+    'total_credits', 'required_credits', 'elective_credits', 'general_credits',
+    'passed_credits', 'failed_credits',
+    'semester_total_credits', 'semester_required_credits',
+    'semester_elective_credits', 'semester_general_credits',
+)
+
+GPA_FIELDS = ('gpa', 'cumulative_gpa')
+
+REBUILD_CHUNK_SIZE = 500
+GPA_WRITE_BATCH_SIZE = 1000
+
+
+def current_term():
+    """目前學期 (學年度, 學期)"""
+    return settings.CURRENT_ACADEMIC_YEAR, settings.CURRENT_SEMESTER
+
+
+def contribution(status, course_type, credits, is_current_term):
+    """
+    單筆選課紀錄對統計欄位的貢獻
+    - 歷年學分：目前學期以外已通過的課程
+    - 本學期學分：目前學期選課中的課程
+    """
+    result = Counter()
+    credits = credits or 0
+    category = CATEGORY_BY_COURSE_TYPE.get(course_type)
+
+    if status == 'passed':
+        result['passed_credits'] += credits
+        if category and not is_current_term:
+            result[f'{category}_credits'] += credits
+            result['total_credits'] += credits
+    elif status == 'failed':
+        result['failed_credits'] += credits
+    elif status == 'enrolled' and category and is_current_term:
+        result[f'semester_{category}_credits'] += credits
+        result['semester_total_credits'] += credits
+    return result
+
+
+def record_enrollment_change(enrollment, old_status, new_status):
+    """
+    選課紀錄狀態改變後（已寫入資料庫）更新該學生的統計
+    新建立傳 old_status=None，刪除傳 new_status=None
+    """
+    offering = enrollment.offering
+    course = offering.course
+    is_current = (offering.academic_year, offering.semester) == current_term()
+
+    delta = contribution(new_status, course.course_type, course.credits, is_current)
+    delta.subtract(contribution(old_status, course.course_type, course.credits, is_current))
+    apply_credit_delta(enrollment.student_id, delta)
+
+
+def apply_credit_delta(student_id, delta):
+    """
+    以 UPDATE ... SET x = x + n 套用差異值；該學生尚無本學期統計時改為整筆重算
+    差異為零（0 學分、非目前學期等）時仍更新 updated_at，以其為版本的成績單快取才會失效
+    """
+    changes = {field: F(field) + value for field, value in delta.items() if value}
+    year, semester = current_term()
+    updated = CreditSummary.objects.filter(
+        student_id=student_id, term_academic_year=year, term_semester=semester
+    ).update(**changes, updated_at=timezone.now())
+    if not updated:
+        rebuild_credit_summaries([student_id])
+
+
+def _aggregate(student_ids):
+    """一次查詢計算多位學生的所有統計欄位"""
+    year, semester = current_term()
+    in_term = Q(offering__academic_year=year, offering__semester=semester)
+    credits = 'offering__course__credits'
+
+    def total(condition):
+        return Sum(credits, filter=condition, default=0)
+
+    def category(*names):
+        types = [t for t, c in CATEGORY_BY_COURSE_TYPE.items() if c in names]
+        return Q(offering__course__course_type__in=types)
+
+    passed_before_term = Q(status='passed') & ~in_term
+    enrolled_in_term = Q(status='enrolled') & in_term
+    annotations = {
+        'passed_credits': total(Q(status='passed')),
+        'failed_credits': total(Q(status='failed')),
+        'total_credits': total(passed_before_term & category('required', 'elective', 'general')),
+        'semester_total_credits': total(enrolled_in_term & category('required', 'elective', 'general')),
+    }
+    for name in ('required', 'elective', 'general'):
+        annotations[f'{name}_credits'] = total(passed_before_term & category(name))
+        annotations[f'semester_{name}_credits'] = total(enrolled_in_term & category(name))
+
+    rows = Enrollment.objects.filter(student_id__in=student_ids).values('student_id').annotate(**annotations)
+    return {row.pop('student_id'): row for row in rows}
+
+
+def rebuild_credit_summaries(student_ids=None, chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    依選課紀錄整筆重算學分統計，回傳處理的學生數
+    student_ids 為 None 時重算所有有選課紀錄或已有統計的學生
+    """
+    if student_ids is None:
+        student_ids = set(Enrollment.objects.values_list('student_id', flat=True).distinct())
+        student_ids |= set(CreditSummary.objects.values_list('student_id', flat=True))
+    student_ids = sorted(set(student_ids))
+
+    year, semester = current_term()
+    now = timezone.now()
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        totals = _aggregate(chunk)
+        gpa = compute_gpa(load_arrays(chunk))
+        existing = CreditSummary.objects.in_bulk(chunk, field_name='student_id')
+
+        to_update, to_create = [], []
+        for student_id in chunk:
+            values = totals.get(student_id) or dict.fromkeys(CREDIT_FIELDS, 0)
+            summary = existing.get(student_id) or CreditSummary(student_id=student_id)
+            for field in CREDIT_FIELDS:
+                setattr(summary, field, values[field])
+            _set_gpa(summary, gpa)
+            summary.term_academic_year = year
+            summary.term_semester = semester
+            summary.updated_at = now
+            (to_update if summary.pk else to_create).append(summary)
+
+        if to_update:
+            CreditSummary.objects.bulk_update(
+                to_update,
+                list(CREDIT_FIELDS) + list(GPA_FIELDS) + ['term_academic_year', 'term_semester', 'updated_at'],
+            )
+        if to_create:
+            # 併發建立同一學生時，另一方以相同資料建立，忽略衝突即可
+            CreditSummary.objects.bulk_create(to_create, ignore_conflicts=True)
+
+    return len(student_ids)
+
+
+def _to_decimal(value):
+    return Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _set_gpa(summary, gpa):
+    """將 compute_gpa 的結果寫入 summary（gpa 為目前學期 GPA）"""
+    current = term_key(*current_term())
+    summary.gpa = _to_decimal(gpa['term'].get((summary.student_id, current), 0))
+    summary.cumulative_gpa = _to_decimal(gpa['cumulative'].get(summary.student_id, 0))
+
+
+def update_gpa_summaries(student_ids=None, progress=None):
+    """
+    學期結算：批次計算 GPA 與通過 / 未通過學分並以 bulk_update 寫回，回傳更新的學生數
+    所有成績以一次查詢讀取，尚無統計資料的學生改以 rebuild_credit_summaries 建立
+    """
+    gpa = compute_gpa(load_arrays(student_ids))
+
+    if student_ids is None:
+        student_ids = set(gpa['cumulative']) | set(CreditSummary.objects.values_list('student_id', flat=True))
+    student_ids = sorted(set(student_ids))
+    if progress is not None:
+        progress.set_total(len(student_ids), '計算 GPA 中')
+
+    now = timezone.now()
+    missing = []
+    for start in range(0, len(student_ids), GPA_WRITE_BATCH_SIZE):
+        chunk = student_ids[start:start + GPA_WRITE_BATCH_SIZE]
+        summaries = CreditSummary.objects.in_bulk(chunk, field_name='student_id')
+        missing.extend(sid for sid in chunk if sid not in summaries)
+
+        for summary in summaries.values():
+            _set_gpa(summary, gpa)
+            summary.passed_credits = int(gpa['passed'].get(summary.student_id, 0))
+            summary.failed_credits = int(gpa['failed'].get(summary.student_id, 0))
+            summary.updated_at = now
+        CreditSummary.objects.bulk_update(
+            summaries.values(), list(GPA_FIELDS) + ['passed_credits', 'failed_credits', 'updated_at']
+        )
+        if progress is not None:
+            progress.update(start + len(chunk))
+
+    if missing:
+        rebuild_credit_summaries(missing)
+    return len(student_ids)
+
+
+def touch_credit_summaries(student_ids):
+    """只更新 updated_at（課程名稱、教師等不影響學分的變動），讓以其為版本的成績單快取失效"""
+    if student_ids:
+        CreditSummary.objects.filter(student_id__in=student_ids).update(updated_at=timezone.now())
+
+
+def enrolled_student_ids(offerings):
+    """選修指定開課（queryset 或 ID 列表）的學生 ID"""
+    return list(
+        Enrollment.objects.filter(offering__in=offerings).values_list('student_id', flat=True).distinct()
+    )
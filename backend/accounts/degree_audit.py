@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+畢業門檻檢核
+各系所的 GraduationRule 先編譯成簡單結構（課程代碼 frozenset、學分門檻），在程序內快取；
+學生的已通過課程以一次查詢整理成「課程代碼集合 + 各類別學分」，檢核只做集合與數值比較
+批次模式一次載入整屆學生的資料，每個系所的規則只編譯一次
+"""
+from collections import defaultdict, namedtuple
+
+from django.db.models import Count, Max, Q
+
+from .credits import CATEGORY_BY_COURSE_TYPE
+from .models import Enrollment, GraduationRule, Profile
+
+CompiledRule = namedtuple('CompiledRule', 'id name rule_type category min_credits codes min_count')
+
+# 學生已通過課程的彙整：codes 為課程代碼集合，credits 為 {類別: 學分}（含 total），
+# code_credits 為 {課程代碼: 學分}（重修通過的課程只計一次）
+PassedCourses = namedtuple('PassedCourses', 'codes credits code_credits')
+
+EMPTY_PASSED = PassedCourses(frozenset(), {'total': 0}, {})
+
+LOAD_CHUNK_SIZE = 2000
+
+_compiled = {}  # 系所名稱 -> 編譯後的規則 tuple
+_compiled_version = None
+
+
+def _rules_version():
+    """規則版本（筆數 + 最後更新時間），任何 worker 修改規則後其他 worker 都會重新編譯"""
+    stats = GraduationRule.objects.aggregate(count=Count('id'), last=Max('updated_at'))
+    return stats['count'], stats['last']
+
+
+def _compile(rule):
+    return CompiledRule(
+        id=rule.id,
+        name=rule.name,
+        rule_type=rule.rule_type,
+        category=rule.category or 'total',
+        min_credits=rule.min_credits or 0,
+        codes=frozenset(str(code).strip() for code in (rule.course_codes or []) if str(code).strip()),
+        min_count=rule.min_count or 0,
+    )
+
+
+def compile_rules(department_names):
+    """編譯多個系所的規則（全校規則 + 系所規則），回傳 {系所名稱: tuple}"""
+    global _compiled_version
+    version = _rules_version()
+    if version != _compiled_version:
+        _compiled.clear()
+        _compiled_version = version
+
+    missing = [name for name in set(department_names) if name not in _compiled]
+    if missing:
+        rules = GraduationRule.objects.filter(is_active=True).filter(
+            Q(department__isnull=True) | Q(department__name__in=missing)
+        ).select_related('department').order_by('id')
+
+        common, by_department = [], defaultdict(list)
+        for rule in rules:
+            if rule.department_id is None:
+                common.append(_compile(rule))
+            else:
+                by_department[rule.department.name].append(_compile(rule))
+        for name in missing:
+            _compiled[name] = tuple(common + by_department.get(name, []))
+
+    return {name: _compiled[name] for name in department_names}
+
+
+def load_passed_courses(student_ids):
+    """整理多位學生的已通過課程（每 LOAD_CHUNK_SIZE 位學生一次查詢），回傳 {學生 ID: PassedCourses}"""
+    student_ids = list(student_ids)
+    code_credits = defaultdict(dict)
+    code_types = {}
+    for start in range(0, len(student_ids), LOAD_CHUNK_SIZE):
+        rows = Enrollment.objects.filter(
+            student_id__in=student_ids[start:start + LOAD_CHUNK_SIZE], status='passed'
+        ).order_by().values_list(
+            'student_id', 'offering__course__course_code',
+            'offering__course__course_type', 'offering__course__credits',
+        )
+        for student_id, code, course_type, credits in rows:
+            code_credits[student_id][code] = credits or 0
+            code_types[code] = course_type
+
+    result = {}
+    for student_id, courses in code_credits.items():
+        credits = defaultdict(int)
+        for code, value in courses.items():
+            credits['total'] += value
+            category = CATEGORY_BY_COURSE_TYPE.get(code_types[code])
+            if category:
+                credits[category] += value
+        result[student_id] = PassedCourses(frozenset(courses), dict(credits), courses)
+    return result
+
+
+def evaluate(rules, passed):
+    """以編譯後的規則檢核一位學生，回傳 {'eligible': bool, 'rules': [...]}"""
+    results = []
+    for rule in rules:
+        if rule.rule_type == 'category_credits':
+            actual = passed.credits.get(rule.category, 0)
+            ok = actual >= rule.min_credits
+            detail = {'required': rule.min_credits, 'actual': actual}
+
+        elif rule.rule_type == 'required_courses':
+            missing = rule.codes - passed.codes
+            ok = not missing
+            detail = {
+                'required': len(rule.codes),
+                'actual': len(rule.codes) - len(missing),
+                'missing': sorted(missing),
+            }
+
+        else:  # course_group
+            matched = rule.codes & passed.codes
+            matched_credits = sum(passed.code_credits[code] for code in matched)
+            ok = len(matched) >= rule.min_count and matched_credits >= rule.min_credits
+            detail = {
+                'required': rule.min_count,
+                'actual': len(matched),
+                'required_credits': rule.min_credits,
+                'actual_credits': matched_credits,
+            }
+
+        results.append({
+            'rule_id': rule.id,
+            'name': rule.name,
+            'rule_type': rule.rule_type,
+            'passed': ok,
+            **detail,
+        })
+
+    return {'eligible': all(r['passed'] for r in results), 'rules': results}
+
+
+def audit_students(profiles):
+    """
+    批次檢核：profiles 為 Profile 列表（需有 user_id 與 department）
+    回傳 {學生 ID: 檢核結果}；每個系所的規則只編譯一次，成績只查詢一次
+    """
+    profiles = list(profiles)
+    rules_by_department = compile_rules({p.department or '' for p in profiles})
+    passed_by_student = load_passed_courses([p.user_id for p in profiles])
+    return {
+        p.user_id: evaluate(
+            rules_by_department[p.department or ''],
+            passed_by_student.get(p.user_id, EMPTY_PASSED),
+        )
+        for p in profiles
+    }
+
+
+def audit_student(profile):
+    return audit_students([profile])[profile.user_id]
+
+
+def graduating_profiles(department=None, grade=None):
+    """選取要檢核的學生（可依系所與年級篩選）"""
+    profiles = Profile.objects.filter(roles__name='student').only(
+        'id', 'user_id', 'department', 'student_id', 'real_name', 'grade'
+    )
+    if department:
+        profiles = profiles.filter(department=department)
+    if grade:
+        profiles = profiles.filter(grade=grade)
+    return profiles.order_by('student_id')
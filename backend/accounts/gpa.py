@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+GPA 批次計算引擎
+將選課紀錄（成績、狀態、學分、學期）讀成平行陣列，以分組加總一次算出
+每位學生的累計 GPA、各學期 GPA、已通過與未通過學分
+有安裝 NumPy 時使用向量化運算（np.unique + np.bincount），否則以單次迴圈累加
+"""
+import math
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 為選用套件
+    np = None
+
+from .models import Enrollment
+
+# 等第 -> 績分（4.3 制）
+GRADE_POINTS = {
+    'A+': 4.3, 'A': 4.0, 'A-': 3.7,
+    'B+': 3.3, 'B': 3.0, 'B-': 2.7,
+    'C+': 2.3, 'C': 2.0, 'C-': 1.7,
+    'D': 1.0, 'F': 0.0,
+}
+
+# 只有百分制成績時的等第換算（分數下限由高到低）
+SCORE_GRADES = (
+    (90, 'A+'), (85, 'A'), (80, 'A-'),
+    (77, 'B+'), (73, 'B'), (70, 'B-'),
+    (67, 'C+'), (63, 'C'), (60, 'C-'),
+    (50, 'D'), (0, 'F'),
+)
+
+# 計入 GPA 的狀態；陣列中以整數代碼表示
+STATUS_CODES = {'passed': 1, 'failed': 2}
+
+LOAD_CHUNK_SIZE = 10000
+
+
+def grade_point(grade, score):
+    """等第優先，沒有等第時由百分制換算；都沒有時回傳 None（不計入 GPA）"""
+    if grade:
+        return GRADE_POINTS.get(grade)
+    if score is not None:
+        score = float(score)
+        for lower, letter in SCORE_GRADES:
+            if score >= lower:
+                return GRADE_POINTS[letter]
+    return None
+
+
+def term_key(academic_year, semester):
+    """學期鍵值，例如 114 學年度第 1 學期 -> 1141"""
+    return int(academic_year) * 10 + int(semester)
+
+
+def load_arrays(student_ids=None):
+    """
+    讀取已結算（通過 / 未通過）的選課紀錄為平行陣列
+    回傳 dict：student、term、point（無成績為 nan）、credits、status（STATUS_CODES）
+    """
+    enrollments = Enrollment.objects.filter(status__in=list(STATUS_CODES))
+    if student_ids is not None:
+        enrollments = enrollments.filter(student_id__in=student_ids)
+    rows = enrollments.order_by().values_list(
+        'student_id', 'offering__academic_year', 'offering__semester',
+        'grade', 'score', 'status', 'offering__course__credits',
+    ).iterator(chunk_size=LOAD_CHUNK_SIZE)
+
+    arrays = {'student': [], 'term': [], 'point': [], 'credits': [], 'status': []}
+    for student_id, year, semester, grade, score, status, credits in rows:
+        point = grade_point(grade, score)
+        arrays['student'].append(student_id)
+        arrays['term'].append(term_key(year, semester))
+        arrays['point'].append(math.nan if point is None else point)
+        arrays['credits'].append(credits or 0)
+        arrays['status'].append(STATUS_CODES[status])
+    return arrays
+
+
+def compute_gpa(arrays):
+    """
+    依平行陣列計算 GPA（學分加權平均），回傳 dict：
+    cumulative {student: gpa}、term {(student, term): gpa}、passed / failed {student: 學分}
+    沒有任何成績的學生 GPA 為 0
+    """
+    if np is not None:
+        return _compute_numpy(arrays)
+    return _compute_python(arrays)
+
+
+def _compute_numpy(arrays):
+    students = np.asarray(arrays['student'], dtype=np.int64)
+    if students.size == 0:
+        return {'cumulative': {}, 'term': {}, 'passed': {}, 'failed': {}}
+    terms = np.asarray(arrays['term'], dtype=np.int64)
+    points = np.asarray(arrays['point'], dtype=np.float64)
+    credits = np.asarray(arrays['credits'], dtype=np.float64)
+    status = np.asarray(arrays['status'], dtype=np.int8)
+
+    graded = ~np.isnan(points)
+    weight = np.where(graded, credits, 0.0)
+    weighted_points = np.where(graded, credits * np.nan_to_num(points), 0.0)
+
+    # 依學生分組
+    student_keys, s_idx = np.unique(students, return_inverse=True)
+    n = student_keys.size
+    cumulative = _ratio(np.bincount(s_idx, weighted_points, n), np.bincount(s_idx, weight, n))
+    passed = np.bincount(s_idx, np.where(status == STATUS_CODES['passed'], credits, 0.0), n)
+    failed = np.bincount(s_idx, np.where(status == STATUS_CODES['failed'], credits, 0.0), n)
+
+    # 依 (學生, 學期) 分組
+    term_keys, t_idx = np.unique(terms, return_inverse=True)
+    pair_keys, p_idx = np.unique(s_idx * term_keys.size + t_idx, return_inverse=True)
+    m = pair_keys.size
+    term_gpa = _ratio(np.bincount(p_idx, weighted_points, m), np.bincount(p_idx, weight, m))
+    pair_students = student_keys[pair_keys // term_keys.size]
+    pair_terms = term_keys[pair_keys % term_keys.size]
+
+    student_list = student_keys.tolist()
+    return {
+        'cumulative': dict(zip(student_list, cumulative.tolist())),
+        'term': dict(zip(zip(pair_students.tolist(), pair_terms.tolist()), term_gpa.tolist())),
+        'passed': dict(zip(student_list, passed.tolist())),
+        'failed': dict(zip(student_list, failed.tolist())),
+    }
+
+
+def _ratio(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def _compute_python(arrays):
+    sums = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0])  # student -> [績分×學分, 計分學分, 通過, 未通過]
+    term_sums = defaultdict(lambda: [0.0, 0.0])
+    passed_code, failed_code = STATUS_CODES['passed'], STATUS_CODES['failed']
+
+    for student, term, point, credits, status in zip(
+        arrays['student'], arrays['term'], arrays['point'], arrays['credits'], arrays['status']
+    ):
+        total = sums[student]
+        pair = term_sums[(student, term)]
+        if status == passed_code:
+            total[2] += credits
+        elif status == failed_code:
+            total[3] += credits
+        if point == point:  # 排除 nan
+            total[0] += point * credits
+            total[1] += credits
+            pair[0] += point * credits
+            pair[1] += credits
+
+    return {
+        'cumulative': {s: (t[0] / t[1] if t[1] else 0.0) for s, t in sums.items()},
+        'term': {k: (t[0] / t[1] if t[1] else 0.0) for k, t in term_sums.items()},
+        'passed': {s: t[2] for s, t in sums.items()},
+        'failed': {s: t[3] for s, t in sums.items()},
+    }
+
+
+def naive_gpa(arrays):
+    """逐一學生、逐一學期重新計算的參考實作，用於驗證 compute_gpa 的正確性"""
+    rows_by_student = defaultdict(list)
+    for row in zip(arrays['student'], arrays['term'], arrays['point'], arrays['credits'], arrays['status']):
+        rows_by_student[row[0]].append(row)
+
+    def average(rows):
+        graded = [(p, c) for _, _, p, c, _ in rows if not math.isnan(p)]
+        credits = sum(c for _, c in graded)
+        return sum(p * c for p, c in graded) / credits if credits else 0.0
+
+    result = {'cumulative': {}, 'term': {}, 'passed': {}, 'failed': {}}
+    for student, rows in rows_by_student.items():
+        result['cumulative'][student] = average(rows)
+        result['passed'][student] = float(sum(c for *_, c, s in rows if s == STATUS_CODES['passed']))
+        result['failed'][student] = float(sum(c for *_, c, s in rows if s == STATUS_CODES['failed']))
+        for term in {r[1] for r in rows}:
+            result['term'][(student, term)] = average([r for r in rows if r[1] == term])
+    return result
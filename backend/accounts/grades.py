@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+成績登錄
+整班成績先全部驗證（任何一列有誤即整批不寫入），再以一次 bulk_update 寫回
+選課紀錄的等第、分數與通過 / 未通過狀態，最後對有變動的學生批次重算學分統計一次
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .credits import rebuild_credit_summaries
+from .gpa import GRADE_POINTS, grade_point
+from .models import Enrollment
+
+# 及格績分（C- 即百分制 60 分）
+PASSING_POINT = GRADE_POINTS['C-']
+
+# 可登錄成績的選課狀態（已退選不可登錄），也是開課目前人數（current_students）計入的狀態
+GRADABLE_STATUSES = ('enrolled', 'passed', 'failed')
+
+MAX_SCORE = Decimal('100')
+
+
+def roster_queryset(offering_id):
+    """開課的修課名單，學生帳號與個人資料以同一次 JOIN 載入"""
+    return Enrollment.objects.filter(
+        offering_id=offering_id, status__in=GRADABLE_STATUSES
+    ).select_related('student__profile').only(
+        'id', 'status', 'grade', 'score', 'student_id', 'student__username',
+        'student__profile__student_id', 'student__profile__real_name',
+        'student__profile__department', 'student__profile__grade',
+    ).order_by('student__profile__student_id', 'student_id')
+
+
+def status_for(grade, score):
+    """依成績決定狀態；沒有成績時回到「已選課」"""
+    point = grade_point(grade, score)
+    if point is None:
+        return 'enrolled'
+    return 'passed' if point >= PASSING_POINT else 'failed'
+
+
+def _parse_score(value):
+    if value is None or value == '':
+        return None
+    try:
+        score = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'分數格式錯誤: {value}')
+    if not Decimal('0') <= score <= MAX_SCORE:
+        raise ValueError(f'分數需介於 0 到 100: {value}')
+    return score
+
+
+def _parse_grade(value):
+    grade = (value or '').strip().upper()
+    if grade and grade not in GRADE_POINTS:
+        raise ValueError(f'等第不正確: {value}')
+    return grade or None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'enrollment_id 格式錯誤: {value}')
+
+
+def validate_grades(offering_id, rows):
+    """
+    驗證整批成績，回傳 (變更列表, 錯誤列表)
+    每列以 enrollment_id 或 student_id（學號）指定學生，grade / score 皆可留空
+    變更列表為 [(Enrollment, grade, score, status)]，只包含實際有變動的紀錄
+    """
+    enrollments = {e.id: e for e in roster_queryset(offering_id)}
+    by_student_id = {
+        e.student.profile.student_id: e
+        for e in enrollments.values()
+        if hasattr(e.student, 'profile') and e.student.profile.student_id
+    }
+
+    changes, errors, seen = [], [], set()
+    for index, row in enumerate(rows, start=1):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError('資料格式錯誤')
+            if row.get('enrollment_id'):
+                enrollment = enrollments.get(_to_int(row['enrollment_id']))
+            else:
+                enrollment = by_student_id.get(str(row.get('student_id') or '').strip())
+            if enrollment is None:
+                raise ValueError('找不到該學生的修課紀錄')
+            if enrollment.id in seen:
+                raise ValueError('同一位學生重複出現')
+            seen.add(enrollment.id)
+
+            grade = _parse_grade(row.get('grade'))
+            score = _parse_score(row.get('score'))
+        except ValueError as e:
+            errors.append({'row': index, 'error': str(e)})
+            continue
+
+        status = status_for(grade, score)
+        if (enrollment.grade, enrollment.score, enrollment.status) != (grade, score, status):
+            changes.append((enrollment, grade, score, status))
+
+    return changes, errors
+
+
+def save_grades(changes):
+    """
+    以一次 bulk_update 寫入成績，並對有變動的學生重算學分統計一次
+    已登錄成績的學生仍計入開課人數，因此不調整 current_students
+    """
+    if not changes:
+        return 0
+
+    now = timezone.now()
+    enrollments = []
+    for enrollment, grade, score, status in changes:
+        enrollment.grade = grade
+        enrollment.score = score
+        enrollment.status = status
+        enrollment.updated_at = now  # bulk_update 不會套用 auto_now
+        enrollments.append(enrollment)
+
+    with transaction.atomic():
+        Enrollment.objects.bulk_update(enrollments, ['grade', 'score', 'status', 'updated_at'])
+        # 重算會更新 CreditSummary.updated_at，成績單快取隨之失效
+        rebuild_credit_summaries({e.student_id for e in enrollments})
+    return len(enrollments)
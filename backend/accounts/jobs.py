@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+背景工作佇列
+以資料庫（BackgroundJob）作為佇列，預設在請求結束後以背景執行緒執行（JOBS_RUN_IN_THREAD），
+或由 `python manage.py run_jobs` 取出執行
+耗時的管理操作（Excel 匯入、人數校正等）改為建立工作後立即回傳 job_id，前端再輪詢進度
+執行中的工作以 heartbeat_at 作為租約，超過 JOBS_LEASE_SECONDS 未回報即標記失敗（worker 中斷時不會永遠停在執行中）
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# 工作類型 -> 處理函式 handler(job, progress)
+JOB_HANDLERS = {}
+
+
+def register_job(job_type):
+    """註冊背景工作處理函式"""
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+class JobProgress:
+    """
+    分段回報進度：每處理 chunk_size 筆或經過 interval 秒才寫入一次資料庫
+    只以 UPDATE 更新進度欄位（同時續約 heartbeat_at），避免每筆資料都寫一次
+    """
+
+    def __init__(self, job, chunk_size=100, interval=1.0):
+        self.job = job
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self._last_saved = 0
+        self._last_time = 0.0
+
+    def set_total(self, total, message=''):
+        self.job.progress_total = total
+        self.job.message = message[:200]
+        BackgroundJob.objects.filter(id=self.job.id).update(
+            progress_total=total, message=self.job.message, heartbeat_at=timezone.now()
+        )
+
+    def update(self, current, message=None, force=False):
+        self.job.progress_current = current
+        if message is not None:
+            self.job.message = message[:200]
+        now = time.monotonic()
+        if (force or current - self._last_saved >= self.chunk_size
+                or now - self._last_time >= self.interval):
+            BackgroundJob.objects.filter(id=self.job.id).update(
+                progress_current=current, message=self.job.message, heartbeat_at=timezone.now()
+            )
+            self._last_saved = current
+            self._last_time = now
+
+
+def enqueue_job(job_type, params=None, user=None):
+    """建立背景工作，回傳 BackgroundJob"""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"未知的工作類型: {job_type}")
+
+    job = BackgroundJob.objects.create(
+        job_type=job_type,
+        params=params or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+    # 無常駐 worker 的部署環境（如 Vercel）在背景執行緒中執行
+    if settings.JOBS_RUN_IN_THREAD:
+        transaction.on_commit(
+            lambda: threading.Thread(target=_run_in_thread, args=(job.id,), daemon=True).start()
+        )
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        job = claim_job(job_id)
+        if job is not None:
+            run_job(job)
+    finally:
+        close_old_connections()
+
+
+def claim_job(job_id):
+    """以條件式 UPDATE 搶占工作，多個 worker 同時執行時只有一個會成功"""
+    now = timezone.now()
+    claimed = BackgroundJob.objects.filter(id=job_id, status='pending').update(
+        status='running', started_at=now, heartbeat_at=now
+    )
+    if not claimed:
+        return None
+    return BackgroundJob.objects.get(id=job_id)
+
+
+def fail_stale_jobs(job_ids=None):
+    """
+    將租約逾時（超過 JOBS_LEASE_SECONDS 未回報進度）的執行中工作標記為失敗，回傳筆數
+    以條件式 UPDATE 處理，與仍在執行的 worker 同時續約時不會誤判
+    """
+    now = timezone.now()
+    stale = BackgroundJob.objects.filter(
+        status='running',
+        heartbeat_at__lt=now - timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+    )
+    if job_ids is not None:
+        stale = stale.filter(id__in=job_ids)
+    count = stale.update(status='failed', error='工作執行中斷（逾時未回報進度）', finished_at=now)
+    if count:
+        logger.warning('%s 個背景工作逾時未回報進度，已標記為失敗', count)
+    return count
+
+
+def claim_next_job():
+    """取出最早建立且尚未執行的工作（順便回收租約逾時的工作）"""
+    fail_stale_jobs()
+    candidate_ids = BackgroundJob.objects.filter(
+        status='pending'
+    ).order_by('created_at', 'id').values_list('id', flat=True)[:10]
+    for job_id in candidate_ids:
+        job = claim_job(job_id)
+        if job is not None:
+            return job
+    return None
+
+
+def run_job(job):
+    """執行已搶占的工作並記錄結果"""
+    handler = JOB_HANDLERS.get(job.job_type)
+    progress = JobProgress(job)
+    try:
+        if handler is None:
+            raise ValueError(f"未知的工作類型: {job.job_type}")
+        result = handler(job, progress)
+        progress.update(job.progress_current, force=True)
+        job.status = 'success'
+        job.result = result
+    except Exception as e:
+        logger.exception('背景工作 #%s (%s) 執行失敗', job.id, job.job_type)
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'status', 'result', 'error', 'finished_at', 'progress_current', 'progress_total', 'message'
+    ])
+    return job
+
+
+# ===== 工作處理函式 =====
+
+@register_job('import_courses')
+def import_courses_job(job, progress):
+    """Excel 課程匯入"""
+    from .course_import import read_workbook_rows, parse_rows, import_course_rows
+    from .storage import private_upload_storage
+
+    storage = private_upload_storage()
+    path = job.params['file_path']
+    try:
+        with storage.open(path, 'rb') as f:
+            all_rows = read_workbook_rows(f)
+    finally:
+        storage.delete(path)
+
+    parsed_rows = parse_rows(all_rows)
+    progress.set_total(len(parsed_rows), '匯入課程中')
+    success_count, errors = import_course_rows(
+        parsed_rows, job.params.get('department', '資管系'), progress=progress
+    )
+    return {
+        'message': f'匯入完成: 成功 {success_count} 筆，失敗 {len(errors)} 筆',
+        'total': len(parsed_rows),
+        'success_count': success_count,
+        'error_count': len(errors),
+        'errors': errors[:10],
+    }
+
+
+@register_job('reconcile_offering_counts')
+def reconcile_offering_counts_job(job, progress):
+    """
+    依選課紀錄重新計算各開課的目前人數與額滿狀態
+    已登錄成績（通過 / 未通過）的學生仍佔名額，與成績登錄時不調整人數的做法一致
+    """
+    from django.db.models import Count, Q
+    from .grades import GRADABLE_STATUSES
+    from .models import CourseOffering
+
+    offerings = CourseOffering.objects.annotate(
+        enrolled=Count('enrollments', filter=Q(enrollments__status__in=GRADABLE_STATUSES))
+    ).only('id', 'current_students', 'max_students', 'status')
+    if job.params.get('academic_year'):
+        offerings = offerings.filter(academic_year=job.params['academic_year'])
+    if job.params.get('semester'):
+        offerings = offerings.filter(semester=job.params['semester'])
+
+    progress.set_total(offerings.count(), '校正選課人數中')
+    changed = []
+    fixed_count = 0
+    for i, offering in enumerate(offerings.iterator(chunk_size=1000), start=1):
+        status = offering.status
+        if status != 'closed':
+            status = 'full' if offering.enrolled >= offering.max_students else 'open'
+        if offering.current_students != offering.enrolled or offering.status != status:
+            offering.current_students = offering.enrolled
+            offering.status = status
+            offering.updated_at = timezone.now()
+            changed.append(offering)
+        if len(changed) >= 500:
+            CourseOffering.objects.bulk_update(changed, ['current_students', 'status', 'updated_at'])
+            fixed_count += len(changed)
+            changed = []
+        progress.update(i)
+    if changed:
+        CourseOffering.objects.bulk_update(changed, ['current_students', 'status', 'updated_at'])
+        fixed_count += len(changed)
+
+    return {'message': f'校正完成: 更新 {fixed_count} 門開課', 'fixed_count': fixed_count}
+
+
+@register_job('compute_gpa')
+def compute_gpa_job(job, progress):
+    """學期結算：批次計算所有學生的 GPA 與通過 / 未通過學分"""
+    from .credits import update_gpa_summaries
+
+    count = update_gpa_summaries(progress=progress)
+    return {'message': f'GPA 計算完成: 更新 {count} 位學生', 'student_count': count}
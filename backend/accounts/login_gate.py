@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+密碼驗證併發閘門
+PBKDF2 雜湊很耗 CPU，尖峰時段大量登入會佔滿 worker
+以有上限的 semaphore 限制同時進行的密碼驗證數量，超過等待時間即回應 503，
+讓查詢、選課等請求仍有執行緒可用（gunicorn 需搭配 --threads 才有多個執行緒可分配）
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_semaphore = None
+_semaphore_lock = threading.Lock()
+
+
+class LoginBusy(Exception):
+    """等待密碼驗證名額逾時"""
+
+
+def _get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        with _semaphore_lock:
+            if _semaphore is None:
+                _semaphore = threading.BoundedSemaphore(settings.LOGIN_HASH_CONCURRENCY)
+    return _semaphore
+
+
+@contextmanager
+def password_check_slot(timings=None):
+    """
+    取得一個密碼驗證名額，逾時則拋出 LoginBusy
+    timings 若為 dict，會寫入 wait（等待名額）與 hash（持有名額）的毫秒數
+    """
+    semaphore = _get_semaphore()
+    start = time.perf_counter()
+    if not semaphore.acquire(timeout=settings.LOGIN_GATE_TIMEOUT):
+        raise LoginBusy()
+    acquired = time.perf_counter()
+    try:
+        yield
+    finally:
+        semaphore.release()
+        if timings is not None:
+            timings['wait'] = (acquired - start) * 1000
+            timings['hash'] = (time.perf_counter() - acquired) * 1000
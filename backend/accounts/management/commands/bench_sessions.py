@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+session 寫入次數基準測試
+比較舊設定（db session + SESSION_SAVE_EVERY_REQUEST）與目前設定下，每個請求對 django_session 的寫入次數
+用法：python manage.py bench_sessions [--requests 200] [--path /api/user/profile/]
+測試資料在交易中建立，結束後全部回滾
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Profile
+from accounts.user_context import get_or_create_role_id
+
+SESSION_WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _legacy_settings():
+    return override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.db',
+        SESSION_SAVE_EVERY_REQUEST=True,
+        MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'accounts.middleware.SessionRefreshMiddleware'],
+    )
+
+
+def _current_settings(engine=None):
+    return override_settings(SESSION_ENGINE=engine or settings.SESSION_ENGINE)
+
+
+class Command(BaseCommand):
+    help = '量測每個請求的 session 資料庫寫入次數（舊設定 vs 目前設定）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='每種設定送出的請求數')
+        parser.add_argument('--path', default='/api/user/profile/', help='測試用的 API 路徑')
+
+    def handle(self, *args, **options):
+        scenarios = [
+            ('舊設定 db + SAVE_EVERY_REQUEST', _legacy_settings()),
+            (f'目前設定 {settings.SESSION_ENGINE.rsplit(".", 1)[-1]}', _current_settings()),
+        ]
+        if settings.SESSION_ENGINE != 'django.contrib.sessions.backends.signed_cookies':
+            scenarios.append((
+                'signed_cookies',
+                _current_settings('django.contrib.sessions.backends.signed_cookies'),
+            ))
+
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username=f'bench_session_{int(time.time())}', password=None)
+                profile = Profile.objects.create(user=user, real_name='session benchmark')
+                profile.roles.add(get_or_create_role_id('student'))
+
+                for label, scenario in scenarios:
+                    with scenario:
+                        writes, queries, elapsed = self._run(user, options['path'], options['requests'])
+                    n = options['requests']
+                    self.stdout.write(
+                        f'{label:<36} session 寫入/請求 {writes / n:.3f}  '
+                        f'查詢/請求 {queries / n:.2f}  平均 {elapsed / n * 1000:.2f} ms'
+                    )
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, user, path, n):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        client.get(path)  # 暖機：載入 middleware、角色快取與 session 快取
+
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for _ in range(n):
+                response = client.get(path)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{path} 回傳 {response.status_code}')
+            elapsed = time.perf_counter() - start
+
+        writes = sum(
+            1 for q in ctx.captured_queries
+            if 'django_session' in q['sql'] and q['sql'].lstrip().upper().startswith(SESSION_WRITE_PREFIXES)
+        )
+        return writes, len(ctx.captured_queries), elapsed
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+學期結算：批次計算所有學生的 GPA 與通過 / 未通過學分
+用法：
+    python manage.py compute_gpa                  # 計算並寫入 CreditSummary
+    python manage.py compute_gpa --check          # 以資料庫現有成績比對引擎與參考實作，不寫入
+    python manage.py compute_gpa --benchmark --students 50000 --per-student 40
+                                                  # 以隨機資料量測引擎速度並驗證正確性
+"""
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import gpa as gpa_engine
+from accounts.credits import update_gpa_summaries
+
+TOLERANCE = 1e-9
+
+
+class Command(BaseCommand):
+    help = '批次計算學生 GPA（可附基準測試與正確性驗證）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='比對引擎與參考實作（資料庫資料）')
+        parser.add_argument('--benchmark', action='store_true', help='以隨機資料量測速度並驗證')
+        parser.add_argument('--students', type=int, default=50000, help='基準測試的學生數')
+        parser.add_argument('--per-student', type=int, default=40, help='基準測試每位學生的修課數')
+        parser.add_argument('--seed', type=int, default=0, help='隨機資料種子')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self._benchmark(options['students'], options['per_student'], options['seed'])
+            return
+
+        if options['check']:
+            start = time.perf_counter()
+            arrays = gpa_engine.load_arrays()
+            self.stdout.write(f'讀取 {len(arrays["student"])} 筆成績，{time.perf_counter() - start:.2f} 秒')
+            self._verify(arrays)
+            return
+
+        start = time.perf_counter()
+        count = update_gpa_summaries()
+        self.stdout.write(f'已更新 {count} 位學生的 GPA，耗時 {time.perf_counter() - start:.2f} 秒')
+
+    def _benchmark(self, students, per_student, seed):
+        rng = random.Random(seed)
+        grades = list(gpa_engine.GRADE_POINTS)
+        terms = [gpa_engine.term_key(year, semester) for year in range(110, 115) for semester in (1, 2)]
+        arrays = {'student': [], 'term': [], 'point': [], 'credits': [], 'status': []}
+
+        for student in range(1, students + 1):
+            for _ in range(per_student):
+                # 約 5% 沒有成績（不計入 GPA）
+                point = math.nan if rng.random() < 0.05 else gpa_engine.GRADE_POINTS[rng.choice(grades)]
+                arrays['student'].append(student)
+                arrays['term'].append(rng.choice(terms))
+                arrays['point'].append(point)
+                arrays['credits'].append(rng.choice((0, 1, 2, 3, 3, 3, 4)))
+                arrays['status'].append(2 if point == 0.0 else 1)
+
+        self.stdout.write(f'隨機資料：{students} 位學生 × {per_student} 筆 = {len(arrays["student"])} 筆')
+        self._verify(arrays)
+
+    def _verify(self, arrays):
+        timings = {}
+        results = {}
+        engines = [('python', gpa_engine._compute_python), ('naive', gpa_engine.naive_gpa)]
+        if gpa_engine.np is not None:
+            engines.insert(0, ('numpy', gpa_engine._compute_numpy))
+        else:
+            self.stdout.write('未安裝 NumPy，略過向量化版本')
+
+        for name, func in engines:
+            start = time.perf_counter()
+            results[name] = func(arrays)
+            timings[name] = time.perf_counter() - start
+            self.stdout.write(f'{name:<8} {timings[name]:.3f} 秒')
+
+        reference = results['naive']
+        for name, result in results.items():
+            if name == 'naive':
+                continue
+            for key in ('cumulative', 'term', 'passed', 'failed'):
+                if result[key].keys() != reference[key].keys():
+                    raise CommandError(f'{name} 的 {key} 分組與參考實作不一致')
+                worst = max((abs(result[key][k] - v) for k, v in reference[key].items()), default=0.0)
+                if worst > TOLERANCE:
+                    raise CommandError(f'{name} 的 {key} 與參考實作差異 {worst}')
+            self.stdout.write(self.style.SUCCESS(f'{name} 與參考實作一致'))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+登入壓力測試（對本機執行中的伺服器送出併發登入請求）
+用法：
+    python manage.py loadtest_login --setup --users 200            # 建立測試帳號 loadtest_0000...
+    python manage.py loadtest_login --url http://localhost:8000 --users 200 --concurrency 32
+    python manage.py loadtest_login --cleanup                      # 刪除測試帳號
+同時以 --probe-path 持續查詢一般 API，觀察登入尖峰時其他請求的延遲
+"""
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Profile
+from accounts.user_context import get_or_create_role_id
+
+USERNAME_PREFIX = 'loadtest_'
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _timed_request(url, data=None):
+    """送出請求，回傳 (狀態碼, 毫秒)"""
+    body = json.dumps(data).encode() if data is not None else None
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, (time.perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = '登入壓力測試，回報登入與一般請求的 p50/p99 延遲'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='伺服器位址')
+        parser.add_argument('--users', type=int, default=100, help='測試帳號數量（每個帳號登入一次）')
+        parser.add_argument('--concurrency', type=int, default=16, help='同時送出的登入請求數')
+        parser.add_argument('--password', default='loadtest-password', help='測試帳號密碼')
+        parser.add_argument('--probe-path', default='/api/courses/filter-options/', help='登入期間持續查詢的 API')
+        parser.add_argument('--setup', action='store_true', help='建立測試帳號後結束')
+        parser.add_argument('--cleanup', action='store_true', help='刪除測試帳號後結束')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+            self.stdout.write(f'已刪除 {deleted} 筆測試資料')
+            return
+        if options['setup']:
+            self._setup(options['users'], options['password'])
+            return
+        self._run(options)
+
+    def _setup(self, count, password):
+        """批次建立測試學生帳號（密碼雜湊只計算一次）"""
+        usernames = [f'{USERNAME_PREFIX}{i:04d}' for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        missing = [u for u in usernames if u not in existing]
+        if missing:
+            hashed = make_password(password)
+            with transaction.atomic():
+                User.objects.bulk_create([User(username=u, password=hashed) for u in missing])
+                users = list(User.objects.filter(username__in=missing))
+                Profile.objects.bulk_create([
+                    Profile(user=u, real_name=u.username, student_id=u.username) for u in users
+                ])
+                student_role_id = get_or_create_role_id('student')
+                profile_ids = Profile.objects.filter(user__in=users).values_list('id', flat=True)
+                Profile.roles.through.objects.bulk_create([
+                    Profile.roles.through(profile_id=pid, role_id=student_role_id) for pid in profile_ids
+                ])
+        self.stdout.write(f'測試帳號共 {count} 個（新建立 {len(missing)} 個）')
+
+    def _run(self, options):
+        base_url = options['url'].rstrip('/')
+        login_url = f'{base_url}/api/login/'
+        usernames = [f'{USERNAME_PREFIX}{i:04d}' for i in range(options['users'])]
+
+        probe_times = []
+        probe_status = Counter()
+        stop = threading.Event()
+
+        def probe():
+            while not stop.is_set():
+                status, ms = _timed_request(base_url + options['probe_path'])
+                probe_status[status] += 1
+                probe_times.append(ms)
+
+        probe_thread = threading.Thread(target=probe, daemon=True)
+        probe_thread.start()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(
+                lambda u: _timed_request(login_url, {'username': u, 'password': options['password']}),
+                usernames,
+            ))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        probe_thread.join()
+
+        login_status = Counter(status for status, _ in results)
+        login_times = [ms for status, ms in results if status == 200]
+
+        self.stdout.write(
+            f'登入 {len(results)} 次，{elapsed:.2f} 秒（{len(results) / elapsed:.1f} 次/秒）'
+            f'，狀態碼 {dict(login_status)}'
+        )
+        self._report('登入（成功）', login_times)
+        self.stdout.write(f'{options["probe_path"]} 狀態碼 {dict(probe_status)}')
+        self._report('一般請求', probe_times)
+
+    def _report(self, label, values):
+        if not values:
+            self.stdout.write(f'{label}: 無資料')
+            return
+        self.stdout.write(
+            f'{label}: n={len(values)} p50={_percentile(values, 50):.1f}ms '
+            f'p99={_percentile(values, 99):.1f}ms max={max(values):.1f}ms '
+            f'平均={statistics.mean(values):.1f}ms'
+        )
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+重算學分統計（CreditSummary）
+用於首次部署、切換目前學期或直接修改資料庫後的回補
+用法：python manage.py rebuild_credit_summaries [--student 學號 ...] [--chunk-size 500]
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts.credits import REBUILD_CHUNK_SIZE, current_term, rebuild_credit_summaries
+
+
+class Command(BaseCommand):
+    help = '依選課紀錄批次重算學生的學分統計'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', nargs='*', default=None, help='只重算指定帳號（預設為全部）')
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE, help='每批處理的學生數')
+
+    def handle(self, *args, **options):
+        student_ids = None
+        if options['student']:
+            student_ids = list(User.objects.filter(
+                username__in=options['student']
+            ).values_list('id', flat=True))
+
+        year, semester = current_term()
+        start = time.perf_counter()
+        count = rebuild_credit_summaries(student_ids, chunk_size=options['chunk_size'])
+        self.stdout.write(
+            f'已重算 {count} 位學生的學分統計（目前學期 {year}-{semester}），'
+            f'耗時 {time.perf_counter() - start:.2f} 秒'
+        )
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+背景工作 worker
+用法：python manage.py run_jobs [--once] [--sleep 2] [--max-jobs N]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = '執行資料庫佇列中的背景工作'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='佇列清空後即結束')
+        parser.add_argument('--sleep', type=float, default=2.0, help='佇列為空時的輪詢間隔（秒）')
+        parser.add_argument('--max-jobs', type=int, default=0, help='執行指定數量的工作後結束（0 為不限制）')
+
+    def handle(self, *args, **options):
+        processed = 0
+        self.stdout.write('背景工作 worker 啟動')
+
+        try:
+            while True:
+                close_old_connections()
+                job = claim_next_job()
+
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                self.stdout.write(f'開始執行: {job}')
+                job = run_job(job)
+                self.stdout.write(f'執行結束: {job}')
+
+                processed += 1
+                if options['max_jobs'] and processed >= options['max_jobs']:
+                    break
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(f'worker 結束，共執行 {processed} 個工作')
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 指標
+每個 worker 在記憶體中累計計數器與直方圖，每 METRICS_FLUSH_INTERVAL 秒將快照原子寫入
+METRICS_DIR/<pid>-<啟動時間>.json；/metrics 讀取目錄內所有 worker 的快照加總後以文字格式輸出
+已結束 worker 的快照檔會保留（計數器不因 worker 重啟而倒退），重新部署時可清空目錄
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# 指標名稱 -> (類型, 說明, 直方圖區間)
+METRICS = {
+    'course_http_requests_total': ('counter', '依 view、方法與狀態碼統計的請求數', None),
+    'course_http_request_duration_seconds': ('histogram', '請求耗時（秒）', REQUEST_DURATION_BUCKETS),
+    'course_http_request_queries': ('histogram', '每個請求的 SQL 查詢數', QUERY_COUNT_BUCKETS),
+    'course_enrollments_total': ('counter', '選課結果（success 或失敗原因）', None),
+    'course_cache_requests_total': ('counter', '快取查詢次數（hit / miss）', None),
+}
+
+_lock = threading.Lock()
+_counters = defaultdict(float)  # (名稱, labels) -> 值
+_histograms = {}  # (名稱, labels) -> [各區間次數..., 總和, 次數]
+_pid = None
+_path = None
+_last_flush = 0.0
+
+
+def _ensure_process():
+    """gunicorn fork 出的 worker 不沿用父程序的計數，各自寫入自己的快照檔"""
+    global _pid, _path
+    pid = os.getpid()
+    if pid != _pid:
+        _counters.clear()
+        _histograms.clear()
+        _pid = pid
+        _path = os.path.join(settings.METRICS_DIR, f'{pid}-{int(time.time() * 1000)}.json')
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def _inc(name, labels, value=1):
+    _counters[(name, labels)] += value
+
+
+def _observe(name, labels, value):
+    buckets = METRICS[name][2]
+    row = _histograms.get((name, labels))
+    if row is None:
+        row = _histograms[(name, labels)] = [0] * (len(buckets) + 2)
+    for i, upper in enumerate(buckets):
+        if value <= upper:
+            row[i] += 1
+            break
+    row[-2] += value
+    row[-1] += 1
+
+
+def _maybe_flush():
+    global _last_flush
+    now = time.monotonic()
+    if now - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        _last_flush = now
+        _flush()
+
+
+def _flush():
+    """將本 worker 的快照原子寫入快照檔（先寫暫存檔再 os.replace）"""
+    snapshot = {
+        'counters': [[name, labels, value] for (name, labels), value in _counters.items()],
+        'histograms': [[name, labels, row] for (name, labels), row in _histograms.items()],
+    }
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    tmp_path = f'{_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, _path)
+
+
+def observe_request(view, method, status, seconds, queries):
+    """由 RequestTimingMiddleware 於每個請求結束時呼叫"""
+    with _lock:
+        _ensure_process()
+        _inc('course_http_requests_total', _labels(view=view, method=method, status=str(status)))
+        _observe('course_http_request_duration_seconds', _labels(view=view), seconds)
+        _observe('course_http_request_queries', _labels(view=view), queries)
+        _maybe_flush()
+
+
+def record_enrollment(result):
+    """result 為 'success' 或失敗原因（full / conflict / duplicate / not_found / error）"""
+    with _lock:
+        _ensure_process()
+        _inc('course_enrollments_total', _labels(result=result))
+
+
+def record_cache(cache_name, hit):
+    with _lock:
+        _ensure_process()
+        _inc('course_cache_requests_total', _labels(cache=cache_name, result='hit' if hit else 'miss'))
+
+
+def collect():
+    """寫出本 worker 的最新快照後，讀取並加總所有 worker 的快照"""
+    with _lock:
+        _ensure_process()
+        _flush()
+
+    counters = defaultdict(float)
+    histograms = {}
+    for filename in os.listdir(settings.METRICS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, filename), encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # 檔案被其他 worker 替換中，下次再讀
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, row in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], row)]
+            else:
+                histograms[key] = list(row)
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def render():
+    """輸出 Prometheus 文字格式（text/plain; version=0.0.4）"""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        else:
+            for (metric, labels), row in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for upper, count in zip(buckets, row):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", upper)])} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {row[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(row[-2])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {row[-1]}')
+
+    # 快取命中率（由 course_cache_requests_total 換算）
+    cache_totals = defaultdict(lambda: [0.0, 0.0])
+    for (metric, labels), value in counters.items():
+        if metric == 'course_cache_requests_total':
+            label_map = dict(labels)
+            cache_totals[label_map['cache']][label_map['result'] == 'hit'] += value
+    lines.append('# HELP course_cache_hit_ratio 快取命中率')
+    lines.append('# TYPE course_cache_hit_ratio gauge')
+    for cache_name, (misses, hits) in sorted(cache_totals.items()):
+        ratio = hits / (hits + misses) if hits + misses else 0.0
+        lines.append(f'course_cache_hit_ratio{_format_labels([("cache", cache_name)])} {ratio:.4f}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+accounts 的 middleware
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .slow_queries import SlowQueryRecorder
+from .user_context import UserContext
+
+SESSION_TOUCH_KEY = '_touched_at'
+
+request_logger = logging.getLogger('accounts.requests')
+
+
+class QueryStats:
+    """以 connection.execute_wrapper 累計一個請求的 SQL 查詢數與耗時"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # 秒
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestTimingMiddleware:
+    """
+    記錄每個請求的耗時與 SQL 查詢數（放在 MIDDLEWARE 最前面，涵蓋其他 middleware 的耗時）
+    結果附加在 Server-Timing 標頭（瀏覽器開發者工具的 Timing 分頁可直接檢視），
+    並以一行 JSON 寫入 accounts.requests logger：一般請求為 INFO，超過 REQUEST_SLOW_MS 為 WARNING；
+    METRICS_ENABLED 時同時計入 /metrics 的請求數、耗時與查詢數直方圖；
+    SLOW_QUERY_LOG_ENABLED 時另掛上 SlowQueryRecorder 記錄慢查詢
+    串流回應（CSV 匯出等）的查詢在輸出內容時才執行：統計持續到內容輸出完畢才記錄，
+    標頭送出時尚無最終數字，因此不加 Server-Timing
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = settings.REQUEST_SLOW_MS
+        self.record_slow_queries = settings.SLOW_QUERY_LOG_ENABLED
+
+    def __call__(self, request):
+        stats = request.query_stats = QueryStats()
+        start = time.perf_counter()
+        stack = ExitStack()
+        try:
+            recorder = SlowQueryRecorder(request) if self.record_slow_queries else None
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+                if recorder is not None:
+                    stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+
+        if response.streaming:
+            self._wrap_stream(request, response, stack, start)
+            return response
+
+        stack.close()
+        total_ms = (time.perf_counter() - start) * 1000
+        timing = f'app;dur={total_ms:.1f}, db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        self._record(request, response, total_ms, len(response.content))
+        return response
+
+    def _wrap_stream(self, request, response, stack, start):
+        """
+        輸出串流內容期間維持查詢統計，輸出完畢（或連線中斷）後才記錄
+        尚未開始輸出就被關閉的回應（產生器的 finally 不會執行）由 response.close() 收尾，避免 wrapper 留在連線上
+        """
+        size = 0
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            stack.close()
+            self._record(request, response, (time.perf_counter() - start) * 1000, size)
+
+        def stream(content):
+            nonlocal size
+            try:
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                finish()
+
+        close = response.close
+
+        def close_response():
+            try:
+                close()
+            finally:
+                finish()
+
+        response.streaming_content = stream(response.streaming_content)
+        response.close = close_response
+
+    def _record(self, request, response, total_ms, size):
+        stats = request.query_stats
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        if settings.METRICS_ENABLED:
+            metrics.observe_request(
+                view_name or 'unmatched', request.method, response.status_code, total_ms / 1000, stats.count
+            )
+
+        level = logging.WARNING if total_ms >= self.slow_ms else logging.INFO
+        if request_logger.isEnabledFor(level):
+            request_logger.log(level, json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': view_name,
+                'status': response.status_code,
+                'streaming': response.streaming,
+                'duration_ms': round(total_ms, 1),
+                'db_ms': round(stats.duration * 1000, 1),
+                'queries': stats.count,
+                'bytes': size,
+                'user': request.user.username if getattr(request, 'user', None) and request.user.is_authenticated else None,
+            }, ensure_ascii=False))
+
+
+class UserContextMiddleware:
+    """
+    於每個請求掛上 request.user_context（延遲載入）
+    views 透過它判斷角色，不必各自查詢 profile.roles
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_context = UserContext(request.user)
+        return self.get_response(request)
+
+
+class SessionRefreshMiddleware:
+    """
+    延後寫入的 session 續期（需放在 SessionMiddleware 之後）
+    只有距離上次續期超過 SESSION_REFRESH_FRACTION × SESSION_COOKIE_AGE 時才標記 session 為已修改，
+    由 SessionMiddleware 寫回並重新發送 cookie；其餘請求不寫入 session
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.interval = settings.SESSION_COOKIE_AGE * settings.SESSION_REFRESH_FRACTION
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        if session is None or session.is_empty():
+            return response
+
+        now = int(time.time())
+        touched_at = session.get(SESSION_TOUCH_KEY)
+        if session.modified or touched_at is None or now - touched_at >= self.interval:
+            session[SESSION_TOUCH_KEY] = now
+        return response
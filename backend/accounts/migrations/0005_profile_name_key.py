@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:51
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def backfill_name_key(apps, schema_editor):
+    Profile = apps.get_model("accounts", "Profile")
+    profiles = []
+    for profile in Profile.objects.only("id", "real_name").iterator(chunk_size=1000):
+        name = unicodedata.normalize("NFKC", profile.real_name or "")
+        profile.name_key = " ".join(name.split()).casefold()[:100]
+        profiles.append(profile)
+        if len(profiles) >= 1000:
+            Profile.objects.bulk_update(profiles, ["name_key"])
+            profiles = []
+    if profiles:
+        Profile.objects.bulk_update(profiles, ["name_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_profile_force_password_change"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="name_key",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=100,
+                verbose_name="姓名索引鍵",
+            ),
+        ),
+        migrations.RunPython(backfill_name_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_profile_name_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BackgroundJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("job_type", models.CharField(max_length=50, verbose_name="工作類型")),
+                ("params", models.JSONField(blank=True, default=dict, verbose_name="參數")),
+                ("status", models.CharField(choices=[("pending", "等待中"), ("running", "執行中"), ("success", "已完成"), ("failed", "失敗")], default="pending", max_length=10, verbose_name="狀態")),
+                ("progress_current", models.IntegerField(default=0, verbose_name="目前進度")),
+                ("progress_total", models.IntegerField(default=0, verbose_name="總數")),
+                ("message", models.CharField(blank=True, max_length=200, verbose_name="進度訊息")),
+                ("result", models.JSONField(blank=True, null=True, verbose_name="執行結果")),
+                ("error", models.TextField(blank=True, verbose_name="錯誤訊息")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="建立時間")),
+                ("started_at", models.DateTimeField(blank=True, null=True, verbose_name="開始時間")),
+                ("finished_at", models.DateTimeField(blank=True, null=True, verbose_name="完成時間")),
+                ("created_by", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="background_jobs", to=settings.AUTH_USER_MODEL, verbose_name="建立者")),
+            ],
+            options={
+                "verbose_name": "背景工作",
+                "verbose_name_plural": "背景工作",
+                "ordering": ["-created_at"],
+                "indexes": [models.Index(fields=["status", "created_at"], name="accounts_ba_status_199535_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0006_backgroundjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="avatar_thumbnails",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="大頭貼縮圖"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:03
+
+import accounts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_profile_avatar_thumbnails"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="profile",
+            name="avatar",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=accounts.storage.ContentHashStorage(),
+                upload_to="avatars/",
+                verbose_name="大頭貼",
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0008_profile_avatar_content_hash_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="creditsummary",
+            name="semester_elective_credits",
+            field=models.IntegerField(default=0, verbose_name="本學期選修學分"),
+        ),
+        migrations.AddField(
+            model_name="creditsummary",
+            name="semester_general_credits",
+            field=models.IntegerField(default=0, verbose_name="本學期通識學分"),
+        ),
+        migrations.AddField(
+            model_name="creditsummary",
+            name="semester_required_credits",
+            field=models.IntegerField(default=0, verbose_name="本學期必修學分"),
+        ),
+        migrations.AddField(
+            model_name="creditsummary",
+            name="semester_total_credits",
+            field=models.IntegerField(default=0, verbose_name="本學期學分"),
+        ),
+        migrations.AddField(
+            model_name="creditsummary",
+            name="term_academic_year",
+            field=models.CharField(
+                blank=True, default="", max_length=10, verbose_name="統計學年度"
+            ),
+        ),
+        migrations.AddField(
+            model_name="creditsummary",
+            name="term_semester",
+            field=models.CharField(
+                blank=True, default="", max_length=1, verbose_name="統計學期"
+            ),
+        ),
+    ]
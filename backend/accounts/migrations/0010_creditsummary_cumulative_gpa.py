@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_creditsummary_semester_credits"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="creditsummary",
+            name="cumulative_gpa",
+            field=models.DecimalField(
+                decimal_places=2, default=0.0, max_digits=4, verbose_name="累計 GPA"
+            ),
+        ),
+    ]
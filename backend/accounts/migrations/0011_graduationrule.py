@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0010_creditsummary_cumulative_gpa"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GraduationRule",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=100, verbose_name="規則名稱")),
+                ("rule_type", models.CharField(choices=[("category_credits", "類別最低學分"), ("required_courses", "指定必修課程"), ("course_group", "課群選修")], max_length=20, verbose_name="規則類型")),
+                ("category", models.CharField(blank=True, choices=[("total", "總學分"), ("required", "必修"), ("elective", "選修"), ("general", "通識")], max_length=10, verbose_name="學分類別")),
+                ("min_credits", models.IntegerField(blank=True, null=True, verbose_name="最低學分")),
+                ("course_codes", models.JSONField(blank=True, default=list, verbose_name="課程代碼")),
+                ("min_count", models.IntegerField(blank=True, null=True, verbose_name="最少門數")),
+                ("is_active", models.BooleanField(default=True, verbose_name="啟用")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="建立時間")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新時間")),
+                ("department", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="graduation_rules", to="accounts.department", verbose_name="適用系所")),
+            ],
+            options={
+                "verbose_name": "畢業門檻規則",
+                "verbose_name_plural": "畢業門檻規則",
+                "ordering": ["department", "id"],
+            },
+        ),
+    ]
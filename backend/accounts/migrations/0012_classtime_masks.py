@@ -0,0 +1,89 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:17
+
+import logging
+import re
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+# 以下為 accounts.timeslots 於本 migration 建立時的副本（之後修改該模組不影響已執行的 migration）
+PERIODS_PER_DAY = 16
+MAX_WEEKS = 20
+ALL_WEEKS = ((1 << MAX_WEEKS) - 1) << 1
+ODD_WEEKS = sum(1 << week for week in range(1, MAX_WEEKS + 1, 2))
+EVEN_WEEKS = ALL_WEEKS & ~ODD_WEEKS
+WEEK_RANGE_RE = re.compile(r"^(\d+)\s*[-~－～至]\s*(\d+)$")
+
+
+def period_bits(start_period, end_period):
+    start, end = int(start_period), int(end_period)
+    if not 1 <= start <= end < PERIODS_PER_DAY:
+        raise ValueError(f"節次不正確: {start_period}-{end_period}")
+    return ((1 << (end - start + 1)) - 1) << start
+
+
+def parse_weeks(text):
+    mask = 0
+    for token in re.split(r"[,，、;；\s]+", str(text or "").strip()):
+        if not token:
+            continue
+        if token.startswith("單"):
+            mask |= ODD_WEEKS
+        elif token.startswith("雙"):
+            mask |= EVEN_WEEKS
+        elif token.isdigit():
+            mask |= 1 << int(token)
+        else:
+            match = WEEK_RANGE_RE.match(token)
+            if match:
+                start, end = sorted((int(match.group(1)), int(match.group(2))))
+                mask |= ((1 << (end - start + 1)) - 1) << start
+    mask &= ALL_WEEKS
+    return mask or ALL_WEEKS
+
+
+def backfill_masks(apps, schema_editor):
+    ClassTime = apps.get_model("accounts", "ClassTime")
+    class_times = []
+    invalid_ids = []
+    for ct in ClassTime.objects.only("id", "start_period", "end_period", "weeks").iterator(chunk_size=1000):
+        try:
+            ct.period_mask = period_bits(ct.start_period, ct.end_period)
+        except (TypeError, ValueError):
+            # 節次超出範圍的時段保留 period_mask=0（衝突檢查不會偵測到），需人工修正後重新儲存
+            ct.period_mask = 0
+            invalid_ids.append(ct.id)
+        ct.week_mask = parse_weeks(ct.weeks)
+        class_times.append(ct)
+        if len(class_times) >= 1000:
+            ClassTime.objects.bulk_update(class_times, ["period_mask", "week_mask"])
+            class_times = []
+    if class_times:
+        ClassTime.objects.bulk_update(class_times, ["period_mask", "week_mask"])
+    if invalid_ids:
+        logger.warning(
+            "%s 筆上課時段的節次不正確（period_mask=0，不參與衝突檢查），請修正: ClassTime id %s",
+            len(invalid_ids), invalid_ids,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0011_graduationrule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="classtime",
+            name="period_mask",
+            field=models.IntegerField(default=0, editable=False, verbose_name="節次遮罩"),
+        ),
+        migrations.AddField(
+            model_name="classtime",
+            name="week_mask",
+            field=models.IntegerField(default=2097150, editable=False, verbose_name="週次遮罩"),
+        ),
+        migrations.RunPython(backfill_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0012_classtime_masks"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="calendar_token",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name="行事曆訂閱金鑰",
+            ),
+        ),
+    ]
@@ -1,6 +1,18 @@
+import unicodedata
+
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.db import models
 
+from .storage import ContentHashStorage
+from .timeslots import ALL_WEEKS, parse_weeks, period_bits
+
+
+def normalize_name(name):
+    """姓名正規化（全半形統一、去除多餘空白、不分大小寫），作為索引查詢鍵"""
+    name = unicodedata.normalize('NFKC', str(name or ''))
+    return ' '.join(name.split()).casefold()[:100]
+
 # ===== 使用者相關 =====
 
 class Role(models.Model):
@@ -27,9 +39,11 @@ class Profile(models.Model):
     
     # 基本資料（所有使用者都有）
     real_name = models.CharField(max_length=50, verbose_name="姓名")
+    name_key = models.CharField(max_length=100, blank=True, default='', db_index=True, editable=False, verbose_name="姓名索引鍵")
     email = models.EmailField(blank=True, null=True, verbose_name="電子郵件")
     phone = models.CharField(max_length=20, blank=True, null=True, verbose_name="電話")
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name="大頭貼")
+    avatar = models.ImageField(upload_to='avatars/', storage=ContentHashStorage(), blank=True, null=True, verbose_name="大頭貼")
+    avatar_thumbnails = models.JSONField(default=dict, blank=True, editable=False, verbose_name="大頭貼縮圖")
     
     # 學生專用資料
     student_id = models.CharField(max_length=20, blank=True, null=True, unique=True, verbose_name="學號")
@@ -42,6 +56,7 @@ class Profile(models.Model):
     title = models.CharField(max_length=50, blank=True, null=True, verbose_name="職稱")
     
     force_password_change = models.BooleanField(default=True, verbose_name="需強制修改密碼")
+    calendar_token = models.CharField(max_length=64, blank=True, null=True, unique=True, editable=False, verbose_name="行事曆訂閱金鑰")
     
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
@@ -49,6 +64,13 @@ class Profile(models.Model):
     def __str__(self):
         return f"{self.real_name} ({self.user.username})"
     
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.real_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'real_name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'name_key'}
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = "個人資料"
         verbose_name_plural = "個人資料"
@@ -242,11 +264,40 @@ class ClassTime(models.Model):
     weeks = models.TextField(blank=True, null=True, verbose_name="上課週次")  # 例如: "1-9,11-18"
     hours_per_week = models.DecimalField(max_digits=4, decimal_places=2, blank=True, null=True, verbose_name="每週時數")
     
+    # 由節次與週次計算的位元遮罩（儲存時自動更新），衝突判斷只需 AND 運算
+    period_mask = models.IntegerField(default=0, editable=False, verbose_name="節次遮罩")
+    week_mask = models.IntegerField(default=ALL_WEEKS, editable=False, verbose_name="週次遮罩")
+    
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
 
     def __str__(self):
         return f"{self.offering.course.course_name} - {self.get_weekday_display()} 第{self.start_period}-{self.end_period}節"
     
+    def refresh_masks(self):
+        """
+        依節次與週次重新計算遮罩（save 時自動呼叫，bulk_create 前需自行呼叫）
+        節次不正確時拋出 ValueError，避免寫入 period_mask=0 而讓衝突檢查略過該時段
+        """
+        self.period_mask = period_bits(self.start_period, self.end_period)
+        self.week_mask = parse_weeks(self.weeks)
+    
+    def clean(self):
+        try:
+            self.refresh_masks()
+        except ValueError as e:
+            raise ValidationError({'end_period': str(e)})
+    
+    def save(self, *args, **kwargs):
+        self.refresh_masks()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'period_mask', 'week_mask'}
+        super().save(*args, **kwargs)
+    
+    def overlaps(self, weekday, period_mask, week_mask):
+        """同一天、節次與週次皆重疊才算衝突"""
+        return self.weekday == weekday and bool(self.period_mask & period_mask) and bool(self.week_mask & week_mask)
+    
     class Meta:
         verbose_name = "上課時段"
         verbose_name_plural = "上課時段"
@@ -302,26 +353,24 @@ class Enrollment(models.Model):
         return f"{student_name} - {self.offering.course.course_name} ({self.get_status_display()})"
     
     def check_time_conflict(self):
-        """檢查時段衝突"""
-        # 取得這次選課的所有時段
-        new_times = self.offering.class_times.all()
+        """檢查時段衝突（同一天、節次與週次皆重疊才算衝突，半學期課程可排在同一時段）"""
+        new_times = list(self.offering.class_times.all())
+        if not new_times:
+            return False, None
         
-        # 取得學生已選課程的所有時段
-        existing_enrollments = Enrollment.objects.filter(
-            student=self.student,
-            status='enrolled'
-        ).exclude(id=self.id)
+        # 學生其他已選課程的時段（一次查詢）
+        existing_times = ClassTime.objects.filter(
+            offering__enrollments__student=self.student,
+            offering__enrollments__status='enrolled',
+            weekday__in={t.weekday for t in new_times},
+        ).exclude(offering_id=self.offering_id).values_list(
+            'weekday', 'period_mask', 'week_mask', 'offering__course__course_name'
+        )
         
-        for enrollment in existing_enrollments:
-            existing_times = enrollment.offering.class_times.all()
-            
-            # 檢查每個時段是否衝突
+        for weekday, period_mask, week_mask, course_name in existing_times:
             for new_time in new_times:
-                for exist_time in existing_times:
-                    if (new_time.weekday == exist_time.weekday and
-                        new_time.start_period <= exist_time.end_period and
-                        new_time.end_period >= exist_time.start_period):
-                        return True, f"與 {enrollment.offering.course.course_name} 時段衝突"
+                if new_time.overlaps(weekday, period_mask, week_mask):
+                    return True, f"與 {course_name} 時段衝突"
         
         return False, None
 
@@ -357,8 +406,17 @@ class CreditSummary(models.Model):
     passed_credits = models.IntegerField(default=0, verbose_name="已通過學分")
     failed_credits = models.IntegerField(default=0, verbose_name="未通過學分")
     
+    # 本學期選課中的學分（term_* 為統計時的目前學期，學期切換後需重算）
+    semester_total_credits = models.IntegerField(default=0, verbose_name="本學期學分")
+    semester_required_credits = models.IntegerField(default=0, verbose_name="本學期必修學分")
+    semester_elective_credits = models.IntegerField(default=0, verbose_name="本學期選修學分")
+    semester_general_credits = models.IntegerField(default=0, verbose_name="本學期通識學分")
+    term_academic_year = models.CharField(max_length=10, blank=True, default='', verbose_name="統計學年度")
+    term_semester = models.CharField(max_length=1, blank=True, default='', verbose_name="統計學期")
+    
     # GPA
     gpa = models.DecimalField(max_digits=4, decimal_places=2, default=0.00, verbose_name="學期平均 GPA")
+    cumulative_gpa = models.DecimalField(max_digits=4, decimal_places=2, default=0.00, verbose_name="累計 GPA")
     
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
     
@@ -368,4 +426,91 @@ class CreditSummary(models.Model):
     
     def __str__(self):
         student_name = self.student.profile.real_name if hasattr(self.student, 'profile') else self.student.username
-        return f"{student_name} 的學分統計"
\ No newline at end of file
+        return f"{student_name} 的學分統計"
+
+
+# ===== 畢業門檻 =====
+
+class GraduationRule(models.Model):
+    """畢業門檻規則（未指定系所的規則適用於所有系所）"""
+    
+    RULE_TYPE_CHOICES = [
+        ('category_credits', '類別最低學分'),
+        ('required_courses', '指定必修課程'),
+        ('course_group', '課群選修'),
+    ]
+    
+    CATEGORY_CHOICES = [
+        ('total', '總學分'),
+        ('required', '必修'),
+        ('elective', '選修'),
+        ('general', '通識'),
+    ]
+    
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, blank=True, null=True, related_name='graduation_rules', verbose_name="適用系所")
+    name = models.CharField(max_length=100, verbose_name="規則名稱")
+    rule_type = models.CharField(max_length=20, choices=RULE_TYPE_CHOICES, verbose_name="規則類型")
+    
+    # category_credits：category 類別至少 min_credits 學分
+    # required_courses：course_codes 全部通過
+    # course_group：course_codes 中至少通過 min_count 門且（若有設定）至少 min_credits 學分
+    category = models.CharField(max_length=10, choices=CATEGORY_CHOICES, blank=True, verbose_name="學分類別")
+    min_credits = models.IntegerField(blank=True, null=True, verbose_name="最低學分")
+    course_codes = models.JSONField(default=list, blank=True, verbose_name="課程代碼")
+    min_count = models.IntegerField(blank=True, null=True, verbose_name="最少門數")
+    
+    is_active = models.BooleanField(default=True, verbose_name="啟用")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
+    
+    class Meta:
+        verbose_name = "畢業門檻規則"
+        verbose_name_plural = "畢業門檻規則"
+        ordering = ['department', 'id']
+    
+    def __str__(self):
+        scope = self.department.name if self.department_id else '全校'
+        return f"{scope} - {self.name}"
+
+
+# ===== 背景工作 =====
+
+class BackgroundJob(models.Model):
+    """背景工作佇列（由 run_jobs 指令執行，不需外部 broker）"""
+    
+    STATUS_CHOICES = [
+        ('pending', '等待中'),
+        ('running', '執行中'),
+        ('success', '已完成'),
+        ('failed', '失敗'),
+    ]
+    
+    job_type = models.CharField(max_length=50, verbose_name="工作類型")
+    params = models.JSONField(default=dict, blank=True, verbose_name="參數")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="狀態")
+    
+    # 進度
+    progress_current = models.IntegerField(default=0, verbose_name="目前進度")
+    progress_total = models.IntegerField(default=0, verbose_name="總數")
+    message = models.CharField(max_length=200, blank=True, verbose_name="進度訊息")
+    
+    # 結果
+    result = models.JSONField(blank=True, null=True, verbose_name="執行結果")
+    error = models.TextField(blank=True, verbose_name="錯誤訊息")
+    
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='background_jobs', verbose_name="建立者")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="開始時間")
+    heartbeat_at = models.DateTimeField(blank=True, null=True, verbose_name="最後回報時間")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="完成時間")
+    
+    class Meta:
+        verbose_name = "背景工作"
+        verbose_name_plural = "背景工作"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.job_type} #{self.id} ({self.get_status_display()})"
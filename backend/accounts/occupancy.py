@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+時段佔用索引
+以 (鍵, 星期) 為索引保存該日已佔用節次的位元遮罩，「教室 X 星期 d 第 a-b 節是否空著」
+只需一次字典查詢與一次 AND；節次重疊時才逐一比對週次遮罩並列出佔用的開課
+索引只存在於單次請求（或單次匯入）中：每次 build_*_index 都以一次查詢從資料庫重新建立，不跨請求保存，
+因此寫入時不需維護；批次匯入時新加入的時段也寫入同一個索引，各列在記憶體中互相比對
+教室以教室代碼為鍵，教師以使用者 ID 為鍵
+"""
+from collections import defaultdict
+
+from .models import ClassTime, OfferingTeacher, Profile
+from .timeslots import ALL_WEEKS, period_bits
+
+
+class OccupancyConflict(Exception):
+    """時段已被其他開課佔用"""
+
+
+def normalize_classroom(classroom):
+    """教室代碼比對鍵（忽略空白與大小寫）"""
+    return ''.join(str(classroom or '').split()).upper()
+
+
+class OccupancyIndex:
+    """(鍵, 星期) -> 已佔用節次遮罩；鍵可以是教室或教師"""
+
+    def __init__(self):
+        self._masks = defaultdict(int)
+        self._owners = defaultdict(list)  # (鍵, 星期) -> [(節次遮罩, 週次遮罩, 開課 ID, 名稱)]
+
+    def add(self, key, weekday, start_period, end_period, offering_id, label='', weeks=ALL_WEEKS):
+        bits = period_bits(start_period, end_period)
+        slot = (key, str(weekday))
+        self._masks[slot] |= bits
+        self._owners[slot].append((bits, weeks, offering_id, label))
+
+    def is_free(self, key, weekday, start_period, end_period, exclude=None, weeks=ALL_WEEKS):
+        return not self.conflicts(key, weekday, start_period, end_period, exclude, weeks)
+
+    def conflicts(self, key, weekday, start_period, end_period, exclude=None, weeks=ALL_WEEKS):
+        """回傳佔用該時段的 [(開課 ID, 名稱)]；exclude 為要忽略的開課（更新自己時）"""
+        bits = period_bits(start_period, end_period)
+        slot = (key, str(weekday))
+        if not self._masks.get(slot, 0) & bits:
+            return []
+        return [
+            (offering_id, label)
+            for owner_bits, owner_weeks, offering_id, label in self._owners[slot]
+            if owner_bits & bits and owner_weeks & weeks and offering_id != exclude
+        ]
+
+    def overlaps(self):
+        """列出索引中所有互相重疊的開課 [(鍵, 星期, 重疊節次遮罩, (開課 ID, 名稱), (開課 ID, 名稱))]"""
+        result = []
+        for (key, weekday), owners in self._owners.items():
+            if len(owners) < 2:
+                continue
+            for i, (bits_a, weeks_a, id_a, label_a) in enumerate(owners):
+                for bits_b, weeks_b, id_b, label_b in owners[i + 1:]:
+                    if bits_a & bits_b and weeks_a & weeks_b and id_a != id_b:
+                        result.append((key, weekday, bits_a & bits_b, (id_a, label_a), (id_b, label_b)))
+        return result
+
+
+def _term_class_times(academic_year, semester):
+    """該學期仍開課（非停開）的上課時段"""
+    return ClassTime.objects.filter(
+        offering__academic_year=academic_year,
+        offering__semester=semester,
+    ).exclude(offering__status='closed').order_by()
+
+
+def build_room_index(academic_year, semester, weekday=None):
+    """
+    以一次查詢建立某學期的教室佔用索引（呼叫端於本次請求內使用，不另外快取）
+    weekday 有指定時只載入該星期，例如檢查單一時段時；
+    教室名稱以 normalize_classroom 比對（忽略大小寫與空白），無法在 SQL 中篩選，故不依教室預先過濾
+    """
+    class_times = _term_class_times(academic_year, semester).exclude(classroom='')
+    if weekday is not None:
+        class_times = class_times.filter(weekday=str(weekday))
+
+    index = OccupancyIndex()
+    rows = class_times.values_list(
+        'classroom', 'weekday', 'start_period', 'end_period', 'week_mask',
+        'offering_id', 'offering__course__course_name',
+    )
+    for room, weekday, start, end, weeks, offering_id, course_name in rows:
+        try:
+            index.add(normalize_classroom(room), weekday, start, end, offering_id, course_name, weeks)
+        except ValueError:
+            continue  # 舊資料節次不正確時略過
+    return index
+
+
+def describe_conflicts(label, weekday, start_period, end_period, conflicts):
+    names = '、'.join(dict.fromkeys(name for _, name in conflicts))
+    return f"{label} 星期{weekday} 第{start_period}-{end_period}節已被「{names}」使用"
+
+
+def check_room_free(academic_year, semester, classroom, weekday, start_period, end_period,
+                    exclude=None, weeks=ALL_WEEKS):
+    """教室該時段已被其他開課使用時拋出 OccupancyConflict"""
+    key = normalize_classroom(classroom)
+    if not key:
+        return
+    index = build_room_index(academic_year, semester, weekday)
+    conflicts = index.conflicts(key, weekday, start_period, end_period, exclude, weeks)
+    if conflicts:
+        raise OccupancyConflict(describe_conflicts(f'教室 {classroom}', weekday, start_period, end_period, conflicts))
+
+
+def build_teacher_index(academic_year, semester, teacher_ids=None):
+    """
+    以一次查詢建立某學期的教師佔用索引（呼叫端於本次請求內使用，不另外快取）
+    teacher_ids 有指定時只載入這些教師
+    """
+    rows = OfferingTeacher.objects.filter(
+        offering__academic_year=academic_year,
+        offering__semester=semester,
+        offering__class_times__isnull=False,
+    ).exclude(offering__status='closed')
+    if teacher_ids is not None:
+        rows = rows.filter(teacher_id__in=set(teacher_ids))
+
+    index = OccupancyIndex()
+    for teacher_id, weekday, start, end, weeks, offering_id, course_name in rows.order_by().values_list(
+        'teacher_id', 'offering__class_times__weekday', 'offering__class_times__start_period',
+        'offering__class_times__end_period', 'offering__class_times__week_mask',
+        'offering_id', 'offering__course__course_name',
+    ):
+        try:
+            index.add(teacher_id, weekday, start, end, offering_id, course_name, weeks)
+        except ValueError:
+            continue
+    return index
+
+
+def teacher_names(teacher_ids):
+    names = dict(Profile.objects.filter(user_id__in=set(teacher_ids)).values_list('user_id', 'real_name'))
+    return {tid: names.get(tid) or f'教師 #{tid}' for tid in teacher_ids}
+
+
+def find_teacher_conflicts(index, teacher_ids, slots, exclude=None):
+    """回傳 [(教師 ID, (星期, 開始, 結束), 衝突列表)]；slots 為 [(星期, 開始節次, 結束節次, 週次遮罩)]"""
+    found = []
+    for teacher_id in dict.fromkeys(teacher_ids):
+        for weekday, start, end, weeks in slots:
+            conflicts = index.conflicts(teacher_id, weekday, start, end, exclude, weeks)
+            if conflicts:
+                found.append((teacher_id, (weekday, start, end), conflicts))
+    return found
+
+
+def describe_teacher_conflicts(found):
+    names = teacher_names([teacher_id for teacher_id, _, _ in found])
+    return '；'.join(
+        describe_conflicts(f'教師 {names[teacher_id]}', weekday, start, end, conflicts)
+        for teacher_id, (weekday, start, end), conflicts in found
+    )
+
+
+def check_teachers_free(academic_year, semester, teacher_ids, slots, exclude=None):
+    """任一教師在任一時段已有其他課時拋出 OccupancyConflict"""
+    teacher_ids = [tid for tid in teacher_ids if tid is not None]
+    if not teacher_ids or not slots:
+        return
+    index = build_teacher_index(academic_year, semester, teacher_ids)
+    found = find_teacher_conflicts(index, teacher_ids, slots, exclude)
+    if found:
+        raise OccupancyConflict(describe_teacher_conflicts(found))
+
+
+def teacher_conflict_report(academic_year, semester):
+    """列出某學期所有教師衝堂（一次查詢建立索引後逐日比對）"""
+    overlaps = build_teacher_index(academic_year, semester).overlaps()
+    names = teacher_names({teacher_id for teacher_id, *_ in overlaps})
+    return [
+        {
+            'teacher_id': teacher_id,
+            'teacher_name': names[teacher_id],
+            'weekday': weekday,
+            'start_period': (bits & -bits).bit_length() - 1,
+            'end_period': bits.bit_length() - 1,
+            'offerings': [{'id': offering_id, 'course_name': label} for offering_id, label in pair],
+        }
+        for teacher_id, weekday, bits, *pair in sorted(overlaps, key=lambda o: (o[0], o[1], o[2]))
+    ]
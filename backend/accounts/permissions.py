@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+權限判斷工具
+"""
+from .models import OfferingTeacher
+from .user_context import get_user_context
+
+
+def is_admin(request):
+    """是否為管理員（超級使用者或擁有 admin 角色）"""
+    return get_user_context(request).is_admin
+
+
+def can_manage_offering(request, offering_id):
+    """是否可管理該開課（管理員，或該課程的主開課 / 協同教師）"""
+    if is_admin(request):
+        return True
+    return request.user.is_authenticated and OfferingTeacher.objects.filter(
+        offering_id=offering_id, teacher_id=request.user.id
+    ).exists()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+課表組合產生器
+學生列出想修的課程代碼（每門課可能有多個開課班別），以位元遮罩回溯搜尋所有不衝堂的組合，
+依偏好（避開早八、空出星期五、集中上課天數）計分，只保留分數最佳的前 K 組
+- 分支少的課程先排，衝堂以一次 AND 判斷；時段遮罩重疊時再比對週次遮罩（半學期課程可同時段）
+- 分數只會隨加入的班別增加，已不可能進入前 K 名的分支直接剪枝
+"""
+import heapq
+import time
+from collections import defaultdict
+
+from .credits import current_term
+from .models import CourseOffering, Enrollment
+from .timeslots import days_mask, periods_mask, slot_mask, used_days
+
+MAX_PLANS = 50
+DEFAULT_PLANS = 10
+MAX_NODES = 200000  # 搜尋節點上限，避免極端輸入佔用請求
+
+
+def parse_preferences(data):
+    """
+    偏好設定：
+    avoid_periods 避開的節次（例如 [1] 表示不要早八），每節扣 1 分
+    free_days 希望空出的星期（例如 [5]），當天每節扣 2 分
+    fewer_days 上課天數越少越好，每多一天扣 3 分
+    """
+    data = data or {}
+    avoid_periods = [int(p) for p in data.get('avoid_periods') or []]
+    free_days = [int(d) for d in data.get('free_days') or []]
+    return {
+        'avoid_mask': periods_mask(avoid_periods) if avoid_periods else 0,
+        'free_mask': days_mask(free_days) if free_days else 0,
+        'day_weight': 3 if data.get('fewer_days') else 0,
+    }
+
+
+def _section_penalty(mask, preferences):
+    return (mask & preferences['avoid_mask']).bit_count() + 2 * (mask & preferences['free_mask']).bit_count()
+
+
+def _time_parts(class_times):
+    """回傳 (時段聯集遮罩, ((時段遮罩, 週次遮罩), ...))"""
+    parts = tuple((slot_mask(ct.weekday, ct.start_period, ct.end_period), ct.week_mask) for ct in class_times)
+    mask = 0
+    for part_mask, _ in parts:
+        mask |= part_mask
+    return mask, parts
+
+
+def _parts_conflict(parts, chosen_parts):
+    return any(
+        slot & other_slot and weeks & other_weeks
+        for slot, weeks in parts
+        for chosen in chosen_parts
+        for other_slot, other_weeks in chosen
+    )
+
+
+def load_sections(course_codes, academic_year, semester, include_full=False):
+    """讀取各課程代碼在該學期的開課班別，回傳 {課程代碼: [(遮罩, 時段明細, CourseOffering)]}"""
+    offerings = CourseOffering.objects.filter(
+        course__course_code__in=course_codes,
+        academic_year=academic_year,
+        semester=semester,
+    ).exclude(status='closed').select_related('course').prefetch_related(
+        'class_times', 'offering_teachers__teacher__profile'
+    ).order_by('id')
+    if not include_full:
+        offerings = offerings.exclude(status='full')
+
+    sections = defaultdict(list)
+    for offering in offerings:
+        sections[offering.course.course_code].append((*_time_parts(offering.class_times.all()), offering))
+    return sections
+
+
+def enrolled_times(user, academic_year, semester, exclude_codes=()):
+    """學生該學期已選課程佔用的時段 (遮罩, 時段明細)（想重新安排的課程除外）"""
+    enrollments = Enrollment.objects.filter(
+        student=user,
+        status='enrolled',
+        offering__academic_year=academic_year,
+        offering__semester=semester,
+    ).exclude(offering__course__course_code__in=exclude_codes).prefetch_related('offering__class_times')
+    return _time_parts(ct for e in enrollments for ct in e.offering.class_times.all())
+
+
+def search_plans(sections, preferences, limit=DEFAULT_PLANS, busy=(0, ())):
+    """
+    回溯搜尋不衝堂的組合；sections 為 [[(遮罩, 時段明細, 班別), ...], ...]（每門課一個列表）
+    回傳 (依分數排序的 [(分數, 遮罩, [班別...])], 搜尋節點數, 是否因節點上限中止)
+    """
+    options = [
+        sorted(
+            ((_section_penalty(mask, preferences), mask, parts, item) for mask, parts, item in choices),
+            key=lambda o: o[0],
+        )
+        for choices in sections
+    ]
+    options.sort(key=len)  # 分支少的先排
+    day_weight = preferences['day_weight']
+
+    best = []  # 最大堆（以負分數存放），保留前 limit 名
+    chosen = []
+    chosen_parts = [busy[1]]
+    nodes = 0
+    counter = 0
+    truncated = False
+
+    def score_of(penalty, mask):
+        return penalty + day_weight * len(used_days(mask)) if day_weight else penalty
+
+    def visit(depth, mask, penalty, plan_mask):
+        nonlocal nodes, counter, truncated
+        nodes += 1
+        if nodes > MAX_NODES:
+            truncated = True
+            return
+        score = score_of(penalty, mask)
+        if len(best) == limit and score >= -best[0][0]:
+            return  # 分數只會更差，剪枝
+        if depth == len(options):
+            counter += 1
+            entry = (-score, -counter, plan_mask, list(chosen))
+            if len(best) < limit:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heapreplace(best, entry)
+            return
+        for section_penalty, section_mask, parts, item in options[depth]:
+            if section_mask & mask and _parts_conflict(parts, chosen_parts):
+                continue
+            chosen.append(item)
+            chosen_parts.append(parts)
+            visit(depth + 1, mask | section_mask, penalty + section_penalty, plan_mask | section_mask)
+            chosen_parts.pop()
+            chosen.pop()
+            if truncated:
+                return
+
+    if options and all(options):
+        visit(0, busy[0], 0, 0)
+
+    plans = sorted(best, key=lambda e: (-e[0], -e[1]))
+    return [(-neg_score, mask, items) for neg_score, _, mask, items in plans], nodes, truncated
+
+
+def build_plans(user, course_codes, preferences=None, limit=DEFAULT_PLANS, include_full=False, keep_enrolled=True):
+    """產生課表組合，回傳可直接輸出的 dict"""
+    started = time.perf_counter()
+    academic_year, semester = current_term()
+    course_codes = list(dict.fromkeys(str(code).strip() for code in course_codes if str(code).strip()))
+    preferences = parse_preferences(preferences)
+    limit = max(1, min(int(limit or DEFAULT_PLANS), MAX_PLANS))
+
+    sections = load_sections(course_codes, academic_year, semester, include_full)
+    missing = [code for code in course_codes if not sections.get(code)]
+    busy = enrolled_times(user, academic_year, semester, course_codes) if keep_enrolled else (0, ())
+
+    plans, nodes, truncated = ([], 0, False) if missing else search_plans(
+        [sections[code] for code in course_codes], preferences, limit, busy
+    )
+
+    return {
+        'academic_year': academic_year,
+        'semester': semester,
+        'plans': [
+            {
+                'score': score,
+                'days': used_days(mask),
+                'offerings': [
+                    _offering_data(offering)
+                    for offering in sorted(items, key=lambda o: course_codes.index(o.course.course_code))
+                ],
+            }
+            for score, mask, items in plans
+        ],
+        'missing_codes': missing,
+        'explored': nodes,
+        'truncated': truncated,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def _offering_data(offering):
+    teachers = []
+    for ot in offering.offering_teachers.all():
+        teachers.append(ot.teacher.profile.real_name if hasattr(ot.teacher, 'profile') else ot.teacher.username)
+    return {
+        'id': offering.id,
+        'course_code': offering.course.course_code,
+        'course_name': offering.course.course_name,
+        'credits': offering.course.credits,
+        'teachers': '、'.join(teachers),
+        'class_times': [
+            {
+                'weekday': ct.weekday,
+                'weekday_display': ct.get_weekday_display(),
+                'start_period': ct.start_period,
+                'end_period': ct.end_period,
+                'classroom': ct.classroom,
+            }
+            for ct in offering.class_times.all()
+        ],
+    }
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+慢查詢紀錄（選用，SLOW_QUERY_LOG_ENABLED）
+RequestTimingMiddleware 以 connection.execute_wrapper 掛上 SlowQueryRecorder，
+耗時超過 SLOW_QUERY_MS 的 SQL 連同發出請求的 view 與程式位置寫入輪替檔案（每行一筆 JSON）；
+其中 SLOW_QUERY_EXPLAIN_SAMPLE 比例的 SELECT 另外以 EXPLAIN（SQLite 為 EXPLAIN QUERY PLAN）記錄執行計畫
+參數可能含密碼雜湊、session 內容與行事曆金鑰，預設不記錄（SLOW_QUERY_LOG_PARAMS 開啟），檔案權限為 0600
+多個 worker 共用同一檔案時，輪替當下可能遺失少量紀錄（僅供診斷使用）
+"""
+import json
+import logging
+import os
+import random
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.utils import timezone
+
+MAX_SQL_LENGTH = 10000
+MAX_PARAMS_LENGTH = 2000
+STACK_DEPTH = 5  # 記錄最內層的幾個本專案呼叫位置
+
+REDACTED = '<redacted>'
+
+_logger = logging.getLogger('accounts.slow_queries')
+_handler = None
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.join(_APP_DIR, name) for name in ('slow_queries.py', 'middleware.py')}
+
+
+class PrivateRotatingFileHandler(RotatingFileHandler):
+    """只有擁有者可讀寫（0600）的輪替檔案，輪替後新建的檔案亦同"""
+
+    def _open(self):
+        fd = os.open(self.baseFilename, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        os.chmod(self.baseFilename, 0o600)  # 既有檔案也收緊權限
+        return open(fd, self.mode, encoding=self.encoding, errors=self.errors)
+
+
+def _get_logger():
+    """第一次記錄時才建立輪替檔案（未啟用時不產生檔案）"""
+    global _handler
+    if _handler is None:
+        os.makedirs(os.path.dirname(settings.SLOW_QUERY_LOG_FILE), mode=0o700, exist_ok=True)
+        _handler = PrivateRotatingFileHandler(
+            settings.SLOW_QUERY_LOG_FILE,
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+            encoding='utf-8',
+        )
+        _handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(_handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    return _logger
+
+
+def app_stack():
+    """呼叫堆疊中屬於本專案（accounts）的位置，由內而外，例如 'views_course.py:120 in search_courses'"""
+    frames = []
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(_APP_DIR) and frame.filename not in _SKIP_FILES:
+            frames.append(f'{os.path.relpath(frame.filename, _APP_DIR)}:{frame.lineno} in {frame.name}')
+            if len(frames) >= STACK_DEPTH:
+                break
+    return frames
+
+
+def explain(connection, sql, params):
+    """
+    取得 SELECT 的執行計畫（文字列表）；無法取得時回傳 None
+    直接使用資料庫驅動層的 cursor，不經過 execute_wrapper（不計入請求的查詢統計，也不會再被記錄）
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    try:
+        with connection.cursor() as wrapper:
+            cursor = wrapper.cursor
+            cursor.execute(f'{prefix} {sql}', params)
+            return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN 失敗: {e}']
+
+
+class SlowQueryRecorder:
+    """一個請求的慢查詢記錄器（connection.execute_wrapper）"""
+
+    def __init__(self, request):
+        self.request = request
+        self.threshold = settings.SLOW_QUERY_MS / 1000
+        self.sample = settings.SLOW_QUERY_EXPLAIN_SAMPLE
+        self.log_params = settings.SLOW_QUERY_LOG_PARAMS
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                self._record(sql, params, many, context['connection'], elapsed)
+
+    def _record(self, sql, params, many, connection, elapsed):
+        match = self.request.resolver_match
+        record = {
+            'time': timezone.now().isoformat(),
+            'duration_ms': round(elapsed * 1000, 1),
+            'database': connection.alias,
+            'view': match.view_name if match else None,
+            'method': self.request.method,
+            'path': self.request.path,
+            'stack': app_stack(),
+            'sql': sql[:MAX_SQL_LENGTH],
+            'params': self._params(params, many),
+        }
+        if not many and random.random() < self.sample:
+            record['plan'] = explain(connection, sql, params)
+        _get_logger().info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def _params(self, params, many):
+        """綁定參數預設只記錄筆數（SLOW_QUERY_LOG_PARAMS 開啟時才記錄內容）"""
+        if many or params is None:
+            return None
+        if not self.log_params:
+            return f'{REDACTED} ({len(params)})'
+        return repr(params)[:MAX_PARAMS_LENGTH]
+
+
+def read_records(limit=100, view=None):
+    """由新到舊讀取慢查詢紀錄（含已輪替的檔案），可依 view 篩選"""
+    path = settings.SLOW_QUERY_LOG_FILE
+    paths = [path] + [f'{path}.{i}' for i in range(1, settings.SLOW_QUERY_LOG_BACKUP_COUNT + 1)]
+    records = []
+    for file_path in paths:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding='utf-8') as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 寫入中或被截斷的行
+            if view and record.get('view') != view:
+                continue
+            records.append(record)
+            if len(records) >= limit:
+                return records
+    return records
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+以內容雜湊命名的檔案儲存
+檔名為內容的 SHA-256（例如 avatars/3f2a...c9.png），內容相同的上傳只存一份；
+檔案內容永不改變，可由 serve_media 以 immutable 長期快取提供
+"""
+import hashlib
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_LENGTH = 32
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{%d}[^/]*$' % HASH_LENGTH)
+
+
+def is_hashed_name(name):
+    """檔名是否為內容雜湊（或由其衍生，例如縮圖 <hash>_128.webp）"""
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def private_upload_storage():
+    """PRIVATE_UPLOAD_ROOT 的檔案儲存（位於 MEDIA_ROOT 之外，不會經由 /media/ 提供）"""
+    return FileSystemStorage(location=settings.PRIVATE_UPLOAD_ROOT)
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """檔名由內容決定的 FileSystemStorage"""
+
+    def __init__(self, **kwargs):
+        # 同名即同內容，覆寫不會改變檔案
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def get_available_name(self, name, max_length=None):
+        # 實際檔名於 _save 依內容決定，不加亂數後綴
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        directory, filename = posixpath.split(name)
+        ext = posixpath.splitext(filename)[1].lower()
+        hashed_name = posixpath.join(directory, f'{digest.hexdigest()[:HASH_LENGTH]}{ext}')
+
+        # 相同內容已存在時不再寫入
+        if self.exists(hashed_name):
+            return hashed_name
+        return super()._save(hashed_name, content)
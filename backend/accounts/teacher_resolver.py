@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+教師姓名解析
+依正規化後的姓名索引鍵（Profile.name_key）查找教師，找不到時自動建立帳號
+每個請求（或每次匯入）建立一個 TeacherResolver，同名教師只查詢一次資料庫
+"""
+import logging
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Profile, normalize_name
+from .user_context import get_or_create_role_id
+
+logger = logging.getLogger(__name__)
+
+
+class TeacherResolver:
+    """以姓名解析教師帳號（含請求範圍內的快取與批次建立）"""
+
+    def __init__(self):
+        self._cache = {}  # name_key -> User
+        self.created = []  # 本次新建立的教師姓名
+
+    def resolve(self, name):
+        """解析單一教師姓名，回傳 User"""
+        return self.resolve_many([name]).get(normalize_name(name))
+
+    def resolve_many(self, names):
+        """
+        批次解析教師姓名，回傳 {name_key: User}
+        已快取的姓名不再查詢；其餘以一次 name_key__in 查詢，缺少的教師一次批次建立
+        """
+        display_names = {}
+        for name in names:
+            key = normalize_name(name)
+            if key and key not in self._cache and key not in display_names:
+                display_names[key] = str(name).strip()
+
+        if display_names:
+            profiles = Profile.objects.filter(
+                name_key__in=list(display_names)
+            ).select_related('user').order_by('id')
+            for profile in profiles:
+                # 同名時沿用最早建立的帳號（與原本 .first() 行為一致）
+                self._cache.setdefault(profile.name_key, profile.user)
+
+            missing = {key: name for key, name in display_names.items() if key not in self._cache}
+            if missing:
+                self._cache.update(self._create_teachers(missing))
+
+        result = {}
+        for name in names:
+            key = normalize_name(name)
+            if key in self._cache:
+                result[key] = self._cache[key]
+        return result
+
+    def _create_teachers(self, missing):
+        """批次建立教師帳號（User、Profile、角色各一次 bulk_create）"""
+        usernames = {}
+        taken = set()
+        while len(usernames) < len(missing):
+            candidates = {
+                key: f"teacher_{name}_{random.randint(1000, 9999)}"
+                for key, name in missing.items() if key not in usernames
+            }
+            taken |= set(User.objects.filter(
+                username__in=candidates.values()
+            ).values_list('username', flat=True))
+            for key, username in candidates.items():
+                if username not in taken:
+                    usernames[key] = username
+                    taken.add(username)
+
+        # 批次建立時不逐一執行 PBKDF2，帳號預設為不可登入，需由管理員重設密碼
+        unusable_password = make_password(None)
+        teacher_role_id = get_or_create_role_id('teacher')
+
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=usernames[key], password=unusable_password, first_name=name)
+                for key, name in missing.items()
+            ])
+            users = {
+                u.username: u
+                for u in User.objects.filter(username__in=usernames.values())
+            }
+            Profile.objects.bulk_create([
+                Profile(
+                    user=users[usernames[key]],
+                    real_name=name,
+                    name_key=key,
+                    title='教師',
+                )
+                for key, name in missing.items()
+            ])
+            profile_ids = Profile.objects.filter(
+                user__in=users.values()
+            ).values_list('id', flat=True)
+            Profile.roles.through.objects.bulk_create([
+                Profile.roles.through(profile_id=profile_id, role_id=teacher_role_id)
+                for profile_id in profile_ids
+            ])
+
+        for key, name in missing.items():
+            logger.info('自動創建新教師: %s (username: %s)', name, usernames[key])
+            self.created.append(name)
+
+        return {key: users[usernames[key]] for key in missing}
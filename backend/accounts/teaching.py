@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+教師授課儀表板
+授課列表直接由 OfferingTeacher 查詢，教師在該課的角色就在同一列，不需每門課再查一次；
+列表與每學期摘要（課程數、修課人數、滿班率）整份快取，
+版本為教師所有開課的筆數與最後更新時間，選課、退選或開課資料變動後自動失效
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .metrics import record_cache
+from .models import OfferingTeacher
+
+TEACHING_CACHE_TIMEOUT = 60 * 60
+
+
+def _dashboard_version(user):
+    """選課 / 退選會更新開課人數（及 updated_at），課程或教師異動也會更新開課的 updated_at"""
+    stats = OfferingTeacher.objects.filter(teacher=user).aggregate(
+        count=Count('id'),
+        offering_updated=Max('offering__updated_at'),
+        course_updated=Max('offering__course__updated_at'),
+    )
+    return '{}:{}:{}'.format(
+        stats['count'],
+        stats['offering_updated'].timestamp() if stats['offering_updated'] else 0,
+        stats['course_updated'].timestamp() if stats['course_updated'] else 0,
+    )
+
+
+def _teacher_name(ot):
+    return ot.teacher.profile.real_name if hasattr(ot.teacher, 'profile') else ot.teacher.username
+
+
+def build_teaching_courses(user):
+    """教師的授課列表（主開課與協同），依學期新到舊、課程代碼排序"""
+    rows = OfferingTeacher.objects.filter(teacher=user).select_related(
+        'offering__course', 'offering__department'
+    ).prefetch_related(
+        'offering__offering_teachers__teacher__profile',
+        'offering__class_times',
+    ).order_by('-offering__academic_year', '-offering__semester', 'offering__course__course_code')
+
+    courses = []
+    for my_role in rows:
+        offering = my_role.offering
+
+        times_display = [
+            f"{ct.get_weekday_display()} 第{ct.start_period}-{ct.end_period}節 ({ct.classroom})"
+            for ct in offering.class_times.all()
+        ]
+        teacher_names = [
+            f"{_teacher_name(ot)}(主)" if ot.role == 'main' else _teacher_name(ot)
+            for ot in offering.offering_teachers.all()
+        ]
+
+        courses.append({
+            'id': offering.id,
+            'course_code': offering.course.course_code,
+            'course_name': offering.course.course_name,
+            'course_type': offering.course.get_course_type_display(),
+            'credits': offering.course.credits,
+            'academic_year': offering.academic_year,
+            'semester': offering.get_semester_display(),
+            'semester_code': offering.semester,
+            'department': offering.department.name,
+            'my_role': my_role.get_role_display(),
+            'time_info': '；'.join(times_display) if times_display else '未設定',
+            'teacher_names': '、'.join(teacher_names),
+            'student_count': f"{offering.current_students} / {offering.max_students}",
+            'current_students': offering.current_students,
+            'max_students': offering.max_students,
+            'status': offering.get_status_display()
+        })
+    return courses
+
+
+def summarize(courses):
+    """每學期的課程數、修課人數與滿班率（修課人數 / 人數上限）"""
+    terms = defaultdict(lambda: {'course_count': 0, 'enrolled': 0, 'capacity': 0})
+    for course in courses:
+        term = terms[(course['academic_year'], course['semester_code'])]
+        term['course_count'] += 1
+        term['enrolled'] += course['current_students']
+        term['capacity'] += course['max_students']
+
+    by_term = []
+    for (year, semester), term in sorted(terms.items(), key=lambda item: (int(item[0][0]), item[0][1]), reverse=True):
+        by_term.append({
+            'academic_year': year,
+            'semester': semester,
+            **term,
+            'fill_ratio': round(term['enrolled'] / term['capacity'], 4) if term['capacity'] else 0,
+        })
+
+    return {
+        'course_count': len(courses),
+        'total_enrolled': sum(course['current_students'] for course in courses),
+        'terms': by_term,
+    }
+
+
+def get_teaching_dashboard(user):
+    """取得（或建立並快取）教師的授課列表與摘要 {'courses': [...], 'summary': {...}}"""
+    cache_key = f'teaching:{user.id}:{_dashboard_version(user)}'
+    data = cache.get(cache_key)
+    record_cache('teaching', data is not None)
+    if data is None:
+        courses = build_teaching_courses(user)
+        data = {'courses': courses, 'summary': summarize(courses)}
+        cache.set(cache_key, data, TEACHING_CACHE_TIMEOUT)
+    return data
@@ -1,3 +1,481 @@
-from django.test import TestCase
+import json
+import os
+import random
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from .credits import CREDIT_FIELDS, rebuild_credit_summaries, record_enrollment_change
+from . import metrics, slow_queries
+from .gpa import _compute_numpy, _compute_python, naive_gpa
+from .grades import save_grades, status_for, validate_grades
+from .jobs import claim_job, run_job
+from .models import (
+    BackgroundJob, ClassTime, Course, CourseOffering, CreditSummary, Department, Enrollment, Profile, Role,
+)
+from .timeslots import parse_weeks
+from .occupancy import OccupancyConflict, check_room_free
+from .utilization import _build_python, build_matrices, load_arrays, room_utilization
+from .user_context import clear_role_cache, get_role_id
+
+
+def make_offering(course_code, weekday='1', start_period=1, end_period=2, classroom='R101', weeks=None,
+                  course_type='required', credits=3, academic_year='114', semester='1'):
+    """建立一門開課與一個上課時段"""
+    department, _ = Department.objects.get_or_create(name='資管系')
+    course = Course.objects.create(
+        course_code=course_code, course_name=course_code, course_type=course_type, credits=credits,
+    )
+    offering = CourseOffering.objects.create(
+        course=course, department=department, academic_year=academic_year, semester=semester, grade_level=1,
+    )
+    ClassTime.objects.create(
+        offering=offering, weekday=weekday, start_period=start_period, end_period=end_period,
+        classroom=classroom, weeks=weeks,
+    )
+    return offering
+
+
+class ServeMediaTests(TestCase):
+    """背景工作的上傳檔不可經由 /media/ 取得（含 .. 與 ./ 的路徑）"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'job_uploads'))
+        os.makedirs(os.path.join(self.media_root, 'avatars'))
+        with open(os.path.join(self.media_root, 'job_uploads', 's.xlsx'), 'wb') as f:
+            f.write(b'private')
+        with open(os.path.join(self.media_root, 'avatars', 'a.png'), 'wb') as f:
+            f.write(b'public')
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def get(self, path):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(f'/media/{path}')
+        self.addCleanup(response.close)  # 未讀取的串流回應需關閉，RequestTimingMiddleware 才會卸下 wrapper
+        return response
+
+    def test_public_file_is_served(self):
+        self.assertEqual(self.get('avatars/a.png').status_code, 200)
+
+    def test_private_upload_is_hidden(self):
+        for path in ('job_uploads/s.xlsx', 'avatars/../job_uploads/s.xlsx', './job_uploads/s.xlsx'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path).status_code, 404)
+
+    def test_closing_unread_stream_removes_query_wrappers(self):
+        wrappers = list(connection.execute_wrappers)
+        response = self.get('avatars/a.png')
+        self.assertGreater(len(connection.execute_wrappers), len(wrappers))
+        response.close()
+        self.assertEqual(connection.execute_wrappers, wrappers)
+
+    def test_import_upload_is_stored_outside_media_root(self):
+        private_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, private_root)
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        upload = SimpleUploadedFile('courses.xlsx', b'xlsx')
+        with override_settings(MEDIA_ROOT=self.media_root, PRIVATE_UPLOAD_ROOT=private_root, JOBS_RUN_IN_THREAD=False):
+            response = self.client.post('/api/courses/import/', {'file': upload})
+        self.assertEqual(response.status_code, 202)
+        path = BackgroundJob.objects.get(id=response.data['job_id']).params['file_path']
+        self.assertTrue(os.path.exists(os.path.join(private_root, path)))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'job_uploads')), ['s.xlsx'])
+
+
+class GradeReconcileTests(TestCase):
+    """登錄成績後再校正人數，已通過 / 未通過的學生仍計入開課人數"""
+
+    def setUp(self):
+        department = Department.objects.create(name='資管系')
+        course = Course.objects.create(course_code='IM101', course_name='程式設計', course_type='required', credits=3)
+        self.offering = CourseOffering.objects.create(
+            course=course, department=department, academic_year='114', semester='1',
+            grade_level=1, max_students=2, current_students=2, status='full',
+        )
+        for username in ('s1', 's2'):
+            student = User.objects.create_user(username=username, password='x')
+            Enrollment.objects.create(student=student, offering=self.offering)
+
+    def test_graded_students_keep_their_seats(self):
+        rows = [{'enrollment_id': e.id, 'grade': grade}
+                for e, grade in zip(Enrollment.objects.order_by('id'), ('A', 'F'))]
+        changes, errors = validate_grades(self.offering.id, rows)
+        self.assertEqual(errors, [])
+        save_grades(changes)
+        self.assertEqual(
+            sorted(Enrollment.objects.values_list('status', flat=True)), ['failed', 'passed']
+        )
+
+        job = BackgroundJob.objects.create(job_type='reconcile_offering_counts')
+        run_job(claim_job(job.id))
+
+        self.offering.refresh_from_db()
+        self.assertEqual(self.offering.current_students, 2)
+        self.assertEqual(self.offering.status, 'full')
+
+
+class ClassTimeMaskTests(TestCase):
+    """上課時段儲存時計算節次 / 週次遮罩，節次不正確時拒絕寫入"""
+
+    def setUp(self):
+        department = Department.objects.create(name='資管系')
+        course = Course.objects.create(course_code='IM102', course_name='資料庫', course_type='required', credits=3)
+        self.offering = CourseOffering.objects.create(
+            course=course, department=department, academic_year='114', semester='1', grade_level=2,
+        )
+
+    def test_masks_are_computed_on_save(self):
+        ct = ClassTime.objects.create(
+            offering=self.offering, weekday='2', start_period=3, end_period=4, classroom='R101', weeks='1-9',
+        )
+        self.assertEqual(ct.period_mask, 0b11000)
+        self.assertEqual(ct.week_mask, parse_weeks('1-9'))
+
+    def test_invalid_periods_are_rejected(self):
+        for start, end in ((0, 2), (3, 16), (5, 4)):
+            with self.subTest(start=start, end=end):
+                ct = ClassTime(offering=self.offering, weekday='1', start_period=start, end_period=end, classroom='R101')
+                with self.assertRaises(ValueError):
+                    ct.save()
+                with self.assertRaises(ValidationError):
+                    ct.full_clean()
+        self.assertFalse(ClassTime.objects.exists())
+
+
+class ExportTests(TestCase):
+    """匯出的 CSV 不可含有會被試算表執行的公式，檔名參數需為數字"""
+
+    def setUp(self):
+        department = Department.objects.create(name='資管系')
+        course = Course.objects.create(
+            course_code='IM103', course_name='=HYPERLINK("http://x")', course_type='elective', credits=2,
+        )
+        CourseOffering.objects.create(
+            course=course, department=department, academic_year='114', semester='1', grade_level=1,
+        )
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+
+    def test_formula_cells_are_escaped(self):
+        response = self.client.get('/api/export/offerings/', {'academic_year': '114', 'semester': '1'})
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertIn('"\'=HYPERLINK(""http://x"")"', content)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="offerings_114_1.csv"')
+
+    def test_non_numeric_term_is_rejected(self):
+        response = self.client.get('/api/export/offerings/', {'academic_year': '114"\r\nX: y'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RoleCacheTests(TestCase):
+    """角色 ID 快取：讀取不建立角色，角色變動後立即失效"""
+
+    def setUp(self):
+        clear_role_cache()
+        self.addCleanup(clear_role_cache)
+
+    def test_lookup_does_not_create_roles(self):
+        with self.assertRaises(Role.DoesNotExist):
+            get_role_id('student')
+        self.assertFalse(Role.objects.exists())
+
+    def test_deleted_role_is_not_served_from_cache(self):
+        role = Role.objects.create(name='student')
+        self.assertEqual(get_role_id('student'), role.id)
+        role.delete()
+        with self.assertRaises(Role.DoesNotExist):
+            get_role_id('student')
+
+
+class RoomConflictTests(TestCase):
+    """教室衝突：同一天、節次與週次皆重疊才衝突，教室名稱忽略大小寫與空白"""
+
+    def setUp(self):
+        self.offering = make_offering('A', weekday='1', start_period=1, end_period=2, classroom='R101', weeks='1-9')
+
+    def assertConflict(self, classroom='R101', weekday='1', start=1, end=2, weeks='1-18', exclude=None):
+        with self.assertRaises(OccupancyConflict):
+            check_room_free('114', '1', classroom, weekday, start, end, exclude, parse_weeks(weeks))
+
+    def assertFree(self, classroom='R101', weekday='1', start=1, end=2, weeks='1-18', exclude=None):
+        check_room_free('114', '1', classroom, weekday, start, end, exclude, parse_weeks(weeks))
+
+    def test_overlapping_periods_conflict(self):
+        self.assertConflict(start=2, end=3)
+        self.assertConflict(classroom=' r 101 ')
+
+    def test_adjacent_periods_other_days_and_rooms_are_free(self):
+        self.assertFree(start=3, end=4)
+        self.assertFree(weekday='2')
+        self.assertFree(classroom='R102')
+        self.assertFree(exclude=self.offering.id)
+
+    def test_week_masks(self):
+        self.assertFree(weeks='10-18')
+        self.assertConflict(weeks='9-12')
+        make_offering('B', weekday='3', classroom='R201', weeks='單週')
+        self.assertFree(classroom='R201', weekday='3', weeks='雙週')
+        self.assertConflict(classroom='R201', weekday='3', weeks='3')
+
+
+class RoomUtilizationTests(TestCase):
+    """教室使用率：週次重疊才算重複排課，使用率以週次聯集計算"""
+
+    def setUp(self):
+        cache.clear()
+
+    def summary(self):
+        return {row['classroom']: row for row in room_utilization('114', '1')['summary']}
+
+    def test_same_weeks_are_double_booked(self):
+        make_offering('A', classroom='R101', weeks='1-9')
+        make_offering('B', classroom='R 101', weeks='1-9')
+        row = self.summary()['R101']
+        self.assertEqual(row['double_booked_cells'], 2)
+        self.assertEqual(row['utilization'], round(2 * 9 / 20 / 70, 4))
+
+    def test_odd_and_even_weeks_share_a_room(self):
+        make_offering('A', classroom='R101', weeks='單週')
+        make_offering('B', classroom='R101', weeks='雙週')
+        row = self.summary()['R101']
+        self.assertEqual(row['double_booked_cells'], 0)
+        self.assertEqual(row['utilization'], round(2 / 70, 4))
+
+    def test_numpy_and_python_builds_agree(self):
+        make_offering('A', classroom='R101', start_period=1, end_period=3, weeks='1-9')
+        make_offering('B', classroom='R101', start_period=2, end_period=4, weeks='5-12')
+        make_offering('C', classroom='R202', weekday='5', start_period=7, end_period=8)
+        rooms, arrays = load_arrays('114', '1')
+        self.assertEqual(build_matrices(len(rooms), arrays), _build_python(len(rooms), arrays))
+
+
+@override_settings(CURRENT_ACADEMIC_YEAR='114', CURRENT_SEMESTER='1')
+class CreditDeltaTests(TestCase):
+    """選課 / 退選 / 成績變動的增量更新結果與整筆重算一致"""
+
+    def setUp(self):
+        self.student = User.objects.create_user(username='s1', password='x')
+        rebuild_credit_summaries([self.student.id])
+
+    def totals(self):
+        return CreditSummary.objects.filter(student=self.student).values(*CREDIT_FIELDS).get()
+
+    def change(self, enrollment, old_status, new_status):
+        """套用一次狀態變動，確認增量結果與整筆重算相同，回傳統計"""
+        if new_status is None:
+            enrollment.delete()
+        else:
+            enrollment.status = new_status
+            enrollment.save()
+        record_enrollment_change(enrollment, old_status, new_status)
+        incremental = self.totals()
+        rebuild_credit_summaries([self.student.id])
+        self.assertEqual(incremental, self.totals())
+        return incremental
+
+    def test_deltas_match_rebuild(self):
+        current = Enrollment(student=self.student, offering=make_offering('A', credits=3))
+        past = Enrollment(student=self.student, offering=make_offering(
+            'B', course_type='general_elective', credits=2, academic_year='113', semester='2',
+        ))
+
+        totals = self.change(current, None, 'enrolled')
+        self.assertEqual((totals['semester_total_credits'], totals['semester_required_credits']), (3, 3))
+        totals = self.change(past, None, 'passed')
+        self.assertEqual((totals['total_credits'], totals['general_credits']), (2, 2))
+        totals = self.change(current, 'enrolled', 'passed')
+        self.assertEqual((totals['semester_total_credits'], totals['passed_credits']), (0, 5))
+        totals = self.change(current, 'passed', 'failed')
+        self.assertEqual((totals['passed_credits'], totals['failed_credits']), (2, 3))
+        totals = self.change(past, 'passed', None)
+        self.assertEqual((totals['total_credits'], totals['passed_credits']), (0, 0))
+
+
+class GradeStatusTests(TestCase):
+    """成績登錄：等第優先於分數，C- / 60 分為及格，整批驗證失敗的列不寫入"""
+
+    def setUp(self):
+        self.offering = make_offering('A')
+        self.enrollments = []
+        for i in range(3):
+            student = User.objects.create_user(username=f's{i}', password='x')
+            self.enrollments.append(Enrollment.objects.create(student=student, offering=self.offering))
+
+    def test_status_for(self):
+        cases = [
+            (('C-', None), 'passed'), (('D', None), 'failed'), (('D', Decimal('95')), 'failed'),
+            ((None, Decimal('60')), 'passed'), ((None, Decimal('59.99')), 'failed'), ((None, None), 'enrolled'),
+        ]
+        for (grade, score), expected in cases:
+            with self.subTest(grade=grade, score=score):
+                self.assertEqual(status_for(grade, score), expected)
+
+    def test_invalid_rows_are_reported(self):
+        first = self.enrollments[0].id
+        rows = [
+            {'enrollment_id': first, 'grade': 'a'},
+            {'enrollment_id': first, 'grade': 'B'},
+            {'enrollment_id': self.enrollments[1].id, 'grade': 'E'},
+            {'enrollment_id': self.enrollments[2].id, 'score': '101'},
+            {'enrollment_id': 999999, 'grade': 'A'},
+        ]
+        changes, errors = validate_grades(self.offering.id, rows)
+        self.assertEqual([row['row'] for row in errors], [2, 3, 4, 5])
+        self.assertEqual([(e.id, grade, status) for e, grade, _, status in changes], [(first, 'A', 'passed')])
+
+    def test_clearing_a_grade_returns_to_enrolled(self):
+        enrollment = self.enrollments[0]
+        save_grades(validate_grades(self.offering.id, [{'enrollment_id': enrollment.id, 'score': '72'}])[0])
+        enrollment.refresh_from_db()
+        self.assertEqual((enrollment.status, enrollment.score), ('passed', Decimal('72.00')))
+
+        save_grades(validate_grades(self.offering.id, [{'enrollment_id': enrollment.id}])[0])
+        enrollment.refresh_from_db()
+        self.assertEqual((enrollment.status, enrollment.grade, enrollment.score), ('enrolled', None, None))
+
+
+@override_settings(CURRENT_ACADEMIC_YEAR='114', CURRENT_SEMESTER='1')
+class CalendarFeedTests(TestCase):
+    """行事曆訂閱：回應附 ETag，課表未變動時回應 304，選課變動後 ETag 改變"""
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='s1', password='x')
+        Profile.objects.create(user=self.student, real_name='學生', calendar_token='token123')
+        Enrollment.objects.create(student=self.student, offering=make_offering('A', weeks='1-9'))
+        self.url = '/api/calendar/token123.ics'
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('BEGIN:VEVENT', response.content.decode())
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Enrollment.objects.create(student=self.student, offering=make_offering('B', weekday='2'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.content.decode().count('BEGIN:VEVENT'), 2)
+
+    def test_unknown_token(self):
+        self.assertEqual(self.client.get('/api/calendar/nope.ics').status_code, 404)
+
+
+class GpaEngineTests(SimpleTestCase):
+    """GPA 批次計算：numpy 與純 Python 版本的結果與逐一計算的參考實作一致"""
+
+    def random_arrays(self, rows=500):
+        rng = random.Random(37)
+        arrays = {'student': [], 'term': [], 'point': [], 'credits': [], 'status': []}
+        for _ in range(rows):
+            point = rng.choice([4.3, 4.0, 3.7, 3.0, 2.0, 1.7, 1.0, 0.0, float('nan')])
+            arrays['student'].append(rng.randint(1, 40))
+            arrays['term'].append(rng.choice([1121, 1122, 1131, 1132, 1141]))
+            arrays['point'].append(point)
+            arrays['credits'].append(rng.choice([0, 1, 2, 3]))
+            arrays['status'].append(2 if point == 0.0 else 1)
+        return arrays
+
+    def assertSameResult(self, result, expected):
+        for part in ('cumulative', 'term', 'passed', 'failed'):
+            self.assertEqual(result[part].keys(), expected[part].keys())
+            for key, value in expected[part].items():
+                self.assertAlmostEqual(result[part][key], value, places=9, msg=f'{part} {key}')
+
+    def test_engines_match_reference(self):
+        arrays = self.random_arrays()
+        expected = naive_gpa(arrays)
+        self.assertSameResult(_compute_python(arrays), expected)
+        self.assertSameResult(_compute_numpy(arrays), expected)
+
+    def test_weighted_average(self):
+        arrays = {
+            'student': [1, 1, 1], 'term': [1141, 1141, 1132],
+            'point': [4.0, 2.0, float('nan')], 'credits': [3, 1, 2], 'status': [1, 1, 1],
+        }
+        result = _compute_python(arrays)
+        self.assertAlmostEqual(result['cumulative'][1], 3.5)
+        self.assertEqual(result['term'][(1, 1132)], 0.0)
+        self.assertEqual(result['passed'][1], 6)
+
+
+class MetricsTests(SimpleTestCase):
+    """/metrics 加總所有 worker 的快照"""
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        settings_override = override_settings(METRICS_DIR=self.metrics_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics._pid = None  # 以新的快照檔重新開始計數
+        self.addCleanup(setattr, metrics, '_pid', None)
+
+    def test_snapshots_from_all_workers_are_summed(self):
+        metrics.observe_request('search_courses', 'GET', 200, 0.03, 4)
+        metrics.record_cache('ics', True)
+        labels = [['method', 'GET'], ['status', '200'], ['view', 'search_courses']]
+        other_worker = {
+            'counters': [
+                ['course_http_requests_total', labels, 2],
+                ['course_cache_requests_total', [['cache', 'ics'], ['result', 'miss']], 1],
+            ],
+            'histograms': [['course_http_request_queries', [['view', 'search_courses']], [0, 0, 0, 2, 0, 0, 0, 0, 0, 8, 2]]],
+        }
+        with open(os.path.join(self.metrics_dir, '1-1.json'), 'w', encoding='utf-8') as f:
+            json.dump(other_worker, f)
+
+        text = metrics.render()
+        self.assertIn('course_http_requests_total{method="GET",status="200",view="search_courses"} 3', text)
+        self.assertIn('course_http_request_queries_bucket{view="search_courses",le="5"} 3', text)
+        self.assertIn('course_http_request_queries_count{view="search_courses"} 3', text)
+        self.assertIn('course_http_request_queries_sum{view="search_courses"} 12', text)
+        self.assertIn('course_cache_hit_ratio{cache="ics"} 0.5000', text)
+
+
+class SlowQueryLogTests(TestCase):
+    """慢查詢紀錄：參數預設不記錄，檔案權限為 0600"""
+
+    def setUp(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        settings_override = override_settings(
+            SLOW_QUERY_LOG_FILE=os.path.join(log_dir, 'logs', 'slow.log'),
+            SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN_SAMPLE=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        slow_queries._handler = None
+        self.addCleanup(self.close_handler)
+
+    def close_handler(self):
+        if slow_queries._handler is not None:
+            slow_queries._logger.removeHandler(slow_queries._handler)
+            slow_queries._handler.close()
+            slow_queries._handler = None
+
+    def run_query(self):
+        recorder = slow_queries.SlowQueryRecorder(RequestFactory().get('/api/courses/'))
+        with connection.execute_wrapper(recorder):
+            User.objects.filter(username='secret-value').exists()
+        return slow_queries.read_records()[0]
+
+    def test_params_are_redacted(self):
+        record = self.run_query()
+        self.assertEqual(record['params'], f'{slow_queries.REDACTED} (2)')
+        with open(slow_queries._handler.baseFilename, encoding='utf-8') as f:
+            self.assertNotIn('secret-value', f.read())
+        self.assertEqual(os.stat(slow_queries._handler.baseFilename).st_mode & 0o777, 0o600)
+
+    @override_settings(SLOW_QUERY_LOG_PARAMS=True)
+    def test_params_can_be_enabled(self):
+        self.assertIn('secret-value', self.run_query()['params'])
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+上課時段位元遮罩
+一週 7 天、每天保留 PERIODS_PER_DAY 個位元，(星期, 開始節次, 結束節次) 對應一個整數，
+兩個時段是否衝突只需一次 AND 運算
+週次（例如 "1-9,11-18"）另以 MAX_WEEKS 位元的週次遮罩表示，半學期課程只在週次也重疊時才衝突
+"""
+import re
+PERIODS_PER_DAY = 16  # 節次 1-14，每天保留 16 個位元
+DAY_BITS = (1 << PERIODS_PER_DAY) - 1
+
+MAX_WEEKS = 20
+ALL_WEEKS = ((1 << MAX_WEEKS) - 1) << 1  # 第 1-20 週（第 n 週為第 n 個位元）
+ODD_WEEKS = sum(1 << week for week in range(1, MAX_WEEKS + 1, 2))
+EVEN_WEEKS = ALL_WEEKS & ~ODD_WEEKS
+
+WEEK_RANGE_RE = re.compile(r'^(\d+)\s*[-~－～至]\s*(\d+)$')
+
+
+def period_bits(start_period, end_period):
+    """單日第 start_period 到 end_period 節的遮罩（節次需為 1-15 且開始不大於結束，否則拋出 ValueError）"""
+    try:
+        start, end = int(start_period), int(end_period)
+    except (TypeError, ValueError):
+        raise ValueError(f'節次不正確: {start_period}-{end_period}')
+    if not 1 <= start <= end < PERIODS_PER_DAY:
+        raise ValueError(f'節次不正確: {start_period}-{end_period}')
+    return ((1 << (end - start + 1)) - 1) << start
+
+
+def slot_mask(weekday, start_period, end_period):
+    """星期 weekday（'1'-'7'）第 start_period 到 end_period 節的遮罩"""
+    day = int(weekday) - 1
+    if not 0 <= day < 7:
+        raise ValueError(f'星期不正確: {weekday}')
+    return period_bits(start_period, end_period) << (day * PERIODS_PER_DAY)
+
+
+def periods_mask(periods, weekdays=range(1, 8)):
+    """指定節次在指定星期的遮罩，例如第 1 節（早八）"""
+    mask = 0
+    for weekday in weekdays:
+        for period in periods:
+            mask |= slot_mask(weekday, period, period)
+    return mask
+
+
+def days_mask(weekdays):
+    """整天的遮罩"""
+    mask = 0
+    for weekday in weekdays:
+        mask |= DAY_BITS << ((int(weekday) - 1) * PERIODS_PER_DAY)
+    return mask
+
+
+def used_days(mask):
+    """遮罩中有課的星期（1-7）"""
+    return [day + 1 for day in range(7) if (mask >> (day * PERIODS_PER_DAY)) & DAY_BITS]
+
+
+def parse_weeks(text):
+    """
+    解析週次字串為週次遮罩，例如 "1-9,11-18"、"1,3,5"、"單週"、"雙週"
+    空白或無法解析時視為整學期（保守判斷衝突）
+    """
+    mask = 0
+    for token in re.split(r'[,，、;；\s]+', str(text or '').strip()):
+        if not token:
+            continue
+        if token.startswith('單'):
+            mask |= ODD_WEEKS
+        elif token.startswith('雙'):
+            mask |= EVEN_WEEKS
+        elif token.isdigit():
+            mask |= 1 << int(token)
+        else:
+            match = WEEK_RANGE_RE.match(token)
+            if match:
+                start, end = sorted((int(match.group(1)), int(match.group(2))))
+                mask |= ((1 << (end - start + 1)) - 1) << start
+    mask &= ALL_WEEKS
+    return mask or ALL_WEEKS
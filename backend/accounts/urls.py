@@ -4,7 +4,7 @@ Django URL 配置
 整合所有分離的 views 模組
 """
 from django.urls import path
-from . import views_auth, views_student, views_admin, views_course, views_account, views_debug
+from . import views_auth, views_student, views_admin, views_course, views_account, views_debug, views_jobs, views_export, views_calendar
 
 urlpatterns = [
     # ===== 認證相關 API =====
@@ -14,15 +14,26 @@ urlpatterns = [
     
     # ===== 學生功能 API =====
     path('user/credit-summary/', views_student.get_credit_summary, name='credit_summary'),
+    path('user/transcript/', views_student.get_transcript, name='transcript'),
+    path('user/graduation-audit/', views_student.get_graduation_audit, name='graduation_audit'),
+    path('graduation/audit/', views_student.audit_graduating_class, name='audit_graduating_class'),
+    path('user/calendar/', views_calendar.calendar_subscription, name='calendar_subscription'),
+    path('calendar/<str:token>.ics', views_calendar.calendar_feed, name='calendar_feed'),
     
     # ===== 管理員功能 API =====
     # path('teachers/', views_admin.get_teachers, name='get_teachers'),  # ← 註解掉，與下面衝突
     path('courses/create/', views_admin.create_course, name='create_course'),
+    path('courses/bulk/', views_admin.bulk_update_offerings, name='bulk_update_offerings'),
+    path('courses/import/', views_course.import_courses_excel, name='import_courses_excel'),
     path('courses/<int:course_id>/delete/', views_admin.delete_course, name='delete_course'),
+    path('reports/teacher-conflicts/', views_admin.get_teacher_conflicts, name='teacher_conflicts'),
+    path('reports/room-utilization/', views_admin.get_room_utilization, name='room_utilization'),
+    path('reports/slow-queries/', views_admin.get_slow_queries, name='slow_queries'),
     
     # ===== 課程查詢與篩選 API（必須在 courses/ 之前）=====
     path('courses/search/', views_course.search_courses, name='search_courses'),
     path('courses/filter-options/', views_course.get_filter_options, name='filter_options'),
+    path('courses/plan/', views_course.plan_schedules, name='plan_schedules'),
     path('courses/<int:course_id>/detail/', views_course.get_course_detail, name='get_course_detail'),
     path('courses/<int:course_id>/update/', views_course.update_course, name='update_course'),
     
@@ -30,6 +41,9 @@ urlpatterns = [
     path('courses/<int:course_id>/favorite/', views_course.toggle_favorite, name='toggle_favorite'),
     path('courses/favorites/', views_course.get_favorite_courses, name='get_favorite_courses'),
     path('courses/my-teaching/', views_course.my_teaching_courses, name='my_teaching_courses'), # 教師授課列表
+    path('courses/my-teaching/summary/', views_course.my_teaching_summary, name='my_teaching_summary'),
+    path('courses/<int:course_id>/roster/', views_course.get_course_roster, name='get_course_roster'),
+    path('courses/<int:course_id>/grades/', views_course.submit_grades, name='submit_grades'),
     
     # ===== 學生選課 API =====
     path('courses/<int:course_id>/enroll/', views_course.enroll_course, name='enroll_course'),
@@ -55,6 +69,18 @@ urlpatterns = [
     # 密碼修改
     path('change-password/', views_auth.change_password, name='change_password'),
 
+    # ===== 資料匯出 API =====
+    path('export/offerings/', views_export.export_offerings, name='export_offerings'),
+    path('export/enrollments/', views_export.export_enrollments, name='export_enrollments'),
+    path('export/room-utilization/', views_export.export_room_utilization, name='export_room_utilization'),
+
+    # ===== 背景工作 API =====
+    path('jobs/', views_jobs.get_recent_jobs, name='get_recent_jobs'),
+    path('jobs/<int:job_id>/', views_jobs.get_job_status, name='get_job_status'),
+    path('jobs/<int:job_id>/progress/', views_jobs.get_job_progress, name='get_job_progress'),
+    path('jobs/reconcile-offering-counts/', views_jobs.reconcile_offering_counts, name='reconcile_offering_counts'),
+    path('jobs/compute-gpa/', views_jobs.compute_gpa, name='compute_gpa'),
+
     path('debug-settings/', views_debug.debug_settings, name='debug_settings'),
     
     # ===== 這個必須放在最後，因為它會匹配所有 courses/ =====
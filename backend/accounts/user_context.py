@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+使用者身分快取
+- 角色名稱與 ID 的對照存放於 Django 快取（ROLE_CACHE_TIMEOUT 秒或角色變動時重新載入），不再每次以 Role.objects.get 查詢
+- 每個請求的 Profile 與角色集合只以一次 JOIN 查詢載入，存放於 request.user_context
+"""
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+
+from .models import Profile, Role
+
+# 角色位元旗標
+ROLE_FLAGS = {
+    'student': 1,
+    'teacher': 2,
+    'admin': 4,
+}
+
+ROLE_CACHE_KEY = 'user_context:role_ids'
+ROLE_CACHE_TIMEOUT = 300
+
+
+def _role_ids():
+    """角色名稱 -> ID"""
+    role_ids = cache.get(ROLE_CACHE_KEY)
+    if role_ids is None:
+        role_ids = dict(Role.objects.values_list('name', 'id'))
+        cache.set(ROLE_CACHE_KEY, role_ids, ROLE_CACHE_TIMEOUT)
+    return role_ids
+
+
+def get_role_id(name):
+    """取得角色 ID（只讀取，角色不存在時拋出 Role.DoesNotExist）"""
+    role_id = _role_ids().get(name)
+    if role_id is None:
+        clear_role_cache()
+        role_id = Role.objects.values_list('id', flat=True).get(name=name)
+    return role_id
+
+
+def get_or_create_role_id(name):
+    """取得角色 ID，不存在時建立（註冊、建立教師等寫入流程使用）"""
+    try:
+        return get_role_id(name)
+    except Role.DoesNotExist:
+        return Role.objects.get_or_create(name=name)[0].id
+
+
+def _role_names_by_id():
+    return {role_id: name for name, role_id in _role_ids().items()}
+
+
+def clear_role_cache():
+    cache.delete(ROLE_CACHE_KEY)
+
+
+@receiver([post_save, post_delete], sender=Role)
+def _role_changed(sender, **kwargs):
+    clear_role_cache()
+
+
+class UserContext:
+    """單一請求中的使用者、Profile 與角色集合（首次存取時才查詢）"""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _loaded(self):
+        if not self.user.is_authenticated:
+            return None, frozenset()
+
+        # 每個角色一列：Profile 欄位與角色 ID 在同一次 LEFT JOIN 中取得
+        rows = list(Profile.objects.filter(user_id=self.user.id).annotate(role_id=F('roles')))
+        if not rows:
+            return None, frozenset()
+
+        role_names = _role_names_by_id()
+        if any(row.role_id is not None and row.role_id not in role_names for row in rows):
+            clear_role_cache()
+            role_names = _role_names_by_id()
+
+        profile = rows[0]
+        profile.user = self.user
+        names = frozenset(role_names[row.role_id] for row in rows if row.role_id in role_names)
+        return profile, names
+
+    @property
+    def profile(self):
+        return self._loaded[0]
+
+    @property
+    def roles(self):
+        """角色名稱集合（frozenset）"""
+        return self._loaded[1]
+
+    @cached_property
+    def role_flags(self):
+        flags = 0
+        for name in self.roles:
+            flags |= ROLE_FLAGS.get(name, 0)
+        return flags
+
+    def has_role(self, name):
+        return bool(self.role_flags & ROLE_FLAGS[name])
+
+    @property
+    def is_student(self):
+        return self.has_role('student')
+
+    @property
+    def is_teacher(self):
+        return self.has_role('teacher')
+
+    @property
+    def is_admin(self):
+        return self.user.is_authenticated and (self.user.is_superuser or self.has_role('admin'))
+
+
+def get_user_context(request):
+    """取得請求的 UserContext（未經 middleware 的請求也可使用）"""
+    context = getattr(request, 'user_context', None)
+    if context is None or context.user is not request.user:
+        context = UserContext(request.user)
+        try:
+            request.user_context = context
+        except AttributeError:
+            pass
+    return context
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+教室使用率統計
+將某學期的上課時段讀成平行陣列，一次累加成 教室 × 星期 × 節次 的矩陣：
+- occupancy：各時段週數比例（週次遮罩 / 整學期）的總和
+- used：該格實際有課的週數比例（各時段週次遮罩取聯集）；occupancy 大於 used 表示有週次重複借用
+- enrolled / capacity：該格上課的修課人數與人數上限
+有安裝 NumPy 時以 np.add.at / np.bitwise_or.at 向量化累加，否則以單次迴圈累加
+結果依學期快取，開課資料（含人數、時段）變動後版本改變即重新計算
+"""
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 為選用套件
+    np = None
+
+from .metrics import record_cache
+from .models import ClassTime, CourseOffering
+from .occupancy import normalize_classroom
+from .timeslots import MAX_WEEKS
+
+WEEKDAYS = 7
+PERIODS = 14
+
+# 使用率的分母：星期一至五、第 1-14 節
+REPORT_WEEKDAYS = 5
+
+# 週數比例為浮點數加總，差異超過此值才視為週次重疊
+OVERLAP_EPSILON = 1e-9
+
+UTILIZATION_CACHE_TIMEOUT = 60 * 60
+
+
+def load_arrays(academic_year, semester):
+    """讀取該學期（非停開）的上課時段，回傳 (教室列表, 平行陣列 dict)"""
+    rows = ClassTime.objects.filter(
+        offering__academic_year=academic_year,
+        offering__semester=semester,
+    ).exclude(offering__status='closed').exclude(classroom='').order_by().values_list(
+        'classroom', 'weekday', 'start_period', 'end_period', 'week_mask',
+        'offering__current_students', 'offering__max_students',
+    )
+
+    rooms, room_index = [], {}
+    arrays = {
+        'room': [], 'day': [], 'start': [], 'end': [], 'weeks': [], 'mask': [], 'enrolled': [], 'capacity': [],
+    }
+    for classroom, weekday, start, end, week_mask, enrolled, capacity in rows:
+        start, end = max(int(start), 1), min(int(end), PERIODS)
+        if start > end:
+            continue
+        key = normalize_classroom(classroom)
+        if key not in room_index:
+            room_index[key] = len(rooms)
+            rooms.append(classroom.strip())
+        arrays['room'].append(room_index[key])
+        arrays['day'].append(int(weekday) - 1)
+        arrays['start'].append(start - 1)
+        arrays['end'].append(end - 1)
+        arrays['weeks'].append(week_mask.bit_count() / MAX_WEEKS)
+        arrays['mask'].append(week_mask)
+        arrays['enrolled'].append(enrolled or 0)
+        arrays['capacity'].append(capacity or 0)
+    return rooms, arrays
+
+
+def build_matrices(room_count, arrays):
+    """回傳 {'occupancy', 'used', 'enrolled', 'capacity'}，每個為 [教室][星期][節次] 巢狀列表"""
+    if np is not None:
+        return _build_numpy(room_count, arrays)
+    return _build_python(room_count, arrays)
+
+
+def _build_numpy(room_count, arrays):
+    shape = (room_count, WEEKDAYS, PERIODS)
+    result = {name: np.zeros(shape) for name in ('occupancy', 'enrolled', 'capacity')}
+    union = np.zeros(shape, dtype=np.int64)
+    if not arrays['room']:
+        return {**{name: matrix.tolist() for name, matrix in result.items()}, 'used': _used(union.tolist())}
+
+    start = np.asarray(arrays['start'], dtype=np.int64)
+    lengths = np.asarray(arrays['end'], dtype=np.int64) - start + 1
+
+    def repeat(name, dtype):
+        return np.repeat(np.asarray(arrays[name], dtype=dtype), lengths)
+
+    # 每個時段展開成 lengths 個格子：節次 = start + 0..length-1
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    cells = (repeat('room', np.int64), repeat('day', np.int64), np.repeat(start, lengths) + offsets)
+
+    np.add.at(result['occupancy'], cells, repeat('weeks', np.float64))
+    np.add.at(result['enrolled'], cells, repeat('enrolled', np.float64))
+    np.add.at(result['capacity'], cells, repeat('capacity', np.float64))
+    np.bitwise_or.at(union, cells, repeat('mask', np.int64))
+    return {**{name: matrix.tolist() for name, matrix in result.items()}, 'used': _used(union.tolist())}
+
+
+def _used(union):
+    """週次遮罩聯集 -> 實際有課的週數比例"""
+    return [[[mask.bit_count() / MAX_WEEKS for mask in day] for day in room] for room in union]
+
+
+def _build_python(room_count, arrays):
+    result = {
+        name: [[[0.0] * PERIODS for _ in range(WEEKDAYS)] for _ in range(room_count)]
+        for name in ('occupancy', 'enrolled', 'capacity')
+    }
+    union = [[[0] * PERIODS for _ in range(WEEKDAYS)] for _ in range(room_count)]
+    for room, day, start, end, weeks, mask, enrolled, capacity in zip(
+        arrays['room'], arrays['day'], arrays['start'], arrays['end'],
+        arrays['weeks'], arrays['mask'], arrays['enrolled'], arrays['capacity'],
+    ):
+        for period in range(start, end + 1):
+            result['occupancy'][room][day][period] += weeks
+            union[room][day][period] |= mask
+            result['enrolled'][room][day][period] += enrolled
+            result['capacity'][room][day][period] += capacity
+    result['used'] = _used(union)
+    return result
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else 0
+
+
+def summarize(rooms, matrices):
+    """
+    各教室的使用率（平日時段實際有課的週數比例）與座位填滿率（修課人數 / 人數上限）
+    double_booked_cells：同一格有週次重疊的時段（各時段週數總和大於聯集週數），例如兩門 1-9 週的課
+    """
+    available = REPORT_WEEKDAYS * PERIODS
+    summary = []
+    for i, classroom in enumerate(rooms):
+        occupancy, used = matrices['occupancy'][i], matrices['used'][i]
+        weekday_usage = sum(value for day in used[:REPORT_WEEKDAYS] for value in day)
+        enrolled = sum(value for day in matrices['enrolled'][i] for value in day)
+        capacity = sum(value for day in matrices['capacity'][i] for value in day)
+        summary.append({
+            'classroom': classroom,
+            'utilization': _ratio(weekday_usage, available),
+            'occupied_cells': sum(1 for day in occupancy for value in day if value > 0),
+            'double_booked_cells': sum(
+                1 for total_day, used_day in zip(occupancy, used)
+                for total, value in zip(total_day, used_day) if total - value > OVERLAP_EPSILON
+            ),
+            'fill_ratio': _ratio(enrolled, capacity),
+        })
+    summary.sort(key=lambda item: item['utilization'], reverse=True)
+    return summary
+
+
+def _term_version(academic_year, semester):
+    """學期資料版本：選課 / 退選會更新開課人數與 updated_at，時段變動也會更新開課的 updated_at"""
+    stats = CourseOffering.objects.filter(academic_year=academic_year, semester=semester).aggregate(
+        count=Count('id'), updated=Max('updated_at'), times=Count('class_times'),
+    )
+    updated = stats['updated'].timestamp() if stats['updated'] else 0
+    return f"{stats['count']}:{stats['times']}:{updated}"
+
+
+def room_utilization(academic_year, semester):
+    """取得（或計算並快取）某學期的教室使用率 {'rooms': [...], 'matrices': {...}, 'summary': [...]}"""
+    cache_key = f'room_utilization:{academic_year}:{semester}:{_term_version(academic_year, semester)}'
+    data = cache.get(cache_key)
+    record_cache('room_utilization', data is not None)
+    if data is None:
+        rooms, arrays = load_arrays(academic_year, semester)
+        matrices = build_matrices(len(rooms), arrays)
+        data = {'rooms': rooms, 'matrices': matrices, 'summary': summarize(rooms, matrices)}
+        cache.set(cache_key, data, UTILIZATION_CACHE_TIMEOUT)
+    return data
+
+
+def room_position(data, classroom):
+    """依 normalize_classroom 比對教室名稱（忽略大小寫與空白），回傳在 data['rooms'] 中的位置或 None"""
+    key = normalize_classroom(classroom)
+    for i, name in enumerate(data['rooms']):
+        if normalize_classroom(name) == key:
+            return i
+    return None
+
+
+def cell_rows(data):
+    """逐格輸出（CSV / Excel 用）：教室、星期、節次、使用週數比例、修課人數、人數上限、填滿率"""
+    matrices = data['matrices']
+    for i, classroom in enumerate(data['rooms']):
+        for day in range(WEEKDAYS):
+            for period in range(PERIODS):
+                occupancy = matrices['occupancy'][i][day][period]
+                if not occupancy:
+                    continue
+                enrolled = matrices['enrolled'][i][day][period]
+                capacity = matrices['capacity'][i][day][period]
+                yield [
+                    classroom, day + 1, period + 1, round(occupancy, 4),
+                    int(enrolled), int(capacity), _ratio(enrolled, capacity),
+                ]
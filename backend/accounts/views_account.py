@@ -2,10 +2,17 @@
 帳號管理相關的 API views
 包括學生和教師的查看、修改、刪除功能
 """
+import logging
+
 from django.contrib.auth.models import User
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Profile, Role
+from .avatars import avatar_urls, release_avatar, schedule_thumbnails
+from .models import Profile
+from .permissions import is_admin
+from .user_context import get_role_id, get_user_context
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['GET'])
@@ -13,9 +20,8 @@ def get_all_students(request):
     """獲取所有學生帳號"""
     try:
         # 獲取所有學生角色的用戶
-        student_role = Role.objects.get(name='student')
         students = Profile.objects.filter(
-            roles=student_role
+            roles=get_role_id('student')
         ).select_related('user').order_by('student_id')
         
         students_data = []
@@ -32,9 +38,7 @@ def get_all_students(request):
         return Response(students_data)
         
     except Exception as e:
-        print(f"獲取學生列表錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('獲取學生列表錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -43,9 +47,8 @@ def get_all_teachers(request):
     """獲取所有教師帳號"""
     try:
         # 獲取所有教師角色的用戶
-        teacher_role = Role.objects.get(name='teacher')
         teachers = Profile.objects.filter(
-            roles=teacher_role
+            roles=get_role_id('teacher')
         ).select_related('user').order_by('real_name')
         
         teachers_data = []
@@ -62,9 +65,7 @@ def get_all_teachers(request):
         return Response(teachers_data)
         
     except Exception as e:
-        print(f"獲取教師列表錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('獲取教師列表錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -106,9 +107,7 @@ def update_student(request, user_id):
     except User.DoesNotExist:
         return Response({'error': '找不到該學生'}, status=404)
     except Exception as e:
-        print(f"修改學生資料錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('修改學生資料錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -135,26 +134,25 @@ def upload_avatar(request):
         if avatar_file.size > 5 * 1024 * 1024:
             return Response({'error': '圖片大小不能超過 5MB'}, status=400)
         
-        # 刪除舊頭像
-        if profile.avatar:
-            profile.avatar.delete(save=False)
+        # 刪除舊頭像與縮圖
+        release_avatar(profile)
         
-        # 保存新頭像
+        # 保存新頭像（檔名為內容雜湊，更換頭像即更換網址），縮圖於背景產生
         profile.avatar = avatar_file
         profile.save()
+        schedule_thumbnails(profile)
         
         # 返回新頭像的 URL
         avatar_url = request.build_absolute_uri(profile.avatar.url) if profile.avatar else None
         
         return Response({
             'message': '上傳成功',
-            'avatar_url': avatar_url
+            'avatar_url': avatar_url,
+            'avatar_urls': None,  # 縮圖產生中，之後由 user/avatar/ 取得
         })
         
     except Exception as e:
-        print(f"上傳大頭貼錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('上傳大頭貼錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -168,12 +166,13 @@ def delete_avatar(request):
         profile = request.user.profile
         
         if profile.avatar:
-            profile.avatar.delete(save=True)
+            release_avatar(profile)
+            profile.save()
         
         return Response({'message': '大頭貼已刪除'})
         
     except Exception as e:
-        print(f"刪除大頭貼錯誤: {str(e)}")
+        logger.error('刪除大頭貼錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -188,7 +187,8 @@ def get_avatar(request):
         avatar_url = request.build_absolute_uri(profile.avatar.url) if profile.avatar else None
         
         return Response({
-            'avatar_url': avatar_url
+            'avatar_url': avatar_url,
+            'avatar_urls': avatar_urls(request, profile),
         })
         
     except Exception as e:
@@ -219,9 +219,7 @@ def update_teacher(request, user_id):
     except User.DoesNotExist:
         return Response({'error': '找不到該教師'}, status=404)
     except Exception as e:
-        print(f"修改教師資料錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('修改教師資料錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -240,15 +238,13 @@ def delete_student(request, user_id):
         username = user.username
         user.delete()
         
-        print(f"成功刪除學生帳號: {username}")
+        logger.info('成功刪除學生帳號: %s', username)
         return Response({'message': '刪除成功'})
         
     except User.DoesNotExist:
         return Response({'error': '找不到該學生'}, status=404)
     except Exception as e:
-        print(f"刪除學生帳號錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('刪除學生帳號錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -267,15 +263,13 @@ def delete_teacher(request, user_id):
         username = user.username
         user.delete()
         
-        print(f"成功刪除教師帳號: {username}")
+        logger.info('成功刪除教師帳號: %s', username)
         return Response({'message': '刪除成功'})
         
     except User.DoesNotExist:
         return Response({'error': '找不到該教師'}, status=404)
     except Exception as e:
-        print(f"刪除教師帳號錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('刪除教師帳號錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -287,22 +281,26 @@ def get_profile_info(request):
     
     try:
         user = request.user
-        profile = user.profile
+        context = get_user_context(request)
+        profile = context.profile
+        if profile is None:
+            return Response({'error': '找不到個人資料'}, status=404)
         
         data = {
             'username': user.username,
             'real_name': profile.real_name or user.username,
             'avatar_url': request.build_absolute_uri(profile.avatar.url) if profile.avatar else None,
-            'roles': [r.name for r in profile.roles.all()],
+            'avatar_urls': avatar_urls(request, profile),
+            'roles': sorted(context.roles),
         }
         
         # 根據角色附加資料
-        if profile.roles.filter(name='student').exists():
+        if context.is_student:
             data['student_id'] = profile.student_id
             data['department'] = profile.department
             data['grade'] = profile.grade
         
-        if profile.roles.filter(name='teacher').exists():
+        if context.is_teacher:
             data['teacher_id'] = profile.teacher_id or user.username
             data['office'] = profile.office
             data['title'] = profile.title
@@ -310,9 +308,7 @@ def get_profile_info(request):
         return Response(data)
         
     except Exception as e:
-        print(f"獲取個人資料錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('獲取個人資料錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -321,14 +317,8 @@ def reset_password(request, user_id):
     """管理員重設用戶密碼"""
     try:
         # 1. 檢查權限 (只有管理員可以操作)
-        if not request.user.is_superuser:
-            # 檢查是否有 admin 角色
-            is_admin = False
-            if hasattr(request.user, 'profile'):
-                is_admin = request.user.profile.roles.filter(name='admin').exists()
-            
-            if not is_admin:
-                return Response({'error': '權限不足'}, status=403)
+        if not is_admin(request):
+            return Response({'error': '權限不足'}, status=403)
         
         # 2. 獲取目標用戶
         target_user = User.objects.get(id=user_id)
@@ -354,7 +344,7 @@ def reset_password(request, user_id):
             target_user.profile.force_password_change = True
             target_user.profile.save()
             
-        print(f"管理員 {request.user.username} 重設了 {target_user.username} 的密碼")
+        logger.info('管理員 %s 重設了 %s 的密碼', request.user.username, target_user.username)
             
         return Response({
             'message': f'密碼已重設為: {default_pwd}，且使用者下次登入時須強制修改密碼。',
@@ -364,7 +354,5 @@ def reset_password(request, user_id):
     except User.DoesNotExist:
         return Response({'error': '找不到該用戶'}, status=404)
     except Exception as e:
-        print(f"重設密碼錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('重設密碼錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
\ No newline at end of file
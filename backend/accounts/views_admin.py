@@ -4,22 +4,36 @@
 包含教師列表、課程建立、課程刪除等功能
 支援多位教師（主開課和協同）
 """
+import logging
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Profile, Role, Course, CourseOffering, OfferingTeacher, ClassTime, Department
+from .models import Profile, Role, Course, CourseOffering, OfferingTeacher, ClassTime, Department, Enrollment, normalize_name
+from .credits import enrolled_student_ids, rebuild_credit_summaries, touch_credit_summaries
+from .occupancy import OccupancyConflict, check_room_free, check_teachers_free, teacher_conflict_report
+from .permissions import is_admin
+from .slow_queries import read_records
+from .timeslots import parse_weeks
+from .utilization import room_position, room_utilization
+from .user_context import get_role_id
+from .teacher_resolver import TeacherResolver
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['GET'])
 def get_teachers(request):
     """獲取所有教師列表"""
     try:
-        # 找到教師角色
-        teacher_role = Role.objects.get(name='teacher')
-        
-        # 找到所有擁有教師角色的 Profile
-        teacher_profiles = Profile.objects.filter(roles=teacher_role).select_related('user')
+        # 找到所有擁有教師角色的 Profile（角色 ID 由快取取得）
+        teacher_profiles = Profile.objects.filter(roles=get_role_id('teacher')).select_related('user')
         
         teachers = []
         for profile in teacher_profiles:
@@ -31,48 +45,20 @@ def get_teachers(request):
                 'office': profile.office or '未設定'
             })
         
-        print(f"找到 {len(teachers)} 位教師")
+        logger.debug('找到 %s 位教師', len(teachers))
         return Response(teachers)
         
     except Role.DoesNotExist:
         return Response({'error': '找不到教師角色'}, status=404)
     except Exception as e:
-        print(f"錯誤: {str(e)}")
+        logger.error('錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
-def get_or_create_teacher(teacher_name):
+def get_or_create_teacher(teacher_name, resolver=None):
     """根據姓名取得或創建教師帳號"""
-    # 檢查是否已存在同名教師
-    existing_profile = Profile.objects.filter(real_name=teacher_name).first()
-    if existing_profile:
-        print(f"使用已存在的教師: {teacher_name}")
-        return existing_profile.user
-    
-    # 創建新教師帳號
-    import random
-    import string
-    username = f"teacher_{teacher_name}_{random.randint(1000, 9999)}"
-    password = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
-    
-    # 創建 User
-    teacher = User.objects.create_user(
-        username=username,
-        password=password,
-        first_name=teacher_name
-    )
-    
-    # 創建 Profile
-    teacher_role = Role.objects.get_or_create(name='teacher', defaults={'name': 'teacher'})[0]
-    profile = Profile.objects.create(
-        user=teacher,
-        real_name=teacher_name,
-        title='教師'
-    )
-    profile.roles.add(teacher_role)
-    
-    print(f"自動創建新教師: {teacher_name} (username: {username}, password: {password})")
-    return teacher
+    resolver = resolver or TeacherResolver()
+    return resolver.resolve(teacher_name)
 
 
 @csrf_exempt
@@ -101,12 +87,13 @@ def create_course(request):
         weekday = request.data.get('weekday')
         start_period = request.data.get('start_period')
         end_period = request.data.get('end_period')
+        weeks = request.data.get('weeks') or None  # 上課週次，例如 "1-9"（空白為整學期）
         max_students = request.data.get('max_students', 50)
         
-        print(f"創建課程: {course_name}")
-        print(f"主開課教師 ID: {main_teacher_id}")
-        print(f"主開課教師姓名: {main_teacher_name}")
-        print(f"協同教師 IDs: {co_teacher_ids}")
+        logger.debug('創建課程: %s', course_name)
+        logger.debug('主開課教師 ID: %s', main_teacher_id)
+        logger.debug('主開課教師姓名: %s', main_teacher_name)
+        logger.debug('協同教師 IDs: %s', co_teacher_ids)
         
         # 驗證必填欄位
         if not all([course_code, course_name, course_type, credits,
@@ -118,18 +105,26 @@ def create_course(request):
         if not main_teacher_id and not main_teacher_name:
             return Response({'error': '請選擇教師或輸入新教師姓名'}, status=400)
         
+        # 以姓名指定的教師一次批次解析（同名只查一次，缺少的一次建立）
+        teacher_names = list(co_teacher_names or [])
+        if not main_teacher_id and main_teacher_name:
+            teacher_names.insert(0, main_teacher_name)
+        teachers_by_name = TeacherResolver().resolve_many(teacher_names)
+        
         # 處理主開課教師
         main_teacher = None
         if main_teacher_id:
             # 使用現有教師
             try:
                 main_teacher = User.objects.get(id=main_teacher_id)
-                print(f"找到主開課教師: {main_teacher.profile.real_name if hasattr(main_teacher, 'profile') else main_teacher.username}")
+                logger.debug('找到主開課教師: %s', main_teacher.profile.real_name if hasattr(main_teacher, 'profile') else main_teacher.username)
             except User.DoesNotExist:
                 return Response({'error': '找不到主開課教師'}, status=404)
         elif main_teacher_name:
             # 創建或使用現有教師
-            main_teacher = get_or_create_teacher(main_teacher_name)
+            main_teacher = teachers_by_name.get(normalize_name(main_teacher_name))
+            if main_teacher is None:
+                return Response({'error': '請選擇教師或輸入新教師姓名'}, status=400)
         
         # 處理協同教師
         co_teachers = []
@@ -140,16 +135,18 @@ def create_course(request):
                 try:
                     teacher = User.objects.get(id=int(teacher_id))
                     co_teachers.append(teacher)
-                    print(f"找到協同教師: {teacher.profile.real_name if hasattr(teacher, 'profile') else teacher.username}")
+                    logger.debug('找到協同教師: %s', teacher.profile.real_name if hasattr(teacher, 'profile') else teacher.username)
                 except User.DoesNotExist:
                     return Response({'error': f'找不到協同教師 ID: {teacher_id}'}, status=404)
         
         # 處理協同教師姓名（需要創建的教師）
         if co_teacher_names:
             for teacher_name in co_teacher_names:
-                teacher = get_or_create_teacher(teacher_name)
+                teacher = teachers_by_name.get(normalize_name(teacher_name))
+                if teacher is None:
+                    continue
                 co_teachers.append(teacher)
-                print(f"協同教師: {teacher_name}")
+                logger.debug('協同教師: %s', teacher_name)
         
         # 取得或建立系所
         department, _ = Department.objects.get_or_create(name=department_name)
@@ -167,14 +164,20 @@ def create_course(request):
         
         if not created:
             # 課程已存在，更新資料（保持最新）
+            credits_changed = str(course.credits) != str(credits) or course.course_type != course_type
             course.course_name = course_name
             course.course_type = course_type
             course.description = description
             course.credits = credits
             course.save()
-            print(f"使用現有課程並更新: {course.course_name}")
+            if credits_changed:
+                # 學分或類別變動影響所有修過這門課的學生
+                rebuild_credit_summaries(enrolled_student_ids(course.offerings.all()))
+            else:
+                touch_credit_summaries(enrolled_student_ids(course.offerings.all()))
+            logger.debug('使用現有課程並更新: %s', course.course_name)
         else:
-            print(f"建立新課程: {course.course_name}")
+            logger.debug('建立新課程: %s', course.course_name)
         
         # 檢查是否有完全相同的開課（同一課程、同學期、同系所、同時間）
         # 注意：不同時間的課可以存在！
@@ -201,7 +204,23 @@ def create_course(request):
                     'error': f'課程「{course_name}」在 {academic_year} 學年度第 {semester} 學期，星期{weekday} 第{start_period}-{end_period}節已存在'
                 }, status=400)
             # 時間不同，允許創建新的開課
-            print(f"同一課程但不同時間，允許創建新開課")
+            logger.debug('同一課程但不同時間，允許創建新開課')
+        
+        # 檢查教室與教師在該時段是否已被其他開課使用
+        try:
+            week_mask = parse_weeks(weeks)
+            check_room_free(
+                academic_year, semester, classroom, weekday, start_period, end_period, weeks=week_mask
+            )
+            check_teachers_free(
+                academic_year, semester,
+                [main_teacher.id] + [t.id for t in co_teachers],
+                [(weekday, start_period, end_period, week_mask)],
+            )
+        except OccupancyConflict as e:
+            return Response({'error': str(e)}, status=400)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         
         # 建立開課資料
         offering = CourseOffering.objects.create(
@@ -214,7 +233,7 @@ def create_course(request):
             current_students=0,
             status='open'
         )
-        print(f"建立開課記錄 ID: {offering.id}")
+        logger.debug('建立開課記錄 ID: %s', offering.id)
         
         # 建立主開課教師關係
         OfferingTeacher.objects.create(
@@ -222,7 +241,7 @@ def create_course(request):
             teacher=main_teacher,
             role='main'
         )
-        print(f"設定主開課教師: {main_teacher.profile.real_name if hasattr(main_teacher, 'profile') else main_teacher.username}")
+        logger.debug('設定主開課教師: %s', main_teacher.profile.real_name if hasattr(main_teacher, 'profile') else main_teacher.username)
         
         # 建立協同教師關係
         for co_teacher in co_teachers:
@@ -232,7 +251,7 @@ def create_course(request):
                 role='co'
             )
             teacher_name = co_teacher.profile.real_name if hasattr(co_teacher, 'profile') else co_teacher.username
-            print(f"設定協同教師: {teacher_name}")
+            logger.debug('設定協同教師: %s', teacher_name)
         
         # 建立上課時段
         ClassTime.objects.create(
@@ -240,11 +259,12 @@ def create_course(request):
             weekday=weekday,
             start_period=start_period,
             end_period=end_period,
-            classroom=classroom
+            classroom=classroom,
+            weeks=weeks
         )
-        print(f"設定上課時間: 星期{weekday} 第{start_period}-{end_period}節 @ {classroom}")
+        logger.debug('設定上課時間: 星期%s 第%s-%s節 @ %s', weekday, start_period, end_period, classroom)
         
-        print(f"課程建立成功: {course.course_code} - {course.course_name}")
+        logger.info('課程建立成功: %s - %s', course.course_code, course.course_name)
         return Response({
             'message': '課程建立成功',
             'course_id': course.id,
@@ -254,9 +274,7 @@ def create_course(request):
         })
         
     except Exception as e:
-        print(f"建立課程錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('建立課程錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
     
 @api_view(['GET'])
@@ -317,7 +335,7 @@ def get_all_courses(request):
         grade_level = request.GET.get('grade_level', '')
         keyword = request.GET.get('keyword', '').strip()
         
-        print(f"管理員查詢課程 - 學年:{academic_year}, 學期:{semester}, 系所:{department}, 年級:{grade_level}, 關鍵字:{keyword}")
+        logger.debug('管理員查詢課程 - 學年:%s, 學期:%s, 系所:%s, 年級:%s, 關鍵字:%s', academic_year, semester, department, grade_level, keyword)
         
         # 基本查詢
         offerings = CourseOffering.objects.all().select_related(
@@ -352,8 +370,6 @@ def get_all_courses(request):
         # 排序
         offerings = offerings.order_by('-created_at')
         
-        print(f"找到 {offerings.count()} 門開課")
-        
         courses_data = []
         for offering in offerings:
             # 取得第一個上課時段
@@ -407,36 +423,11 @@ def get_all_courses(request):
                 'status': offering.status,
             })
         
-        print(f"返回 {len(courses_data)} 門開課資料")
-        return Response(courses_data)
-        
-    except Exception as e:
-        print(f"錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()({
-                'department': offering.department.name,
-                'grade_level': offering.grade_level,
-                'teacher_id': main_teacher.teacher.id if main_teacher else None,
-                'teacher_name': main_teacher.teacher.profile.real_name if main_teacher and hasattr(main_teacher.teacher, 'profile') else '未設定',
-                'teacher_display': teacher_display,  # 完整的教師顯示文字
-                'co_teachers': co_teacher_ids,  # 協同教師 ID 列表
-                'co_teacher_names': co_teacher_names,  # 協同教師名稱列表
-                'classroom': first_time.classroom if first_time else '',
-                'weekday': first_time.weekday if first_time else '',
-                'start_period': first_time.start_period if first_time else 0,
-                'end_period': first_time.end_period if first_time else 0,
-                'max_students': offering.max_students,
-                'current_students': offering.current_students,
-                'status': offering.status,
-            })
-        
-        print(f"找到 {len(courses_data)} 門開課")
+        logger.debug('返回 %s 門開課資料', len(courses_data))
         return Response(courses_data)
         
     except Exception as e:
-        print(f"錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -447,13 +438,208 @@ def delete_course(request, course_id):
     try:
         offering = CourseOffering.objects.get(id=course_id)
         course_name = offering.course.course_name
-        offering.delete()
+        student_ids = enrolled_student_ids([offering.id])
+        with transaction.atomic():
+            offering.delete()
+            rebuild_credit_summaries(student_ids)
         
-        print(f"開課刪除成功: {course_name}")
+        logger.info('開課刪除成功: %s', course_name)
         return Response({'message': '課程刪除成功'})
         
     except CourseOffering.DoesNotExist:
         return Response({'error': '找不到該開課資料'}, status=404)
     except Exception as e:
-        print(f"刪除課程錯誤: {str(e)}")
-        return Response({'error': str(e)}, status=500)
\ No newline at end of file
+        logger.error('刪除課程錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+BULK_FILTER_FIELDS = {
+    'academic_year': 'academic_year',
+    'semester': 'semester',
+    'department': 'department__name',
+    'grade_level': 'grade_level',
+    'course_type': 'course__course_type',
+    'status': 'status',
+}
+
+
+def _status_for_capacity(max_students):
+    """依人數上限計算額滿狀態的 SQL 表達式（停開的課維持停開）"""
+    return Case(
+        When(status='closed', then=Value('closed')),
+        When(current_students__gte=max_students, then=Value('full')),
+        default=Value('open'),
+    )
+
+
+@csrf_exempt
+@api_view(['POST'])
+def bulk_update_offerings(request):
+    """
+    批次操作開課資料
+    以 ids（開課 ID 列表）或 filter（學年度、學期、系所等條件）選取開課，operation 可為：
+    set_max_students / add_max_students（需 value）、close、reopen、delete
+    每次操作只執行一個 UPDATE ... WHERE 或一次批次刪除
+    """
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+    
+    try:
+        operation = request.data.get('operation')
+        ids = request.data.get('ids')
+        filters = request.data.get('filter') or {}
+        
+        # 選取開課：必須指定 ids 或至少一個篩選條件，避免誤改全部資料
+        offerings = CourseOffering.objects.all()
+        if ids:
+            offerings = offerings.filter(id__in=[int(i) for i in ids])
+        else:
+            lookups = {
+                BULK_FILTER_FIELDS[key]: value
+                for key, value in filters.items()
+                if key in BULK_FILTER_FIELDS and value not in (None, '')
+            }
+            if not lookups:
+                return Response({'error': '請指定開課 ID 或篩選條件'}, status=400)
+            offerings = offerings.filter(**lookups)
+        
+        now = timezone.now()
+        
+        with transaction.atomic():
+            if operation in ('set_max_students', 'add_max_students'):
+                try:
+                    value = int(request.data.get('value'))
+                except (TypeError, ValueError):
+                    return Response({'error': '請輸入有效的人數'}, status=400)
+                
+                if operation == 'set_max_students':
+                    if value < 0:
+                        return Response({'error': '人數上限不可為負數'}, status=400)
+                    new_max = Value(value)
+                else:
+                    new_max = Greatest(F('max_students') + value, Value(0))
+                
+                affected = offerings.update(
+                    max_students=new_max,
+                    status=_status_for_capacity(new_max),
+                    updated_at=now,
+                )
+            
+            elif operation == 'close':
+                affected = offerings.exclude(status='closed').update(status='closed', updated_at=now)
+            
+            elif operation == 'reopen':
+                affected = offerings.filter(status='closed').update(
+                    status=Case(
+                        When(current_students__gte=F('max_students'), then=Value('full')),
+                        default=Value('open'),
+                    ),
+                    updated_at=now,
+                )
+            
+            elif operation == 'delete':
+                # 一次查詢找出仍有學生選課的開課
+                blocked_ids = list(
+                    Enrollment.objects.filter(
+                        offering__in=offerings, status='enrolled'
+                    ).values_list('offering_id', flat=True).distinct()
+                )
+                if blocked_ids and not request.data.get('force'):
+                    return Response({
+                        'error': f'有 {len(blocked_ids)} 門開課仍有學生選課，無法刪除',
+                        'blocked_ids': blocked_ids,
+                    }, status=400)
+                
+                student_ids = enrolled_student_ids(offerings)
+                _, deleted = offerings.delete()
+                rebuild_credit_summaries(student_ids)
+                affected = deleted.get(CourseOffering._meta.label, 0)
+            
+            else:
+                return Response({'error': f'不支援的操作: {operation}'}, status=400)
+        
+        logger.info('批次操作 %s: 影響 %s 門開課', operation, affected)
+        return Response({'message': '批次操作完成', 'operation': operation, 'affected': affected})
+        
+    except Exception as e:
+        logger.exception('批次操作錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+def get_teacher_conflicts(request):
+    """列出某學期所有教師衝堂（同一位教師同時段有兩門以上的課）"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    try:
+        academic_year = request.GET.get('academic_year')
+        semester = request.GET.get('semester')
+        if not academic_year or not semester:
+            return Response({'error': '請指定學年度與學期'}, status=400)
+
+        conflicts = teacher_conflict_report(academic_year, semester)
+        return Response({'count': len(conflicts), 'conflicts': conflicts})
+
+    except Exception as e:
+        logger.exception('教師衝堂檢查錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+def get_room_utilization(request):
+    """
+    某學期的教室使用率（依使用率排序）
+    classroom 有指定時另回傳該教室 星期 × 節次 的使用矩陣
+    """
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    try:
+        academic_year = request.GET.get('academic_year')
+        semester = request.GET.get('semester')
+        if not academic_year or not semester:
+            return Response({'error': '請指定學年度與學期'}, status=400)
+
+        data = room_utilization(academic_year, semester)
+        result = {'count': len(data['rooms']), 'rooms': data['summary']}
+
+        classroom = request.GET.get('classroom')
+        if classroom:
+            i = room_position(data, classroom)
+            if i is None:
+                return Response({'error': '找不到該教室'}, status=404)
+            result['grid'] = {name: matrix[i] for name, matrix in data['matrices'].items()}
+
+        return Response(result)
+
+    except Exception as e:
+        logger.exception('教室使用率統計錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+def get_slow_queries(request):
+    """
+    慢查詢紀錄（由新到舊），可依 view 篩選
+    需先以 SLOW_QUERY_LOG_ENABLED 啟用紀錄
+    """
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    try:
+        try:
+            limit = min(int(request.GET.get('limit', 100)), 1000)
+        except ValueError:
+            return Response({'error': 'limit 必須為整數'}, status=400)
+
+        records = read_records(limit, request.GET.get('view') or None)
+        return Response({
+            'enabled': settings.SLOW_QUERY_LOG_ENABLED,
+            'threshold_ms': settings.SLOW_QUERY_MS,
+            'count': len(records),
+            'records': records,
+        })
+
+    except Exception as e:
+        logger.exception('讀取慢查詢紀錄錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
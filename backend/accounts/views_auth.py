@@ -2,14 +2,20 @@
 認證相關的 API views
 包含註冊、登入、登出功能
 """
+import logging
 import os
+import time
 from django.contrib.auth import authenticate, login as django_login, logout as django_logout
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
 from django.middleware.csrf import get_token
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Profile, Role
+from .models import Profile
+from .login_gate import LoginBusy, password_check_slot
+from .user_context import get_or_create_role_id, get_user_context
+
+logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
@@ -66,15 +72,12 @@ def register(request):
         )
         
         # 確保角色存在
-        role, _ = Role.objects.get_or_create(name=role_name)
-        profile.roles.add(role)
+        profile.roles.add(get_or_create_role_id(role_name))
         profile.save()
 
         return Response({'message': '註冊成功'})
     except Exception as e:
-        print(f"註冊錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('註冊錯誤: %s', e)
         return Response({'error': f"系統錯誤: {str(e)}"}, status=500)
 
 
@@ -84,16 +87,23 @@ def login_view(request):
     """使用者登入"""
     username = request.data.get('username')
     password = request.data.get('password')
+    timings = {}
+    start = time.perf_counter()
 
-    print(f"\n{'='*60}")
-    print(f"🔐 登入請求 - 用戶名: {username}")
-    
     # 清除舊 session
     if request.user.is_authenticated:
         django_logout(request)
 
-    # 驗證帳號密碼
-    user = authenticate(username=username, password=password)
+    # 驗證帳號密碼（PBKDF2 受併發閘門限制）
+    try:
+        with password_check_slot(timings):
+            user = authenticate(username=username, password=password)
+    except LoginBusy:
+        logger.warning('🔐 登入繁忙 - 用戶名: %s', username)
+        response = Response({'error': '登入人數過多，請稍後再試'}, status=503)
+        response['Retry-After'] = '2'
+        return response
+
     if user is None:
         return Response({'error': '帳號或密碼錯誤'}, status=401)
 
@@ -101,16 +111,19 @@ def login_view(request):
     django_login(request, user)
 
     try:
-        profile, created = Profile.objects.get_or_create(user=user)
-        
+        # Profile 與角色以一次查詢載入
+        context = get_user_context(request)
+        profile = context.profile
+        roles = set(context.roles)
+        if profile is None:
+            profile, _ = Profile.objects.get_or_create(user=user)
+
         # 確保超級管理員有 admin 角色
-        if user.is_superuser:
-            admin_role, _ = Role.objects.get_or_create(name='admin')
-            if not profile.roles.filter(name='admin').exists():
-                profile.roles.add(admin_role)
+        if user.is_superuser and 'admin' not in roles:
+            profile.roles.add(get_or_create_role_id('admin'))
+            roles.add('admin')
 
-        # 獲取所有角色清單
-        roles = [r.name for r in profile.roles.all()]
+        roles = sorted(roles)
         
         # 生成 CSRF token
         csrf_token = get_token(request)
@@ -131,11 +144,22 @@ def login_view(request):
         # ✅ 只有在身份唯一時，才提供單一導向用的 role 欄位
         if len(roles) == 1:
             response_data['role'] = roles[0]
-        
-        return Response(response_data)
+
+        total = (time.perf_counter() - start) * 1000
+        logger.debug(
+            '🔐 登入成功 - 用戶名: %s 等待 %.1fms / 驗證 %.1fms / 總計 %.1fms',
+            username, timings['wait'], timings['hash'], total,
+        )
+        response = Response(response_data)
+        response['Server-Timing'] = (
+            f"login-wait;dur={timings['wait']:.1f}, "
+            f"login-hash;dur={timings['hash']:.1f}, "
+            f"login;dur={total:.1f}"
+        )
+        return response
         
     except Exception as e:
-        print(f"❌ 登入錯誤: {str(e)}")
+        logger.error('❌ 登入錯誤: %s', e)
         return Response({'error': f"系統錯誤: {str(e)}"}, status=500)
 
 
@@ -165,7 +189,12 @@ def change_password(request):
     if not old_password or not new_password:
         return Response({'error': '請輸入舊密碼和新密碼'}, status=400)
         
-    if not request.user.check_password(old_password):
+    try:
+        with password_check_slot():
+            password_ok = request.user.check_password(old_password)
+    except LoginBusy:
+        return Response({'error': '系統忙碌中，請稍後再試'}, status=503)
+    if not password_ok:
         return Response({'error': '舊密碼錯誤'}, status=400)
         
     request.user.set_password(new_password)
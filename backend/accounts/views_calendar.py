@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+課表行事曆訂閱
+訂閱網址以個人金鑰識別使用者（行事曆程式無法帶登入 Cookie），
+回應附 ETag，課表未變動時回應 304
+"""
+import logging
+
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from .calendar_feed import get_ics, get_or_create_token, schedule_version
+from .models import Profile
+from .user_context import get_user_context
+
+logger = logging.getLogger(__name__)
+
+FEED_CACHE_CONTROL = 'private, max-age=900'
+
+
+def _feed_profile(request, token):
+    """依訂閱金鑰取得 Profile（同一請求只查詢一次）"""
+    if not hasattr(request, '_calendar_profile'):
+        request._calendar_profile = Profile.objects.select_related('user').filter(
+            calendar_token=token, user__is_active=True
+        ).first()
+    return request._calendar_profile
+
+
+def _feed_etag(request, token):
+    profile = _feed_profile(request, token)
+    if profile is None:
+        return None
+    request._calendar_version = schedule_version(profile.user)
+    return request._calendar_version
+
+
+@require_GET
+@condition(etag_func=_feed_etag)
+def calendar_feed(request, token):
+    """ICS 訂閱內容"""
+    profile = _feed_profile(request, token)
+    if profile is None:
+        raise Http404()
+
+    content = get_ics(profile.user, request._calendar_version, profile.real_name)
+    response = HttpResponse(content, content_type='text/calendar; charset=utf-8')
+    response['Cache-Control'] = FEED_CACHE_CONTROL
+    response['Content-Disposition'] = 'inline; filename="timetable.ics"'
+    return response
+
+
+@api_view(['GET', 'POST'])
+def calendar_subscription(request):
+    """取得行事曆訂閱網址；POST 重新產生金鑰（舊網址失效）"""
+    try:
+        if not request.user.is_authenticated:
+            return Response({'error': '請先登入'}, status=401)
+        profile = get_user_context(request).profile
+        if profile is None:
+            return Response({'error': '找不到個人資料'}, status=404)
+
+        token = get_or_create_token(profile, rotate=request.method == 'POST')
+        url = request.build_absolute_uri(reverse('calendar_feed', args=[token]))
+        return Response({
+            'url': url,
+            'webcal_url': 'webcal://' + url.split('://', 1)[1],
+        })
+
+    except Exception as e:
+        logger.exception('行事曆訂閱錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
@@ -3,14 +3,27 @@
 課程相關的 API views
 包含課程搜尋、選課、退選、收藏等功能
 """
+import logging
+
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Q
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import CourseOffering, Enrollment, FavoriteCourse, Profile
-import openpyxl
-from io import BytesIO
+from .jobs import enqueue_job
+from .course_update import apply_course_update
+from .credits import record_enrollment_change
+from .grades import roster_queryset, save_grades, validate_grades
+from .metrics import record_enrollment
+from .occupancy import OccupancyConflict
+from .permissions import can_manage_offering, is_admin
+from .planner import build_plans
+from .storage import private_upload_storage
+from .teaching import get_teaching_dashboard
+import uuid
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['GET', 'POST'])
@@ -41,7 +54,7 @@ def search_courses(request):
             weekdays = request.data.get('weekdays', [])  # ← 改這裡
             periods = request.data.get('periods', [])    # ← 加這行
         
-        print(f"搜尋條件: keyword={keyword}, department={department}, course_type={course_type}, semester={semester}, weekdays={weekdays}, periods={periods}, grade_level={grade_level}, academic_year={academic_year}")
+        logger.debug('搜尋條件: keyword=%s, department=%s, course_type=%s, semester=%s, weekdays=%s, periods=%s, grade_level=%s, academic_year=%s', keyword, department, course_type, semester, weekdays, periods, grade_level, academic_year)
         
         # 基本查詢：取得所有開課資料
         offerings = CourseOffering.objects.select_related(
@@ -73,7 +86,6 @@ def search_courses(request):
         # 節次篩選（支援多選）- 新增這段
         if periods:
             # 建立 Q 查詢來檢查時段是否有交集
-            from django.db.models import Q
             period_query = Q()
             for period in periods:
                 period_int = int(period)
@@ -149,13 +161,11 @@ def search_courses(request):
                 'is_favorited': is_favorited,
             })
         
-        print(f"找到 {len(courses_data)} 門課程")
+        logger.debug('找到 %s 門課程', len(courses_data))
         return Response(courses_data)
         
     except Exception as e:
-        print(f"搜尋課程錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('搜尋課程錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -174,14 +184,17 @@ def enroll_course(request, course_id):
         try:
             offering = CourseOffering.objects.get(id=offering_id)
         except CourseOffering.DoesNotExist:
+            record_enrollment('not_found')
             return Response({'error': '找不到該課程'}, status=404)
         
         # 檢查是否已選課
         if Enrollment.objects.filter(student=request.user, offering=offering, status='enrolled').exists():
+            record_enrollment('duplicate')
             return Response({'error': '已經選過這門課'}, status=400)
         
         # 檢查是否額滿
         if offering.is_full():
+            record_enrollment('full')
             return Response({'error': '課程已額滿'}, status=400)
         
         # 建立選課記錄
@@ -195,6 +208,7 @@ def enroll_course(request, course_id):
         has_conflict, conflict_msg = enrollment.check_time_conflict()
         if has_conflict:
             enrollment.delete()
+            record_enrollment('conflict')
             return Response({'error': conflict_msg}, status=400)
         
         # 更新目前人數
@@ -203,13 +217,15 @@ def enroll_course(request, course_id):
             offering.status = 'full'
         offering.save()
         
-        print(f"{request.user.username} 選課成功: {offering.course.course_name}")
+        record_enrollment_change(enrollment, None, 'enrolled')
+        
+        record_enrollment('success')
+        logger.debug('%s 選課成功: %s', request.user.username, offering.course.course_name)
         return Response({'message': '選課成功'})
         
     except Exception as e:
-        print(f"選課錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        record_enrollment('error')
+        logger.exception('選課錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -246,13 +262,13 @@ def drop_course(request, course_id):
             offering.status = 'open'
         offering.save()
         
-        print(f"{request.user.username} 退選成功: {offering.course.course_name}")
+        record_enrollment_change(enrollment, 'enrolled', 'dropped')
+        
+        logger.debug('%s 退選成功: %s', request.user.username, offering.course.course_name)
         return Response({'message': '退選成功'})
         
     except Exception as e:
-        print(f"退選錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('退選錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -262,14 +278,14 @@ def get_enrolled_courses(request):
     try:
         # 手動檢查登入狀態
         if not request.user.is_authenticated:
-            print("使用者未登入")
+            logger.debug('使用者未登入')
             return Response([], status=200)
         
         # 獲取篩選參數
         academic_year = request.GET.get('academic_year', '114')
         semester = request.GET.get('semester', '1')
         
-        print(f"取得 {request.user.username} 的選課記錄 (學年度: {academic_year}, 學期: {semester})")
+        logger.debug('取得 %s 的選課記錄 (學年度: %s, 學期: %s)', request.user.username, academic_year, semester)
         
         enrollments = Enrollment.objects.filter(
             student=request.user,
@@ -328,13 +344,11 @@ def get_enrolled_courses(request):
                 'enrolled_at': enrollment.enrolled_at.strftime('%Y-%m-%d %H:%M:%S'),
             })
         
-        print(f"找到 {len(courses_data)} 門已選課程")
+        logger.debug('找到 %s 門已選課程', len(courses_data))
         return Response(courses_data)
         
     except Exception as e:
-        print(f"錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -374,9 +388,7 @@ def toggle_favorite(request, course_id):
             return Response({'message': '已加入收藏', 'is_favorited': True})
         
     except Exception as e:
-        print(f"收藏錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('收藏錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -456,80 +468,35 @@ def get_favorite_courses(request):
         return Response(courses_data)
         
     except Exception as e:
-        print(f"錯誤: {str(e)}")
+        logger.error('錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
 @api_view(['POST'])
 def import_courses_excel(request):
-    """從 Excel 匯入課程"""
+    """從 Excel 匯入課程（僅限管理員；建立背景工作，立即回傳 job_id）"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
     try:
         if 'file' not in request.FILES:
             return Response({'error': '沒有上傳檔案'}, status=400)
         
         excel_file = request.FILES['file']
+        default_department = request.data.get('department', '資管系')
         
-        # 讀取 Excel
-        wb = openpyxl.load_workbook(BytesIO(excel_file.read()))
-        ws = wb.active
-        
-        # 取得欄位數量以判斷格式
-        first_row = next(ws.iter_rows(min_row=1, max_row=1))
-        column_count = len([cell for cell in first_row if cell.value is not None])
-        
-        print(f"偵測到 {column_count} 欄")
-        
-        success_count = 0
-        error_count = 0
-        errors = []
-        
-        # 根據欄位數量選擇對應的處理方式
-        if column_count == 15:
-            # 15 欄格式
-            for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                try:
-                    if not row[0]:  # 跳過空行
-                        continue
-                    
-                    # 處理邏輯
-                    success_count += 1
-                    
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"第 {idx} 列: {str(e)}")
-        
-        elif column_count == 16:
-            # 16 欄格式（含系所）
-            for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                try:
-                    if not row[0]:
-                        continue
-                    
-                    # 處理邏輯
-                    success_count += 1
-                    
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"第 {idx} 列: {str(e)}")
+        # 先存檔，由背景工作讀取並逐列匯入
+        file_path = private_upload_storage().save(f'job_uploads/{uuid.uuid4().hex}.xlsx', excel_file)
+        job = enqueue_job('import_courses', {
+            'file_path': file_path,
+            'department': default_department,
+        }, user=request.user)
         
-        else:
-            return Response({'error': f'不支援的格式（{column_count} 欄）'}, status=400)
-        
-        result = {
-            'message': f'匯入完成: 成功 {success_count} 筆，失敗 {error_count} 筆',
-            'success_count': success_count,
-            'error_count': error_count,
-        }
-        
-        if errors:
-            result['errors'] = errors[:10]  # 只回傳前 10 個錯誤
-        
-        return Response(result)
+        logger.info('建立匯入工作 #%s: %s', job.id, excel_file.name)
+        return Response({'message': '已開始匯入', 'job_id': job.id}, status=202)
         
     except Exception as e:
-        print(f"匯入錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('匯入錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -588,7 +555,7 @@ def get_filter_options(request):
         })
         
     except Exception as e:
-        print(f"取得篩選選項錯誤: {str(e)}")
+        logger.error('取得篩選選項錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -634,87 +601,35 @@ def get_course_detail(request, course_id):
     except CourseOffering.DoesNotExist:
         return Response({'error': '找不到該課程'}, status=404)
     except Exception as e:
-        print(f"取得課程詳情錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('取得課程詳情錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
 @api_view(['PUT'])
 def update_course(request, course_id):
-    """更新課程資料"""
+    """更新課程資料（只寫入有變動的欄位與關聯資料）"""
     try:
         # 取得開課資料
-        offering = CourseOffering.objects.select_related('course').get(id=course_id)
-        course = offering.course
-        
-        # 更新課程基本資料
-        course.course_code = request.data.get('course_code', course.course_code)
-        course.course_name = request.data.get('course_name', course.course_name)
-        course.course_type = request.data.get('course_type', course.course_type)
-        course.description = request.data.get('description', course.description)
-        course.credits = request.data.get('credits', course.credits)
-        course.save()
-        
-        # 更新開課資料
-        offering.academic_year = request.data.get('academic_year', offering.academic_year)
-        offering.semester = request.data.get('semester', offering.semester)
-        offering.grade_level = request.data.get('grade_level', offering.grade_level)
-        offering.max_students = request.data.get('max_students', offering.max_students)
-        
-        # 更新系所
-        from .models import Department
-        department_name = request.data.get('department')
-        if department_name:
-            department, _ = Department.objects.get_or_create(name=department_name)
-            offering.department = department
-        
-        offering.save()
-        
-        # 更新教師
-        teacher_id = request.data.get('teacher_id')
-        if teacher_id:
-            from .models import OfferingTeacher
-            # 刪除舊的教師關係
-            offering.offering_teachers.all().delete()
-            # 新增新的教師關係
-            teacher = User.objects.get(id=teacher_id)
-            OfferingTeacher.objects.create(
-                offering=offering,
-                teacher=teacher,
-                role='main'
-            )
+        offering = CourseOffering.objects.select_related(
+            'course', 'department'
+        ).prefetch_related(
+            'offering_teachers', 'class_times'
+        ).get(id=course_id)
         
-        # 更新上課時段
-        classroom = request.data.get('classroom')
-        weekday = request.data.get('weekday')
-        start_period = request.data.get('start_period')
-        end_period = request.data.get('end_period')
-        
-        if all([classroom, weekday, start_period, end_period]):
-            from .models import ClassTime
-            # 刪除舊的時段
-            offering.class_times.all().delete()
-            # 新增新的時段
-            ClassTime.objects.create(
-                offering=offering,
-                weekday=weekday,
-                start_period=start_period,
-                end_period=end_period,
-                classroom=classroom
-            )
+        changes = apply_course_update(offering, request.data)
         
-        print(f"課程更新成功: {course.course_name}")
-        return Response({'message': '課程更新成功'})
+        if changes:
+            logger.info('課程更新成功: %s 變動: %s', offering.course.course_name, changes)
+        return Response({'message': '課程更新成功', 'changes': changes})
         
     except CourseOffering.DoesNotExist:
         return Response({'error': '找不到該課程'}, status=404)
     except User.DoesNotExist:
         return Response({'error': '找不到該教師'}, status=404)
+    except (OccupancyConflict, ValueError) as e:
+        return Response({'error': str(e)}, status=400)
     except Exception as e:
-        print(f"更新課程錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('更新課程錯誤: %s', e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -722,67 +637,122 @@ def update_course(request, course_id):
 def my_teaching_courses(request):
     """取得教師自己的授課列表（包含主開課和協同）"""
     try:
-        # 1. 檢查登入
         if not request.user.is_authenticated:
             return Response({'error': '請先登入'}, status=401)
-            
-        print(f"查詢教師課程: {request.user.username}")
-        
-        # 2. 查詢該教師的所有開課（無論是主開課還是協同）
-        # 使用 offering_teachers__teacher 關聯查詢
-        offerings = CourseOffering.objects.filter(
-            offering_teachers__teacher=request.user
-        ).select_related(
-            'course', 'department'
-        ).prefetch_related(
-            'offering_teachers__teacher__profile',
-            'class_times'
-        ).distinct().order_by('-academic_year', '-semester', 'course__course_code')
-        
-        # 3. 整理回傳資料
-        courses_data = []
-        for offering in offerings:
-            # 取得該教師在這門課的角色
-            my_role_rel = offering.offering_teachers.filter(teacher=request.user).first()
-            my_role = my_role_rel.get_role_display() if my_role_rel else '未知'
-            
-            # 取得上課時段
-            class_times = offering.class_times.all()
-            times_display = []
-            for ct in class_times:
-                times_display.append(f"{ct.get_weekday_display()} 第{ct.start_period}-{ct.end_period}節 ({ct.classroom})")
-            
-            # 取得所有教師名稱
-            all_teachers = offering.offering_teachers.all()
-            teacher_names = []
-            for ot in all_teachers:
-                name = ot.teacher.profile.real_name if hasattr(ot.teacher, 'profile') else ot.teacher.username
-                if ot.role == 'main':
-                    teacher_names.append(f"{name}(主)")
-                else:
-                    teacher_names.append(name)
-            
-            courses_data.append({
-                'id': offering.id,
-                'course_code': offering.course.course_code,
-                'course_name': offering.course.course_name,
-                'course_type': offering.course.get_course_type_display(),
-                'credits': offering.course.credits,
-                'academic_year': offering.academic_year,
-                'semester': offering.get_semester_display(),
-                'department': offering.department.name,
-                'my_role': my_role,
-                'time_info': '；'.join(times_display) if times_display else '未設定',
-                'teacher_names': '、'.join(teacher_names),
-                'student_count': f"{offering.current_students} / {offering.max_students}",
-                'status': offering.get_status_display()
+
+        courses = get_teaching_dashboard(request.user)['courses']
+        return Response(courses)
+
+    except Exception as e:
+        logger.exception('取得授課列表失敗: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+def my_teaching_summary(request):
+    """取得教師的授課摘要（課程數、修課人數、各學期滿班率）"""
+    try:
+        if not request.user.is_authenticated:
+            return Response({'error': '請先登入'}, status=401)
+
+        return Response(get_teaching_dashboard(request.user)['summary'])
+
+    except Exception as e:
+        logger.exception('取得授課摘要失敗: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+def get_course_roster(request, course_id):
+    """取得開課的修課名單與目前成績（授課教師或管理員）"""
+    try:
+        if not request.user.is_authenticated:
+            return Response({'error': '請先登入'}, status=401)
+        if not can_manage_offering(request, course_id):
+            return Response({'error': '權限不足'}, status=403)
+
+        roster = []
+        for enrollment in roster_queryset(course_id):
+            profile = getattr(enrollment.student, 'profile', None)
+            roster.append({
+                'enrollment_id': enrollment.id,
+                'student_id': profile.student_id if profile else enrollment.student.username,
+                'real_name': profile.real_name if profile else enrollment.student.username,
+                'department': profile.department if profile else None,
+                'student_grade': profile.grade if profile else None,
+                'status': enrollment.status,
+                'grade': enrollment.grade,
+                'score': float(enrollment.score) if enrollment.score is not None else None,
             })
-            
-        print(f"找到 {len(courses_data)} 門授課")
-        return Response(courses_data)
+
+        return Response({'count': len(roster), 'students': roster})
 
     except Exception as e:
-        print(f"取得授課列表失敗: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return Response({'error': str(e)}, status=500)
\ No newline at end of file
+        logger.exception('取得修課名單錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['POST'])
+def submit_grades(request, course_id):
+    """
+    批次登錄成績（授課教師或管理員）
+    body: {"grades": [{"enrollment_id" 或 "student_id", "grade", "score"}, ...]}
+    整批驗證通過才寫入，任一列有誤時回傳 400 與各列錯誤
+    """
+    try:
+        if not request.user.is_authenticated:
+            return Response({'error': '請先登入'}, status=401)
+        if not can_manage_offering(request, course_id):
+            return Response({'error': '權限不足'}, status=403)
+
+        rows = request.data.get('grades')
+        if not isinstance(rows, list) or not rows:
+            return Response({'error': '請提供成績資料'}, status=400)
+
+        changes, errors = validate_grades(course_id, rows)
+        if errors:
+            return Response({'error': '成績資料有誤，未寫入任何資料', 'errors': errors}, status=400)
+
+        updated = save_grades(changes)
+        logger.info('%s 登錄成績: 開課 %s，共 %s 筆，更新 %s 筆', request.user.username, course_id, len(rows), updated)
+        return Response({'message': '成績登錄成功', 'total': len(rows), 'updated': updated})
+
+    except Exception as e:
+        logger.exception('登錄成績錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['POST'])
+def plan_schedules(request):
+    """
+    課表組合建議：列出不衝堂的選課組合，依偏好排序取前 K 組
+    body: {"course_codes": [...], "preferences": {"avoid_periods": [1], "free_days": [5], "fewer_days": true},
+           "limit": 10, "include_full": false, "keep_enrolled": true}
+    """
+    try:
+        if not request.user.is_authenticated:
+            return Response({'error': '請先登入'}, status=401)
+
+        course_codes = request.data.get('course_codes')
+        if not isinstance(course_codes, list) or not course_codes:
+            return Response({'error': '請提供課程代碼'}, status=400)
+        if len(course_codes) > 15:
+            return Response({'error': '一次最多規劃 15 門課程'}, status=400)
+
+        try:
+            result = build_plans(
+                request.user,
+                course_codes,
+                preferences=request.data.get('preferences'),
+                limit=request.data.get('limit'),
+                include_full=bool(request.data.get('include_full', False)),
+                keep_enrolled=bool(request.data.get('keep_enrolled', True)),
+            )
+        except (TypeError, ValueError) as e:
+            return Response({'error': f'參數錯誤: {str(e)}'}, status=400)
+
+        return Response(result)
+
+    except Exception as e:
+        logger.exception('課表規劃錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+資料匯出相關的 API views
+包含開課資料、選課紀錄與教室使用率的 CSV / Excel 匯出（?file_type=csv|xlsx）
+資料以 iterator 分批讀取並逐列串流輸出，記憶體用量不隨資料筆數增加
+以 = + - @ 開頭的文字欄位前加上 '，避免在 Excel 中被當成公式執行
+"""
+import csv
+import logging
+import tempfile
+
+import openpyxl
+from django.db.models import Prefetch
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from .models import CourseOffering, OfferingTeacher, Enrollment
+from .permissions import is_admin
+from .utilization import cell_rows, room_utilization
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+
+OFFERING_HEADERS = [
+    '開課ID', '課程代碼', '課程名稱', '課程類別', '學分', '學年度', '學期', '開課系所',
+    '年級', '授課教師', '上課時間', '人數上限', '目前人數', '開課狀態',
+]
+
+ROOM_UTILIZATION_HEADERS = ['教室', '星期', '節次', '使用週數比例', '修課人數', '人數上限', '填滿率']
+
+ENROLLMENT_HEADERS = [
+    '學年度', '學期', '課程代碼', '課程名稱', '開課系所', '學號', '姓名', '學生系所',
+    '選課狀態', '等第成績', '百分制成績', '選課時間',
+]
+
+
+# 試算表會當成公式開頭的字元（CSV injection）
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _safe_cell(value):
+    """文字欄位若可能被當成公式，前面加上 ' 改為純文字"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _safe_rows(rows):
+    for row in rows:
+        yield [_safe_cell(value) for value in row]
+
+
+def _term_error(academic_year, semester):
+    """學年度與學期只接受數字（也用於下載檔名），格式不正確時回傳 400 Response"""
+    if academic_year and not academic_year.isdigit():
+        return Response({'error': '學年度格式不正確'}, status=400)
+    if semester and not semester.isdigit():
+        return Response({'error': '學期格式不正確'}, status=400)
+    return None
+
+
+class _Echo:
+    """csv.writer 用的假檔案：write 直接回傳該列字串"""
+
+    def write(self, value):
+        return value
+
+
+def _export_response(rows, headers, filename, export_format):
+    """依格式輸出：CSV 以 StreamingHttpResponse 逐列串流，Excel 以 write_only 模式寫入暫存檔"""
+    rows = _safe_rows(rows)
+    if export_format == 'xlsx':
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(headers)
+        for row in rows:
+            ws.append(row)
+        tmp = tempfile.TemporaryFile()
+        wb.save(tmp)
+        tmp.seek(0)
+        return FileResponse(
+            tmp,
+            as_attachment=True,
+            filename=f'{filename}.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    writer = csv.writer(_Echo())
+
+    def stream():
+        yield '\ufeff'  # BOM，讓 Excel 正確辨識 UTF-8 中文
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = content_disposition_header(True, f'{filename}.csv')
+    return response
+
+
+def _offering_rows(offerings):
+    for offering in offerings.iterator(chunk_size=CHUNK_SIZE):
+        teacher_names = []
+        for ot in offering.offering_teachers.all():
+            name = ot.teacher.profile.real_name if hasattr(ot.teacher, 'profile') else ot.teacher.username
+            teacher_names.append(f"{name}(主)" if ot.role == 'main' else name)
+
+        time_strs = [
+            f"{ct.get_weekday_display()} 第{ct.start_period}-{ct.end_period}節 ({ct.classroom})"
+            for ct in offering.class_times.all()
+        ]
+
+        yield [
+            offering.id,
+            offering.course.course_code,
+            offering.course.course_name,
+            offering.course.get_course_type_display(),
+            offering.course.credits,
+            offering.academic_year,
+            offering.semester,
+            offering.department.name,
+            offering.grade_level,
+            '、'.join(teacher_names),
+            '；'.join(time_strs),
+            offering.max_students,
+            offering.current_students,
+            offering.get_status_display(),
+        ]
+
+
+def _enrollment_rows(enrollments):
+    status_display = dict(Enrollment.STATUS_CHOICES)
+    for row in enrollments.iterator(chunk_size=CHUNK_SIZE):
+        (academic_year, semester, course_code, course_name, department,
+         student_id, username, real_name, student_department,
+         status, grade, score, enrolled_at) = row
+        yield [
+            academic_year,
+            semester,
+            course_code,
+            course_name,
+            department,
+            student_id or username,
+            real_name or username,
+            student_department or '',
+            status_display.get(status, status),
+            grade or '',
+            '' if score is None else score,
+            timezone.localtime(enrolled_at).strftime('%Y-%m-%d %H:%M:%S'),
+        ]
+
+
+@api_view(['GET'])
+def export_offerings(request):
+    """匯出開課資料（含授課教師與上課時間）"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    try:
+        academic_year = request.GET.get('academic_year', '')
+        semester = request.GET.get('semester', '')
+        department = request.GET.get('department', '')
+        export_format = request.GET.get('file_type', 'csv')
+
+        error = _term_error(academic_year, semester)
+        if error:
+            return error
+
+        offerings = CourseOffering.objects.select_related(
+            'course', 'department'
+        ).prefetch_related(
+            Prefetch(
+                'offering_teachers',
+                queryset=OfferingTeacher.objects.select_related('teacher__profile').order_by('-role', 'id'),
+            ),
+            'class_times',
+        ).order_by('academic_year', 'semester', 'course__course_code', 'id')
+
+        if academic_year:
+            offerings = offerings.filter(academic_year=academic_year)
+        if semester:
+            offerings = offerings.filter(semester=semester)
+        if department:
+            offerings = offerings.filter(department__name=department)
+
+        filename = f"offerings_{academic_year or 'all'}_{semester or 'all'}"
+        return _export_response(_offering_rows(offerings), OFFERING_HEADERS, filename, export_format)
+
+    except Exception as e:
+        logger.exception('匯出開課資料錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+def export_enrollments(request):
+    """匯出某學期的選課紀錄"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    try:
+        academic_year = request.GET.get('academic_year', '')
+        semester = request.GET.get('semester', '')
+        status = request.GET.get('status', '')
+        export_format = request.GET.get('file_type', 'csv')
+
+        if not academic_year or not semester:
+            return Response({'error': '請指定學年度與學期'}, status=400)
+        error = _term_error(academic_year, semester)
+        if error:
+            return error
+
+        enrollments = Enrollment.objects.filter(
+            offering__academic_year=academic_year,
+            offering__semester=semester,
+        )
+        if status:
+            enrollments = enrollments.filter(status=status)
+
+        # 只取需要的欄位（values_list），不建立模型物件
+        enrollments = enrollments.order_by(
+            'offering__course__course_code', 'offering_id', 'student__profile__student_id', 'id'
+        ).values_list(
+            'offering__academic_year',
+            'offering__semester',
+            'offering__course__course_code',
+            'offering__course__course_name',
+            'offering__department__name',
+            'student__profile__student_id',
+            'student__username',
+            'student__profile__real_name',
+            'student__profile__department',
+            'status',
+            'grade',
+            'score',
+            'enrolled_at',
+        )
+
+        filename = f"enrollments_{academic_year}_{semester}"
+        return _export_response(_enrollment_rows(enrollments), ENROLLMENT_HEADERS, filename, export_format)
+
+    except Exception as e:
+        logger.exception('匯出選課紀錄錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+def export_room_utilization(request):
+    """匯出某學期的教室使用率（教室 × 星期 × 節次，只列出有使用的格子）"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    try:
+        academic_year = request.GET.get('academic_year', '')
+        semester = request.GET.get('semester', '')
+        export_format = request.GET.get('file_type', 'csv')
+
+        if not academic_year or not semester:
+            return Response({'error': '請指定學年度與學期'}, status=400)
+        error = _term_error(academic_year, semester)
+        if error:
+            return error
+
+        data = room_utilization(academic_year, semester)
+        filename = f"room_utilization_{academic_year}_{semester}"
+        return _export_response(cell_rows(data), ROOM_UTILIZATION_HEADERS, filename, export_format)
+
+    except Exception as e:
+        logger.exception('匯出教室使用率錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+背景工作相關的 API views
+包含建立工作、查詢狀態與輕量進度輪詢
+"""
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from .models import BackgroundJob
+from .jobs import enqueue_job, fail_stale_jobs
+from .permissions import is_admin
+
+
+def _job_data(job):
+    return {
+        'id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress_current': job.progress_current,
+        'progress_total': job.progress_total,
+        'message': job.message,
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'started_at': job.started_at.strftime('%Y-%m-%d %H:%M:%S') if job.started_at else None,
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M:%S') if job.finished_at else None,
+    }
+
+
+@api_view(['GET'])
+def get_job_status(request, job_id):
+    """取得背景工作的完整狀態（含結果）"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    try:
+        fail_stale_jobs([job_id])
+        job = BackgroundJob.objects.get(id=job_id)
+        return Response(_job_data(job))
+    except BackgroundJob.DoesNotExist:
+        return Response({'error': '找不到該工作'}, status=404)
+
+
+@api_view(['GET'])
+def get_job_progress(request, job_id):
+    """輕量進度查詢（只讀取進度欄位，供前端頻繁輪詢；限工作建立者或管理員）"""
+    if not request.user.is_authenticated:
+        return Response({'error': '請先登入'}, status=401)
+
+    fail_stale_jobs([job_id])
+    progress = BackgroundJob.objects.filter(id=job_id).values(
+        'status', 'progress_current', 'progress_total', 'message', 'created_by_id'
+    ).first()
+    if progress is None:
+        return Response({'error': '找不到該工作'}, status=404)
+    if progress.pop('created_by_id') != request.user.id and not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    progress['done'] = progress['status'] in ('success', 'failed')
+    return Response(progress)
+
+
+@api_view(['GET'])
+def get_recent_jobs(request):
+    """取得最近的背景工作列表"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    jobs = BackgroundJob.objects.all()
+    job_type = request.GET.get('job_type', '')
+    if job_type:
+        jobs = jobs.filter(job_type=job_type)
+    return Response([_job_data(job) for job in jobs[:50]])
+
+
+@api_view(['POST'])
+def reconcile_offering_counts(request):
+    """建立背景工作：依選課紀錄校正各開課的目前人數"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    job = enqueue_job('reconcile_offering_counts', {
+        'academic_year': request.data.get('academic_year', ''),
+        'semester': request.data.get('semester', ''),
+    }, user=request.user)
+    return Response({'message': '已建立背景工作', 'job_id': job.id}, status=202)
+
+
+@api_view(['POST'])
+def compute_gpa(request):
+    """建立背景工作：學期結算，計算所有學生的 GPA"""
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    job = enqueue_job('compute_gpa', {}, user=request.user)
+    return Response({'message': '已建立背景工作', 'job_id': job.id}, status=202)
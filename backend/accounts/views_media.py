@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+媒體檔案（MEDIA_URL）的提供
+內容雜湊命名的檔案內容永不改變，回應 immutable 一年快取，瀏覽器不再重新驗證
+"""
+import posixpath
+
+from django.conf import settings
+from django.http import Http404
+from django.views.static import serve
+
+from .storage import is_hashed_name
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 不對外提供的目錄：背景工作的上傳檔現存於 PRIVATE_UPLOAD_ROOT，
+# 此檢查只保護舊版暫存在 MEDIA_ROOT/job_uploads 的檔案
+PRIVATE_DIRS = ('job_uploads',)
+
+
+def is_private(path):
+    """正規化後（與 django.views.static.serve 相同方式處理 .. 與 ./）是否位於不公開的目錄"""
+    path = posixpath.normpath(path).lstrip('/')
+    return any(path == name or path.startswith(f'{name}/') for name in PRIVATE_DIRS)
+
+
+def serve_media(request, path):
+    """提供 MEDIA_ROOT 下的檔案"""
+    if is_private(path):
+        raise Http404()
+
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_hashed_name(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 指標輸出
+供 Prometheus 抓取（Authorization: Bearer METRICS_TOKEN），登入的管理員也可直接以瀏覽器檢視
+"""
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from . import metrics
+from .permissions import is_admin
+
+
+def _authorized(request):
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(header, f'Bearer {token}'):
+        return True
+    return is_admin(request)
+
+
+@require_GET
+def metrics_view(request):
+    """所有 worker 加總後的指標（Prometheus 文字格式）"""
+    if not _authorized(request):
+        return HttpResponseForbidden()
+    response = HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    return response
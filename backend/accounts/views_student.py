@@ -1,12 +1,23 @@
 """
 學生相關的 API views
-包含學分統計查詢功能
+包含學分統計、歷年成績單與畢業門檻檢核功能
 """
+import logging
+
+from django.core.cache import cache
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Profile, Enrollment
+from .credits import CATEGORY_BY_COURSE_TYPE, current_term, rebuild_credit_summaries
+from .degree_audit import audit_student, audit_students, graduating_profiles
+from .gpa import grade_point, term_key
+from .metrics import record_cache
+from .models import Profile, CreditSummary, CourseOffering, Course, Enrollment
+from .permissions import is_admin
+from .user_context import get_or_create_role_id, get_user_context
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['GET'])
@@ -17,16 +28,14 @@ def get_credit_summary(request):
     try:
         user = request.user
         
-        # 嘗試獲取 Profile
-        # 嘗試獲取 Profile，如果不存在則自動修復
-        if hasattr(user, 'profile'):
-            profile = user.profile
-        else:
+        # 嘗試獲取 Profile（由 UserContext 一次載入），如果不存在則自動修復
+        profile = get_user_context(request).profile
+        if profile is None:
             try:
                 profile = Profile.objects.get(user=user)
             except Profile.DoesNotExist:
                 # 自動修復：建立預設 Profile
-                print(f"Warning: User {user.username} has no profile. Auto-creating in get_credit_summary...")
+                logger.warning('User %s has no profile. Auto-creating in get_credit_summary...', user.username)
                 profile = Profile.objects.create(
                     user=user, 
                     real_name=user.username,
@@ -43,11 +52,19 @@ def get_credit_summary(request):
                 else:
                     role_name = 'student'
                     
-                role, _ = Role.objects.get_or_create(name=role_name)
-                profile.roles.add(role)
+                profile.roles.add(get_or_create_role_id(role_name))
                 profile.save()
 
-        # 準備預設數據結構
+        # 學分統計由選課、退選、成績變動時增量維護，這裡只讀取一列
+        year, semester = current_term()
+        summary = CreditSummary.objects.filter(
+            student=user, term_academic_year=year, term_semester=semester
+        ).first()
+        if summary is None:
+            # 尚未建立或學期已切換：重算一次
+            rebuild_credit_summaries([user.id])
+            summary = CreditSummary.objects.get(student=user)
+
         data = {
             'user_info': {
                 'real_name': getattr(profile, 'real_name', user.username) or user.username,
@@ -55,89 +72,200 @@ def get_credit_summary(request):
                 'department': getattr(profile, 'department', '未設定') or '未設定',
                 'grade': f"{profile.grade}年級" if getattr(profile, 'grade', None) else '未設定',
             },
-            'total_credits': {'general': 0, 'elective': 0, 'required': 0, 'all': 0},
-            'semester_credits': {'general': 0, 'elective': 0, 'required': 0, 'all': 0},
+            'total_credits': {
+                'general': summary.general_credits,
+                'elective': summary.elective_credits,
+                'required': summary.required_credits,
+                'all': summary.total_credits,
+            },
+            'semester_credits': {
+                'general': summary.semester_general_credits,
+                'elective': summary.semester_elective_credits,
+                'required': summary.semester_required_credits,
+                'all': summary.semester_total_credits,
+            },
         }
 
-        # 如果沒有 Enrollment 屬性 (例如 Teacher 誤入)，直接回傳預設值
-        if not hasattr(user, 'enrollments'):
-             return Response(data)
-
-        # 當前學期設定
-        current_year = '114'
-        current_semester = '1'
+        return Response(data)
         
-        # 1. 計算歷年總學分
-        try:
-            # 使用 getattr 安全存取，避免關聯不存在錯誤
-            historical_enrollments = Enrollment.objects.filter(
-                student=user,
-                status='passed'
-            ).exclude(
-                offering__academic_year=current_year,
-                offering__semester=current_semester
-            ).select_related('offering__course')
-
-            for enrollment in historical_enrollments:
-                # 再次確認關聯存在
-                if not enrollment.offering or not enrollment.offering.course:
-                    continue
-                    
-                course = enrollment.offering.course
-                credits = getattr(course, 'credits', 0) or 0
-                ctype = getattr(course, 'course_type', '')
-
-                if ctype in ['general_required', 'general_elective']:
-                    data['total_credits']['general'] += credits
-                elif ctype == 'elective':
-                    data['total_credits']['elective'] += credits
-                elif ctype == 'required':
-                    data['total_credits']['required'] += credits
-            
-            data['total_credits']['all'] = (
-                data['total_credits']['general'] + 
-                data['total_credits']['elective'] + 
-                data['total_credits']['required']
-            )
-        except Exception as e:
-            print(f"計算歷年學分時發生錯誤 (已忽略): {e}")
-
-        # 2. 計算本學期學分
-        try:
-            semester_enrollments = Enrollment.objects.filter(
-                student=user,
-                offering__academic_year=current_year,
-                offering__semester=current_semester,
-                status='enrolled'
-            ).select_related('offering__course')
-            
-            for enrollment in semester_enrollments:
-                if not enrollment.offering or not enrollment.offering.course:
-                    continue
-                    
-                course = enrollment.offering.course
-                credits = getattr(course, 'credits', 0) or 0
-                ctype = getattr(course, 'course_type', '')
-
-                if ctype in ['general_required', 'general_elective']:
-                    data['semester_credits']['general'] += credits
-                elif ctype == 'elective':
-                    data['semester_credits']['elective'] += credits
-                elif ctype == 'required':
-                    data['semester_credits']['required'] += credits
-
-            data['semester_credits']['all'] = (
-                data['semester_credits']['general'] + 
-                data['semester_credits']['elective'] + 
-                data['semester_credits']['required']
-            )
-        except Exception as e:
-            print(f"計算本學期學分時發生錯誤 (已忽略): {e}")
+    except Exception as e:
+        logger.exception('嚴重系統錯誤: %s', e)
+        return Response({'error': f"系統錯誤: {str(e)}"}, status=500)
+
+TRANSCRIPT_CACHE_TIMEOUT = 60 * 60
+
+
+def _summary_version(user):
+    """
+    成績單快取版本：CreditSummary.updated_at
+    選課、退選、成績變動與課程資料修改都會更新該列，版本改變後舊快取自然失效（各 worker 皆同）
+    """
+    updated_at = CreditSummary.objects.filter(student=user).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        rebuild_credit_summaries([user.id])
+        updated_at = CreditSummary.objects.filter(student=user).values_list('updated_at', flat=True).first()
+    return int(updated_at.timestamp() * 1000000)
+
+
+def _round_gpa(points, credits):
+    return round(points / credits, 2) if credits else None
+
+
+def build_transcript(user):
+    """以一次查詢取得所有選課紀錄，依學期分組並計算各學期小計與 GPA"""
+    enrollments = Enrollment.objects.filter(
+        student=user
+    ).exclude(
+        status='dropped'
+    ).select_related('offering__course').order_by('offering__course__course_code')
+
+    semester_display = dict(CourseOffering.SEMESTER_CHOICES)
+    course_type_display = dict(Course.COURSE_TYPE_CHOICES)
+    status_display = dict(Enrollment.STATUS_CHOICES)
+
+    terms = {}
+    totals = {'attempted_credits': 0, 'earned_credits': 0, 'gpa_points': 0.0, 'gpa_credits': 0}
+    for enrollment in enrollments:
+        offering = enrollment.offering
+        course = offering.course
+        key = (offering.academic_year, offering.semester)
+        term = terms.get(key)
+        if term is None:
+            term = terms[key] = {
+                'academic_year': offering.academic_year,
+                'semester': offering.semester,
+                'semester_display': semester_display.get(offering.semester, offering.semester),
+                'courses': [],
+                'credits': {'required': 0, 'elective': 0, 'general': 0},
+                'attempted_credits': 0,
+                'earned_credits': 0,
+                'in_progress_credits': 0,
+                'gpa_points': 0.0,
+                'gpa_credits': 0,
+            }
+
+        credits = course.credits or 0
+        term['courses'].append({
+            'offering_id': offering.id,
+            'course_code': course.course_code,
+            'course_name': course.course_name,
+            'course_type': course.course_type,
+            'course_type_display': course_type_display.get(course.course_type, course.course_type),
+            'credits': credits,
+            'status': enrollment.status,
+            'status_display': status_display.get(enrollment.status, enrollment.status),
+            'grade': enrollment.grade,
+            'score': float(enrollment.score) if enrollment.score is not None else None,
+        })
+
+        if enrollment.status == 'enrolled':
+            term['in_progress_credits'] += credits
+            continue
+
+        term['attempted_credits'] += credits
+        if enrollment.status == 'passed':
+            term['earned_credits'] += credits
+            category = CATEGORY_BY_COURSE_TYPE.get(course.course_type)
+            if category:
+                term['credits'][category] += credits
+
+        point = grade_point(enrollment.grade, enrollment.score)
+        if point is not None:
+            term['gpa_points'] += point * credits
+            term['gpa_credits'] += credits
 
+    # 學年度為字串（'99' < '114' 的字串比較不正確），以數值排序
+    ordered = []
+    for key in sorted(terms, key=lambda k: term_key(*k)):
+        term = terms[key]
+        for field in ('attempted_credits', 'earned_credits', 'gpa_points', 'gpa_credits'):
+            totals[field] += term[field]
+        term['gpa'] = _round_gpa(term.pop('gpa_points'), term.pop('gpa_credits'))
+        ordered.append(term)
+
+    return {
+        'terms': ordered,
+        'attempted_credits': totals['attempted_credits'],
+        'earned_credits': totals['earned_credits'],
+        'cumulative_gpa': _round_gpa(totals['gpa_points'], totals['gpa_credits']),
+    }
+
+
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def get_transcript(request):
+    """獲取學生的歷年成績單（依學期分組，含學分小計與 GPA）"""
+    try:
+        user = request.user
+        cache_key = f'transcript:{user.id}:{_summary_version(user)}'
+        data = cache.get(cache_key)
+        record_cache('transcript', data is not None)
+        if data is None:
+            data = build_transcript(user)
+            cache.set(cache_key, data, TRANSCRIPT_CACHE_TIMEOUT)
         return Response(data)
-        
+
+    except Exception as e:
+        logger.exception('獲取成績單錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def get_graduation_audit(request):
+    """檢核目前學生的畢業門檻"""
+    try:
+        profile = get_user_context(request).profile
+        if profile is None:
+            return Response({'error': '找不到個人資料'}, status=404)
+        return Response(audit_student(profile))
+
+    except Exception as e:
+        logger.exception('畢業門檻檢核錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+def audit_graduating_class(request):
+    """
+    批次檢核畢業門檻（管理員）
+    可依 department（系所）與 grade（年級）篩選；detail=1 時回傳每條規則的檢核細節
+    """
+    if not is_admin(request):
+        return Response({'error': '權限不足'}, status=403)
+
+    try:
+        profiles = list(graduating_profiles(
+            department=request.GET.get('department', ''),
+            grade=request.GET.get('grade', ''),
+        ))
+        detail = request.GET.get('detail') == '1'
+        results = audit_students(profiles)
+
+        students = []
+        for profile in profiles:
+            result = results[profile.user_id]
+            item = {
+                'user_id': profile.user_id,
+                'student_id': profile.student_id,
+                'real_name': profile.real_name,
+                'department': profile.department,
+                'grade': profile.grade,
+                'eligible': result['eligible'],
+                'failed_rules': [r['name'] for r in result['rules'] if not r['passed']],
+            }
+            if detail:
+                item['rules'] = result['rules']
+            students.append(item)
+
+        return Response({
+            'total': len(students),
+            'eligible_count': sum(1 for s in students if s['eligible']),
+            'students': students,
+        })
+
     except Exception as e:
-        print(f"嚴重系統錯誤: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return Response({'error': f"系統錯誤: {str(e)}"}, status=500)
\ No newline at end of file
+        logger.exception('批次畢業門檻檢核錯誤: %s', e)
+        return Response({'error': str(e)}, status=500)
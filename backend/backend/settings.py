@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,13 +44,16 @@ INSTALLED_APPS = [
 
 # ===== 修改 4: 添加 WhiteNoise 中間件 =====
 MIDDLEWARE = [
+    'accounts.middleware.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'accounts.middleware.SessionRefreshMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.UserContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -101,9 +106,100 @@ else:
 SESSION_COOKIE_HTTPONLY = False  # 改為 False 讓前端可以檢查
 SESSION_COOKIE_AGE = 86400  # 24小時
 SESSION_COOKIE_NAME = 'sessionid'
-SESSION_SAVE_EVERY_REQUEST = True  # 改為 True，確保 session 持續有效
+# 不在每個請求都寫入 session，改由 SessionRefreshMiddleware 在經過
+# SESSION_REFRESH_FRACTION × SESSION_COOKIE_AGE 後才延長有效期限
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_FRACTION = float(os.environ.get('SESSION_REFRESH_FRACTION', '0.1'))
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# 設定共用快取（SESSION_CACHE_URL，redis:// 或 memcached://）時 session 讀取優先走快取（cached_db），
+# 資料庫只在寫入時使用；未設定時使用 db session（各台主機的本機快取無法在登出時一併失效）
+# 可用環境變數改為 'django.contrib.sessions.backends.signed_cookies'（完全不查資料庫）
+SESSION_CACHE_URL = os.environ.get('SESSION_CACHE_URL', '')
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if SESSION_CACHE_URL else 'django.contrib.sessions.backends.db',
+)
+SESSION_CACHE_ALIAS = 'sessions'
+
+# ===== 登入設定 =====
+# 同一程序內同時進行密碼雜湊驗證的上限，與等待名額的逾時秒數（逾時回應 503）
+LOGIN_HASH_CONCURRENCY = int(os.environ.get('LOGIN_HASH_CONCURRENCY', str(max(1, (os.cpu_count() or 2) // 2))))
+LOGIN_GATE_TIMEOUT = float(os.environ.get('LOGIN_GATE_TIMEOUT', '3'))
+
+# ===== 日誌設定 =====
+# accounts 的應用程式日誌預設 INFO（錯誤、帳號與課程異動）；逐筆的除錯訊息只在 LOG_LEVEL=DEBUG 時輸出
+# 請求計時（RequestTimingMiddleware）預設只記錄超過 REQUEST_SLOW_MS 的慢請求，
+# REQUEST_LOG_LEVEL=INFO 時每個請求都寫一行 JSON
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+REQUEST_LOG_LEVEL = os.environ.get('REQUEST_LOG_LEVEL', 'WARNING')
+REQUEST_SLOW_MS = float(os.environ.get('REQUEST_SLOW_MS', '500'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        'json': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'verbose'},
+        'requests': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'accounts': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'accounts.requests': {'handlers': ['requests'], 'level': REQUEST_LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# ===== 慢查詢紀錄（選用）=====
+# 啟用後超過 SLOW_QUERY_MS 的 SQL 連同 view 與程式位置寫入 SLOW_QUERY_LOG_FILE（輪替），
+# 其中 SLOW_QUERY_EXPLAIN_SAMPLE 比例另外記錄 EXPLAIN 執行計畫；管理員可於 /api/reports/slow-queries/ 檢視
+SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', 'False') == 'True'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', '0.1'))
+# 綁定參數可能含密碼雜湊、session 內容與個人金鑰，預設不寫入紀錄
+SLOW_QUERY_LOG_PARAMS = os.environ.get('SLOW_QUERY_LOG_PARAMS', 'False') == 'True'
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', os.path.join(tempfile.gettempdir(), 'course-system-logs', 'slow_queries.log'))
+SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUP_COUNT = int(os.environ.get('SLOW_QUERY_LOG_BACKUP_COUNT', '3'))
+
+# ===== 指標設定 =====
+# 各 worker 每 METRICS_FLUSH_INTERVAL 秒將指標快照寫入 METRICS_DIR，/metrics 加總所有 worker 的快照
+# 同一台主機上的 worker 需使用相同目錄；Prometheus 以 Authorization: Bearer METRICS_TOKEN 抓取
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'course-system-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# ===== 快取設定 =====
+# session 快取：有 SESSION_CACHE_URL 時使用 Redis / Memcached（所有主機共用，登出時全部失效）；
+# 否則為本機檔案快取，只適合單台主機且手動將 SESSION_ENGINE 設為 cached_db 的部署
+if SESSION_CACHE_URL.startswith(('redis://', 'rediss://')):
+    SESSION_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SESSION_CACHE_URL,
+    }
+elif SESSION_CACHE_URL.startswith('memcached://'):
+    SESSION_CACHE = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': SESSION_CACHE_URL[len('memcached://'):],
+    }
+elif SESSION_CACHE_URL:
+    raise ImproperlyConfigured(f'不支援的 SESSION_CACHE_URL: {SESSION_CACHE_URL}')
+else:
+    SESSION_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SESSION_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'course-system-sessions')),
+    }
+SESSION_CACHE['TIMEOUT'] = SESSION_COOKIE_AGE
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': SESSION_CACHE,
+}
 
 # ===== CSRF 設定（根據環境自動調整）=====
 default_csrf_origins = [
@@ -209,5 +305,24 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# 不對外提供的上傳檔（背景工作暫存的 Excel 匯入檔），需位於 MEDIA_ROOT 之外
+PRIVATE_UPLOAD_ROOT = os.environ.get('PRIVATE_UPLOAD_ROOT', str(BASE_DIR / 'private_uploads'))
+
+# 產生大頭貼縮圖的背景執行緒數
+AVATAR_THUMBNAIL_WORKERS = int(os.environ.get('AVATAR_THUMBNAIL_WORKERS', '2'))
+
+# ===== 學期設定 =====
+# 目前學期（學分統計區分歷年與本學期學分）；切換學期後執行 rebuild_credit_summaries
+CURRENT_ACADEMIC_YEAR = os.environ.get('CURRENT_ACADEMIC_YEAR', '114')
+CURRENT_SEMESTER = os.environ.get('CURRENT_SEMESTER', '1')
+# 目前學期第 1 週的星期一（行事曆訂閱依週次展開上課日期）
+TERM_START_DATE = os.environ.get('TERM_START_DATE', '2025-09-01')
+
+# ===== 背景工作 =====
+# 預設在請求結束後以背景執行緒執行（Vercel 等無常駐 worker 的部署）；
+# 另外啟動 `python manage.py run_jobs` worker 時可設為 False
+JOBS_RUN_IN_THREAD = os.environ.get('JOBS_RUN_IN_THREAD', 'True') == 'True'
+# 執行中的工作超過此秒數未回報進度，視為 worker 已中斷並標記失敗
+JOBS_LEASE_SECONDS = int(os.environ.get('JOBS_LEASE_SECONDS', '600'))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
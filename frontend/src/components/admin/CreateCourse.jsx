@@ -1,9 +1,11 @@
 import { useState, useEffect } from 'react'
 import axios from 'axios'
-import * as XLSX from 'xlsx'
-import API_BASE_URL, { API_ENDPOINTS } from '../../config/api'
+import API_BASE_URL, { API_ENDPOINTS, apiClient } from '../../config/api'
 import { useToast } from '../../contexts/ToastContext'
 
+// 匯入工作的輪詢上限（後端租約逾時會將中斷的工作標記為失敗）
+const IMPORT_TIMEOUT_MS = 15 * 60 * 1000
+
 export default function CreateCourse({ editingCourseId, onSaveComplete }) {
   const [formData, setFormData] = useState({
     course_code: '',
@@ -31,6 +33,7 @@ export default function CreateCourse({ editingCourseId, onSaveComplete }) {
   const [loading, setLoading] = useState(false)
   const [importLoading, setImportLoading] = useState(false)
   const [importResults, setImportResults] = useState(null)
+  const [importProgress, setImportProgress] = useState(null)
   const [importDepartment, setImportDepartment] = useState('資管系')
   const [isEditMode, setIsEditMode] = useState(false)
   const { toast } = useToast()
@@ -274,375 +277,68 @@ export default function CreateCourse({ editingCourseId, onSaveComplete }) {
     }
   }
 
-  // 課別名稱對應到課程類型
-  const mapCourseType = (courseCategoryName) => {
-    const name = String(courseCategoryName).trim()
-
-    if (name.includes('通識必修')) {
-      return 'general_required'
-    }
-    if (name.includes('通識選修')) {
-      return 'general_elective'
-    }
-    if (name.includes('專業必修') || name.includes('必修')) {
-      return 'required'
-    }
-    if (name.includes('專業選修') || name.includes('選修')) {
-      return 'elective'
-    }
-    if (name.includes('通識')) {
-      return 'general_elective'
-    }
-
-    return 'elective'
-  }
-
-  // 星期文字對應到數字
-  const mapWeekday = (weekdayText) => {
-    const weekdayMap = {
-      '1': '1', '一': '1', '星期一': '1',
-      '2': '2', '二': '2', '星期二': '2',
-      '3': '3', '三': '3', '星期三': '3',
-      '4': '4', '四': '4', '星期四': '4',
-      '5': '5', '五': '5', '星期五': '5',
-      '6': '6', '六': '6', '星期六': '6',
-      '7': '7', '日': '7', '星期日': '7'
-    }
-    return weekdayMap[weekdayText] || '1'
-  }
-
-  // 解析節次
-  const parsePeriods = (periodText) => {
-    if (!periodText) return { start: 1, end: 1 }
-
-    const text = String(periodText).trim()
-
-    if (text.includes(',')) {
-      const periods = text.split(',').map(p => parseInt(p.trim())).filter(p => !isNaN(p))
-      if (periods.length > 0) {
-        return { start: Math.min(...periods), end: Math.max(...periods) }
+  // 輪詢背景匯入工作進度，完成後回傳工作結果（超過 IMPORT_TIMEOUT_MS 仍未完成即停止輪詢）
+  const waitForImportJob = async (jobId) => {
+    const deadline = Date.now() + IMPORT_TIMEOUT_MS
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, 1000))
+      const { data } = await apiClient.get(API_ENDPOINTS.jobProgress(jobId))
+      if (data.progress_total > 0) {
+        setImportProgress({ current: data.progress_current, total: data.progress_total })
       }
-    }
-
-    if (text.includes('-')) {
-      const periods = text.split('-').map(p => parseInt(p.trim())).filter(p => !isNaN(p))
-      if (periods.length === 2) {
-        return { start: periods[0], end: periods[1] }
+      if (data.done) {
+        const { data: job } = await apiClient.get(API_ENDPOINTS.jobStatus(jobId))
+        return job
       }
     }
-
-    const period = parseInt(text)
-    if (!isNaN(period)) {
-      return { start: period, end: period }
-    }
-
-    return { start: 1, end: 1 }
-  }
-
-  // 解析教師名稱（支援頓號分隔）
-  const parseTeachers = (teacherText) => {
-    if (!teacherText) return []
-
-    // 使用頓號、逗號或分號分割
-    const names = teacherText.split(/[、,;]/).map(n => n.trim()).filter(n => n)
-    return names
+    throw new Error(`匯入工作 #${jobId} 逾時未完成，請稍後重新整理確認結果`)
   }
 
-  // 處理 XLSX 檔案匯入
+  // 處理 XLSX 檔案匯入（由後端背景工作解析並建立課程）
   const handleFileImport = async (e) => {
     const file = e.target.files[0]
     if (!file) return
 
     setImportLoading(true)
     setImportResults(null)
+    setImportProgress(null)
 
     try {
-      const data = await file.arrayBuffer()
-      const workbook = XLSX.read(data)
-      const worksheet = workbook.Sheets[workbook.SheetNames[0]]
-
-      const rawData = XLSX.utils.sheet_to_json(worksheet, { header: 1, defval: null })
-
-      console.log('原始資料:', rawData)
-      console.log('總列數:', rawData.length)
-
-      // 判斷檔案格式
-      let dataStartRow = 0
-      let hasOpeningDeptColumn = false
-
-      // 找到第一行非空的資料（標題行）
-      let headerRow = null
-      let headerRowIndex = -1
-
-      for (let i = 0; i < Math.min(10, rawData.length); i++) {
-        const row = rawData[i]
-        if (row && row.some(cell =>
-          String(cell).includes('學期') ||
-          String(cell).includes('科目中文名稱') ||
-          String(cell).includes('授課教師姓名')
-        )) {
-          headerRow = row
-          headerRowIndex = i
-          console.log(`偵測到標題在第 ${i + 1} 列`)
-          break
-        }
-      }
-
-      if (headerRow) {
-        dataStartRow = headerRowIndex + 1  // 資料從標題的下一行開始
-
-        // 檢查是否有「開課系所」欄位
-        if (headerRow.some(cell => String(cell).includes('開課系所'))) {
-          hasOpeningDeptColumn = true
-          console.log('偵測到有「開課系所」欄位（16 欄格式）')
-        } else if (headerRow.length > 20) {
-          console.log('偵測到大型檔案格式（31 欄格式）')
-        } else {
-          console.log('偵測到 15 欄格式')
-        }
-      } else {
-        // 沒找到標題，假設第一行就是資料
-        dataStartRow = 0
-        console.log('未偵測到標題行，假設第 1 列開始就是資料')
-      }
+      const uploadData = new FormData()
+      uploadData.append('file', file)
+      uploadData.append('department', importDepartment)
 
-      const dataRows = rawData.slice(dataStartRow)
-
-      console.log(`資料從第 ${dataStartRow + 1} 列開始，共 ${dataRows.length} 筆`)
-      console.log(`是否有開課系所欄位: ${hasOpeningDeptColumn}`)
+      const response = await apiClient.post(API_ENDPOINTS.coursesImport, uploadData, {
+        headers: { 'Content-Type': 'multipart/form-data' }
+      })
+      const job = await waitForImportJob(response.data.job_id)
 
-      const results = {
-        total: dataRows.length,
-        success: 0,
-        failed: 0,
-        errors: []
+      if (job.status === 'failed') {
+        throw new Error(job.error)
       }
 
-      // 逐筆處理課程資料
-      for (let i = 0; i < dataRows.length; i++) {
-        const row = dataRows[i]
-
-        if (!row || row.length === 0 || !row[0]) {
-          continue
-        }
-
-        try {
-          let semester, courseCode, courseName, teacherText, maxStudents
-          let credits, hoursPerWeek, courseCategoryName, classroom
-          let weekdayText, periodText, description, gradeLevel, openingDept
-
-          if (dataStartRow === 5 && hasOpeningDeptColumn) {
-            // 16 欄格式
-            semester = String(row[0] || '').trim()
-            openingDept = String(row[2] || '').trim()
-            courseCode = String(row[3] || '').trim()
-            gradeLevel = parseInt(row[4]) || 1
-            courseName = String(row[5] || '').trim()
-            teacherText = String(row[6] || '').trim()  // 可能包含多位教師
-            maxStudents = parseInt(row[7]) || 50
-            credits = parseInt(row[8]) || 2
-            hoursPerWeek = parseFloat(row[10]) || 2
-            courseCategoryName = String(row[11] || '').trim()
-            classroom = String(row[12] || '').trim()
-            weekdayText = String(row[13] || '').trim()
-            periodText = String(row[14] || '').trim()
-            description = String(row[15] || '').trim()
-          } else if (dataStartRow === 5 && !hasOpeningDeptColumn && row.length > 20) {
-            // 31 欄格式
-            semester = String(row[1] || '').trim()
-            courseCode = String(row[5] || '').trim()
-            gradeLevel = parseInt(row[7]) || 1
-            courseName = String(row[9] || '').trim()
-            teacherText = String(row[11] || '').trim()  // 可能包含多位教師
-            maxStudents = parseInt(row[12]) || 50
-            credits = parseInt(row[15]) || 2
-            hoursPerWeek = parseFloat(row[17]) || 2
-            courseCategoryName = String(row[19] || '').trim()
-            classroom = String(row[20] || '').trim()
-            weekdayText = String(row[21] || '').trim()
-            periodText = String(row[22] || '').trim()
-            description = String(row[24] || '').trim()
-          } else {
-            // 15 欄格式
-            semester = String(row[0] || '').trim()
-            openingDept = String(row[2] || '').trim()
-            courseCode = String(row[3] || '').trim()
-            gradeLevel = parseInt(row[4]) || 1
-            courseName = String(row[5] || '').trim()
-            teacherText = String(row[6] || '').trim()  // 可能包含多位教師
-            maxStudents = parseInt(row[7]) || 50
-            credits = parseInt(row[8]) || 2
-            hoursPerWeek = parseFloat(row[10]) || 2
-            courseCategoryName = String(row[11] || '').trim()
-            classroom = String(row[12] || '').trim()
-            weekdayText = String(row[13] || '').trim()
-            periodText = String(row[14] || '').trim()
-            description = String(row[15] || '').trim()
-          }
-
-          const academicYear = semester.substring(0, 3)
-          const semesterNum = semester.substring(3, 4)
-
-          // 資料驗證
-          if (!courseCode) {
-            results.errors.push(`第 ${i + 2} 列：缺少課程代碼`)
-            results.failed++
-            continue
-          }
-
-          if (!courseName) {
-            results.errors.push(`第 ${i + 2} 列：缺少課程名稱`)
-            results.failed++
-            continue
-          }
-
-          if (!teacherText) {
-            results.errors.push(`第 ${i + 2} 列：缺少教師姓名`)
-            results.failed++
-            continue
-          }
-
-          // 解析教師名稱（支援多位教師，用頓號分隔）
-          const teacherNames = parseTeachers(teacherText)
-          console.log(`處理第 ${i + 2} 列，教師: ${teacherNames.join('、')}`)
-
-          if (teacherNames.length === 0) {
-            results.errors.push(`第 ${i + 2} 列：無法解析教師姓名`)
-            results.failed++
-            continue
-          }
-
-          // 找到所有教師（如果不存在則創建）
-          const foundTeachers = []
-          const createdTeachers = [] // 記錄新創建的教師
-
-          for (const name of teacherNames) {
-            let teacher = teachers.find(t => t.real_name === name)
-            if (teacher) {
-              foundTeachers.push(teacher)
-            } else {
-              // 教師不存在，自動創建
-              console.log(`自動創建教師: ${name}`)
-              try {
-                // 生成臨時教師物件（實際創建會在後端完成）
-                const newTeacher = {
-                  id: `new_${name}`, // 臨時 ID
-                  real_name: name,
-                  username: `teacher_${name}`,
-                  is_new: true // 標記為新教師
-                }
-                foundTeachers.push(newTeacher)
-                createdTeachers.push(name)
-
-                // 也加入 teachers 列表，避免同一個 Excel 中重複創建
-                teachers.push(newTeacher)
-              } catch (err) {
-                results.errors.push(`第 ${i + 2} 列：無法創建教師「${name}」: ${err.message}`)
-                results.failed++
-                continue
-              }
-            }
-          }
-
-          if (createdTeachers.length > 0) {
-            console.log(`第 ${i + 2} 列：自動創建教師 ${createdTeachers.join('、')}`)
-          }
-
-          if (foundTeachers.length === 0) {
-            results.errors.push(`第 ${i + 2} 列：找不到任何有效教師`)
-            results.failed++
-            continue
-          }
-
-          // 第一位教師為主開課，其餘為協同
-          const mainTeacher = foundTeachers[0]
-
-          // 分離協同教師：現有的和新建的
-          const coTeacherIds = []
-          const coTeacherNames = []
-
-          for (const teacher of foundTeachers.slice(1)) {
-            if (teacher.is_new) {
-              coTeacherNames.push(teacher.real_name)
-            } else {
-              coTeacherIds.push(teacher.id)
-            }
-          }
-
-          console.log(`主開課: ${mainTeacher.real_name}${mainTeacher.is_new ? '(新建)' : ''}, 協同: ${coTeacherIds.length + coTeacherNames.length} 位`)
-
-
-          // 解析星期和節次
-          const weekday = mapWeekday(weekdayText)
-          const periods = parsePeriods(periodText)
-
-          // 決定課程系所
-          let department = importDepartment
-
-          if (openingDept) {
-            department = openingDept
-            console.log(`使用 Excel 中的系所: ${department}`)
-          } else {
-            console.log(`使用選擇的系所: ${department}`)
-          }
-
-          // 建立課程資料
-          const courseData = {
-            course_code: courseCode,
-            course_name: courseName,
-            course_type: mapCourseType(courseCategoryName),
-            description: description,
-            credits: credits,
-            hours: Math.ceil(hoursPerWeek),
-            academic_year: academicYear,
-            semester: semesterNum,
-            department: department,
-            grade_level: gradeLevel,
-            // 主教師
-            teacher_id: mainTeacher.is_new ? null : mainTeacher.id,
-            teacher_name: mainTeacher.is_new ? mainTeacher.real_name : null,
-            // 協同教師：分別傳 ID 和姓名
-            co_teachers: coTeacherIds,
-            co_teacher_names: coTeacherNames,
-            classroom: classroom,
-            weekday: weekday,
-            start_period: periods.start,
-            end_period: periods.end,
-            max_students: maxStudents
-          }
-
-          console.log(`準備建立課程: ${courseName}${mainTeacher.is_new ? ' (將創建新教師: ' + mainTeacher.real_name + ')' : ''}`)
-
-          // 送出到後端
-          await axios.post(API_ENDPOINTS.coursesCreate, courseData)
-          results.success++
-          console.log(`成功建立課程: ${courseName}`)
-
-        } catch (error) {
-          console.error(`第 ${i + 2} 列錯誤:`, error)
-          results.failed++
-          const errorMsg = error.response?.data?.error || error.message
-          results.errors.push(`第 ${i + 2} 列（${row[4] || row[5] || '未知課程'}）：${errorMsg}`)
-        }
+      const results = {
+        total: job.result.total,
+        success: job.result.success_count,
+        failed: job.result.error_count,
+        errors: job.result.errors || []
       }
-
       setImportResults(results)
 
       if (results.success > 0) {
         toast.success(`匯入完成！成功：${results.success} 筆，失敗：${results.failed} 筆`)
+        fetchTeachers()
       } else {
         toast.error(`匯入失敗：所有 ${results.failed} 筆資料都未能成功匯入`)
       }
 
-      if (results.success > 0) {
-        fetchTeachers()
-      }
-
     } catch (error) {
       console.error('檔案處理錯誤:', error)
-      toast.error('檔案處理失敗，請確認檔案格式是否正確: ' + error.message)
+      const errorMsg = error.response?.data?.error || error.message
+      toast.error('檔案處理失敗，請確認檔案格式是否正確: ' + errorMsg)
     } finally {
       setImportLoading(false)
+      setImportProgress(null)
       e.target.value = ''
     }
   }
@@ -729,14 +425,17 @@ export default function CreateCourse({ editingCourseId, onSaveComplete }) {
               </div>
 
               <p className="text-sm text-gray-500">
-                支援 .xlsx, .xls 格式
+                支援 .xlsx 格式
+              </p>
+              <p className="text-xs text-gray-500">
+                檔案中的新教師會自動建立帳號，需由管理員重設密碼後才能登入
               </p>
             </div>
 
             <input
               id="excel-upload-input"
               type="file"
-              accept=".xlsx,.xls"
+              accept=".xlsx"
               onChange={handleFileImport}
               disabled={importLoading}
               className="hidden"
@@ -746,6 +445,7 @@ export default function CreateCourse({ editingCourseId, onSaveComplete }) {
           {importLoading && (
             <div className="text-center text-green-600 font-medium mb-4 animate-pulse">
               正在處理檔案中，請稍候...
+              {importProgress && ` (${importProgress.current} / ${importProgress.total})`}
             </div>
           )}
 
@@ -997,7 +697,7 @@ export default function CreateCourse({ editingCourseId, onSaveComplete }) {
                       <div>
                         <p className="font-medium text-blue-800">系統將自動創建教師帳號</p>
                         <p className="mt-1 text-blue-700">帳號格式：teacher_姓名_隨機編號</p>
-                        <p className="mt-1 text-blue-700">密碼將隨機生成並顯示在後台日誌</p>
+                        <p className="mt-1 text-blue-700">新帳號不設密碼、無法登入，請至帳號管理「重設密碼」後再提供給教師</p>
                       </div>
                     </div>
                   </div>
@@ -112,6 +112,15 @@ export default function ViewAllCourses({ onEdit }) {
     setFilteredCourses([])
   }
 
+  // 匯出目前篩選條件下的開課資料（由後端串流產生檔案）
+  const handleExport = () => {
+    const params = new URLSearchParams({ file_type: 'xlsx' })
+    if (selectedAcademicYear !== 'all') params.append('academic_year', selectedAcademicYear)
+    if (selectedSemester !== 'all') params.append('semester', selectedSemester)
+    if (selectedDepartment !== 'all') params.append('department', selectedDepartment)
+    window.open(`${API_ENDPOINTS.exportOfferings}?${params.toString()}`, '_blank')
+  }
+
   const handleDelete = async (courseId, courseName) => {
     if (!confirm(`確定要刪除課程「${courseName}」嗎？`)) {
       return
@@ -293,6 +302,17 @@ export default function ViewAllCourses({ onEdit }) {
             {loading ? '查詢中...' : '查詢'}
           </button>
 
+          {/* 匯出按鈕 */}
+          <button
+            onClick={handleExport}
+            className="px-6 py-2.5 bg-green-600 text-white rounded-lg hover:bg-green-700 transition-colors flex items-center gap-2 font-medium"
+          >
+            <svg className="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+              <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4" />
+            </svg>
+            匯出 Excel
+          </button>
+
           {/* 統計資訊 */}
           {filteredCourses.length > 0 && (
             <div className="flex items-center gap-2 px-4 py-2.5 bg-blue-50 rounded-lg">
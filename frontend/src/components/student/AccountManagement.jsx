@@ -41,6 +41,7 @@ export default function AccountManagement() {
   const [userInfo, setUserInfo] = useState(null)
   const [creditSummary, setCreditSummary] = useState(null)
   const [avatarUrl, setAvatarUrl] = useState(null)
+  const [avatarThumbs, setAvatarThumbs] = useState(null) // 各尺寸縮圖網址（產生完成前為 null）
   const [loading, setLoading] = useState(true)
   const [uploading, setUploading] = useState(false)
   const [error, setError] = useState(null)
@@ -104,6 +105,7 @@ export default function AccountManagement() {
         withCredentials: true
       })
       setAvatarUrl(response.data.avatar_url)
+      setAvatarThumbs(response.data.avatar_urls)
     } catch (error) {
       console.log('尚未設置大頭貼')
     }
@@ -156,6 +158,7 @@ export default function AccountManagement() {
       })
 
       setAvatarUrl(response.data.avatar_url)
+      setAvatarThumbs(response.data.avatar_urls)
       toast.success(t('account.uploadSuccess'))
     } catch (error) {
       console.error('上傳失敗:', error)
@@ -191,6 +194,7 @@ export default function AccountManagement() {
       })
 
       setAvatarUrl(null)
+      setAvatarThumbs(null)
       toast.success(t('account.deleteSuccess'))
     } catch (error) {
       console.error('刪除失敗:', error)
@@ -310,7 +314,10 @@ export default function AccountManagement() {
               <div className="relative group cursor-pointer" onClick={handleFileSelect}>
                 <div className="w-48 h-48 bg-gray-100 dark:bg-gray-700 rounded-3xl flex items-center justify-center shadow-lg overflow-hidden border-4 border-white dark:border-gray-600">
                   {avatarUrl ? (
-                    <img src={avatarUrl} alt="Avatar" className="w-full h-full object-cover" />
+                    <picture className="w-full h-full">
+                      {avatarThumbs && <source srcSet={avatarThumbs['256'].webp} type="image/webp" />}
+                      <img src={avatarThumbs ? avatarThumbs['256'].jpeg : avatarUrl} alt="Avatar" className="w-full h-full object-cover" />
+                    </picture>
                   ) : (
                     <span className="text-8xl">🦦</span>
                   )}
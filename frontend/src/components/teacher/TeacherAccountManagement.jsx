@@ -26,6 +26,7 @@ function getCookie(name) {
 export default function TeacherAccountManagement() {
     const [userInfo, setUserInfo] = useState(null)
     const [avatarUrl, setAvatarUrl] = useState(null)
+    const [avatarThumbs, setAvatarThumbs] = useState(null) // 各尺寸縮圖網址（產生完成前為 null）
     const [loading, setLoading] = useState(true)
     const [uploading, setUploading] = useState(false)
     const [error, setError] = useState(null)
@@ -52,6 +53,7 @@ export default function TeacherAccountManagement() {
             const data = response.data
             setUserInfo(data)
             setAvatarUrl(data.avatar_url)
+            setAvatarThumbs(data.avatar_urls)
             setLoading(false)
         } catch (error) {
             console.error('❌ 獲取個人資料失敗:', error)
@@ -108,6 +110,7 @@ export default function TeacherAccountManagement() {
             })
 
             setAvatarUrl(response.data.avatar_url)
+            setAvatarThumbs(response.data.avatar_urls)
             toast.success(t('account.uploadSuccess'))
         } catch (error) {
             console.error('上傳失敗:', error)
@@ -137,6 +140,7 @@ export default function TeacherAccountManagement() {
             })
 
             setAvatarUrl(null)
+            setAvatarThumbs(null)
             toast.success(t('account.deleteSuccess'))
         } catch (error) {
             console.error('刪除失敗:', error)
@@ -171,7 +175,10 @@ export default function TeacherAccountManagement() {
                             <div className="relative group cursor-pointer" onClick={handleFileSelect}>
                                 <div className="w-48 h-48 bg-gray-100 dark:bg-gray-700 rounded-3xl flex items-center justify-center shadow-lg overflow-hidden border-4 border-white dark:border-gray-600">
                                     {avatarUrl ? (
-                                        <img src={avatarUrl} alt="Avatar" className="w-full h-full object-cover" />
+                                        <picture className="w-full h-full">
+                                            {avatarThumbs && <source srcSet={avatarThumbs['256'].webp} type="image/webp" />}
+                                            <img src={avatarThumbs ? avatarThumbs['256'].jpeg : avatarUrl} alt="Avatar" className="w-full h-full object-cover" />
+                                        </picture>
                                     ) : (
                                         <span className="text-8xl">👨‍🏫</span>
                                     )}
@@ -108,13 +108,23 @@ export const API_ENDPOINTS = {
   courses: `${baseURL}/courses/`,
   searchCourses: `${baseURL}/courses/search/`,
   coursesCreate: `${baseURL}/courses/create/`,
+  coursesImport: `${baseURL}/courses/import/`,
+  coursesBulk: `${baseURL}/courses/bulk/`,
   addCourse: `${baseURL}/courses/create/`,
   semesterCourses: `${baseURL}/courses/semester/`,
   myCourses: `${baseURL}/courses/my/`,
   myTeachingCourses: `${baseURL}/courses/my-teaching/`,
+  myTeachingSummary: `${baseURL}/courses/my-teaching/summary/`,
+  courseRoster: (id) => `${baseURL}/courses/${id}/roster/`,
+  submitGrades: (id) => `${baseURL}/courses/${id}/grades/`,
   historyCourses: `${baseURL}/courses/history/`,
   creditSummary: `${baseURL}/user/credit-summary/`,
+  transcript: `${baseURL}/user/transcript/`,
+  graduationAudit: `${baseURL}/user/graduation-audit/`,
+  calendarSubscription: `${baseURL}/user/calendar/`,
+  auditGraduatingClass: `${baseURL}/graduation/audit/`,
   courseDetail: (id) => `${baseURL}/courses/${id}/`,
+  courseUpdate: (id) => `${baseURL}/courses/${id}/update/`,
   courseDelete: (id) => `${baseURL}/courses/${id}/delete/`,
   enrollCourse: (id) => `${baseURL}/courses/${id}/enroll/`,
   dropCourse: (id) => `${baseURL}/courses/${id}/drop/`,
@@ -122,6 +132,10 @@ export const API_ENDPOINTS = {
 
   // 篩選選單
   filterOptions: `${baseURL}/courses/filter-options/`,
+  planSchedules: `${baseURL}/courses/plan/`,
+  teacherConflicts: `${baseURL}/reports/teacher-conflicts/`,
+  roomUtilization: `${baseURL}/reports/room-utilization/`,
+  slowQueries: `${baseURL}/reports/slow-queries/`,
 
   // 管理者相關
   students: `${baseURL}/students/`,
@@ -132,6 +146,15 @@ export const API_ENDPOINTS = {
   teacherDelete: (id) => `${baseURL}/teachers/${id}/delete/`,
   resetPassword: (id) => `${baseURL}/accounts/${id}/reset-password/`,
 
+  // 資料匯出
+  exportOfferings: `${baseURL}/export/offerings/`,
+  exportEnrollments: `${baseURL}/export/enrollments/`,
+  exportRoomUtilization: `${baseURL}/export/room-utilization/`,
+
+  // 背景工作
+  jobStatus: (id) => `${baseURL}/jobs/${id}/`,
+  jobProgress: (id) => `${baseURL}/jobs/${id}/progress/`,
+
   // 帳號管理
   userProfile: `${API_BASE_URL}/user/profile/`,
   avatar: `${API_BASE_URL}/user/avatar/`,